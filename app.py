@@ -3,6 +3,15 @@ from tools import run_app
 from data import Data
 from datetime import datetime
 
+
+@st.cache_resource
+def load_data(path, **kwargs):
+    """
+    Loads the data once per source and dates ; changing J or the risk-free rate reuses it through Data.with_params.
+    """
+    return Data(path=path, **kwargs)
+
+
 st.title("Bloomberg API - Master 272")
 st.write("Meghna BHAUGEERUTTY, Caroline KIRCH")
 
@@ -21,8 +30,7 @@ if ind_choice != 'RIY Index':
     col1, col2 = st.columns(2)
     start_dt = col1.date_input("Choose the start date : ", max_value =  datetime(2024, 1, 28),  value=datetime(2024, 1, 28), )
     end_dt = col2.date_input("Choose the end date : ", max_value = datetime.now())
-    data = Data(path="", J=J, risk_free_rate=risk_free_rate, index_ticker =ind_ticker, 
-                 start_date = start_dt, end_date = end_dt) 
+    data = load_data("", index_ticker =ind_ticker, start_date = start_dt, end_date = end_dt)
 
 else:
     bbg_or_xl = st.radio('Do you want to fetch the data from Bloomberg or our Excel extract?', 
@@ -32,10 +40,10 @@ else:
         col1, col2 = st.columns(2)
         start_dt = col1.date_input("Choose the start date : ", max_value =  datetime(2024, 1, 28), value=datetime(2024, 1, 28))
         end_dt = col2.date_input("Choose the end date : ", max_value = datetime.now())
-        data = Data(path="", J=J, risk_free_rate=risk_free_rate, 
-                 start_date = start_dt, end_date = end_dt) 
+        data = load_data("", start_date = start_dt, end_date = end_dt)
     else:
-        data = Data(path="Data", J=J, risk_free_rate=risk_free_rate) 
+        data = load_data("Data")
+data = data.with_params(J=J, risk_free_rate=risk_free_rate)
 
 pond_choice = st.selectbox('Choose the weighting scheme for the strategy', 
              ['Equi-weighted', '1/Volatility', 'Volume', 'Volume x price', 
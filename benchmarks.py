@@ -0,0 +1,877 @@
+from datetime import date, timedelta
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from blp_session import FakeSession, ReplaySession, FakeEvent, FakeMessage, CorrelationId, RESPONSE, PARTIAL_RESPONSE, SUBSCRIPTION_DATA
+
+
+def synthetic_bdh_responder(nb_dates:int, seed:int=0):
+    """
+    Builds a FakeSession responder answering HistoricalDataRequests with one message per security
+    and nb_dates random observations for each requested field.
+
+    :param nb_dates: Number of dates returned per security.
+    :param seed: Seed of the random generator.
+    :return: Callable taking a request and returning its list of message payloads.
+    """
+    rng = np.random.default_rng(seed)
+    dates = [date(2000, 1, 3) + timedelta(days=i) for i in range(nb_dates)]
+
+    def responder(request):
+        values = request.toPy()
+        messages = []
+        for security in values['securities']:
+            data = rng.random((nb_dates, len(values['fields']))) * 100
+            field_data = [dict([("date", d)] + list(zip(values['fields'], row.tolist()))) for d, row in zip(dates, data)]
+            messages.append({"securityData": {"security": security, "fieldData": field_data}})
+        return messages
+    return responder
+
+
+def synthetic_bds_responder(nb_members:int, nb_messages:int=1):
+    """
+    Builds a FakeSession responder answering INDX_MWEIGHT_HIST snapshot requests with nb_members members,
+    spread over nb_messages partial messages. Members change slightly from one snapshot date to the next.
+
+    :param nb_members: Number of index members per snapshot.
+    :param nb_messages: Number of messages per response.
+    :return: Callable taking a request and returning its list of message payloads.
+    """
+    def responder(request):
+        values = request.toPy()
+        shift = int(values['overrides'][0]['value']) // 100 % 1000
+        members = [{"Index Member": f"M{chr(65 + (i + shift) % 26)}{chr(65 + (i + shift) // 26 % 26)}{chr(65 + i // 676 % 26)} UN", 
+                    "Percent Weight": 1 / nb_members} for i in range(nb_members)]
+        size = -(-nb_members // nb_messages)
+        return [{"securityData": [{"security": security, "fieldData": {values['fields'][0]: members[k:k + size]}} 
+                                  for security in values['securities']]} 
+                for k in range(0, nb_members, size)]
+    return responder
+
+
+def legacy_bdh(session, strSecurity, strFields):
+    """
+    Reference implementation of the former BLP.bdh receive loop : buffers every message, then builds
+    nested {ticker: {date: value}} dicts and rebuilds each field DataFrame after every message.
+    """
+    request = session.getService('//blp/refdata').createRequest('HistoricalDataRequest')
+    for strF in strFields:
+        request.append('fields', strF)
+    for strS in strSecurity:
+        request.append('securities', strS)
+    session.sendRequest(request)
+
+    list_msg = []
+    while True:
+        event = session.nextEvent()
+        if (event.eventType() != RESPONSE) & (event.eventType() != PARTIAL_RESPONSE):
+            continue
+        list_msg.append(next(iter(event)))
+        if event.eventType() == RESPONSE:
+            break
+
+    dict_fields = {field: {} for field in strFields}
+    dict_Security_Fields = {}
+    for msg in list_msg:
+        ticker = msg.getElement("securityData").getElement("security").getValue()
+        for field in strFields:
+            dict_fields[field][ticker] = {}
+        for field_data in msg.getElement("securityData").getElement("fieldData"):
+            dat = field_data.getElement(0).getValue()
+            for i in range(1, field_data.numElements()):
+                field_name = str(field_data.getElement(i).name())
+                try:
+                    dict_fields[field_name][ticker][dat] = field_data.getElement(i).getValueAsFloat()
+                except:
+                    dict_fields[field_name][ticker][dat] = field_data.getElement(i).getValueAsString()
+        for field in strFields:
+            dict_Security_Fields[field] = pd.DataFrame.from_dict(dict_fields[field], orient='columns')
+    return dict_Security_Fields
+
+
+def bench_bdh_builder(nb_tickers:int=300, nb_dates:int=250, fields=("PX_LAST", "PX_VOLUME")):
+    """
+    Compares the former nested-dict BDH result builder with the columnar accumulator, on the same synthetic response.
+
+    :param nb_tickers: Number of securities requested.
+    :param nb_dates: Number of dates per security.
+    :param fields: Fields requested.
+    :return: Dictionary with the timings in seconds of both builders.
+    """
+    from bloomberg import BLP
+
+    tickers = [f"T{i} Equity" for i in range(nb_tickers)]
+    fields = list(fields)
+
+    start = time.perf_counter()
+    legacy_bdh(FakeSession(synthetic_bdh_responder(nb_dates)), tickers, fields)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    BLP(session=FakeSession(synthetic_bdh_responder(nb_dates))).bdh(tickers, fields, date(2000, 1, 1), date(2001, 1, 1))
+    columnar_time = time.perf_counter() - start
+
+    print(f"BDH builder, {nb_tickers} tickers x {nb_dates} dates : legacy {legacy_time:.2f}s, columnar {columnar_time:.2f}s")
+    return {'legacy': legacy_time, 'columnar': columnar_time}
+
+
+def bench_bds_pipelining(nb_dates:int=60, nb_members:int=1000, latency:float=0.05, max_in_flight_values=(1, 4, 8, 16)):
+    """
+    Times composition snapshots fetched through BLP.bds_batch on a FakeSession with a fixed round trip latency,
+    for several numbers of requests kept in flight.
+
+    :param nb_dates: Number of snapshot dates requested.
+    :param nb_members: Number of index members per snapshot.
+    :param latency: Round trip time in seconds of each request.
+    :param max_in_flight_values: Numbers of requests in flight to compare.
+    :return: Dictionary {max_in_flight: seconds}.
+    """
+    from bloomberg import BLP
+
+    dates = [date(2000, 1, 28) + timedelta(days=30 * i) for i in range(nb_dates)]
+    timings = {}
+    for max_in_flight in max_in_flight_values:
+        session = FakeSession(synthetic_bds_responder(nb_members, nb_messages=4), latency=latency, interval=latency / 10)
+        start = time.perf_counter()
+        BLP(session=session).bds_batch(["RIY Index"], ["INDX_MWEIGHT_HIST"], dates, max_in_flight=max_in_flight)
+        timings[max_in_flight] = time.perf_counter() - start
+        print(f"BDS {nb_dates} snapshots, {max_in_flight} in flight : {timings[max_in_flight]:.2f}s")
+    return timings
+
+
+def bench_replay(path:str, start_date, end_date, index_ticker:str='RIY Index', latency:float=0.0, interval:float=0.0, 
+                 messages_per_event:int=1, **kwargs):
+    """
+    Replays a fetch_bloomberg_data call recorded with blp_session.RecordingSession and times it.
+
+    :param path: Recording saved by RecordingSession.save.
+    :param start_date: Start date of the recorded call.
+    :param end_date: End date of the recorded call.
+    :param index_ticker: Index of the recorded call.
+    :param latency: Round trip time in seconds injected for each request.
+    :param interval: Seconds injected between two partial responses.
+    :param messages_per_event: Number of messages per event.
+    :param kwargs: Other arguments passed to fetch_bloomberg_data (max_in_flight, chunk_size).
+    :return: Time in seconds.
+    """
+    from bloomberg import fetch_bloomberg_data
+
+    session = ReplaySession(path, latency=latency, interval=interval, messages_per_event=messages_per_event)
+    start = time.perf_counter()
+    fetch_bloomberg_data(start_date, end_date, index_ticker, session=session, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"Replay of {path} : {elapsed:.2f}s")
+    return elapsed
+
+
+def synthetic_tick_events(nb_tickers:int, nb_ticks:int, ticks_per_event:int=50, seed:int=0) -> list:
+    """
+    Builds SUBSCRIPTION_DATA FakeEvents of random LAST_PRICE / VOLUME ticks, correlated by security position.
+
+    :param nb_tickers: Number of securities.
+    :param nb_ticks: Total number of ticks.
+    :param ticks_per_event: Number of messages per event.
+    :param seed: Seed of the random generator.
+    :return: List of FakeEvent.
+    """
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, nb_tickers, nb_ticks)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, nb_ticks)))
+    volumes = np.cumsum(rng.integers(1, 1000, nb_ticks)).astype(float)
+    messages = [FakeMessage({"LAST_PRICE": p, "VOLUME": v}, CorrelationId(int(c)), "MarketDataEvents") 
+                for c, p, v in zip(codes, prices.tolist(), volumes.tolist())]
+    return [FakeEvent(SUBSCRIPTION_DATA, messages[i:i + ticks_per_event]) 
+            for i in range(0, nb_ticks, ticks_per_event)]
+
+
+def bench_live_feed(nb_tickers:int=1000, nb_ticks:int=200000, capacity:int=1024):
+    """
+    Measures the tick rate a LiveFeed sustains on a synthetic feed, through its reading thread, and the latency
+    of a universe snapshot.
+
+    :param nb_tickers: Number of securities subscribed to.
+    :param nb_ticks: Number of ticks pushed.
+    :param capacity: Ring buffer capacity per security.
+    :return: Dictionary with the ticks per second and the snapshot latency in seconds.
+    """
+    from live import LiveFeed
+
+    events = synthetic_tick_events(nb_tickers, nb_ticks)
+    session = FakeSession(None)
+    feed = LiveFeed(session, [f"T{i} UN Equity" for i in range(nb_tickers)], capacity)
+
+    start = time.perf_counter()
+    feed.start()
+    for event in events:
+        session.push(event)
+    while feed.ticks < nb_ticks:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    feed.stop()
+
+    start = time.perf_counter()
+    for _ in range(100):
+        feed.snapshot()
+    snapshot_latency = (time.perf_counter() - start) / 100
+
+    print(f"Live feed, {nb_tickers} securities : {nb_ticks / elapsed:,.0f} ticks/s, snapshot in {snapshot_latency * 1e6:.0f}us")
+    return {'ticks_per_second': nb_ticks / elapsed, 'snapshot_seconds': snapshot_latency}
+
+
+def bench_typed_decoding(nb_tickers:int=300, nb_dates:int=250):
+    """
+    Compares BDH decoding of a mixed field set with the generic float-then-string fallback ('auto') and with the
+    typed extractors of the field schema (float, int, category and datetime columns).
+
+    :param nb_tickers: Number of securities requested.
+    :param nb_dates: Number of dates per security.
+    :return: Dictionary with the timings in seconds of both decodings.
+    """
+    from bloomberg import BLP
+
+    tickers = [f"T{i} Equity" for i in range(nb_tickers)]
+    kinds = {"PX_LAST": "float", "EQY_SH_OUT_INT": "int", "CRNCY": "category", "DVD_EX_DT": "datetime"}
+    dates = [date(2000, 1, 3) + timedelta(days=i) for i in range(nb_dates)]
+    values = {"PX_LAST": lambda i: 100 + i / 7, "EQY_SH_OUT_INT": lambda i: 1000 + i, "CRNCY": lambda i: "USD",
+              "DVD_EX_DT": lambda i: dates[i // 90 * 90]}
+
+    def responder(request):
+        fields = request.toPy()['fields']
+        return [{"securityData": {"security": security, "fieldData": [dict([("date", d)] + [(f, values[f](i)) for f in fields]) 
+                                                                         for i, d in enumerate(dates)]}} 
+                for security in request.toPy()['securities']]
+
+    timings, results = {}, {}
+    for name, field_types in [('auto', dict.fromkeys(kinds, 'auto')), ('typed', kinds)]:
+        start = time.perf_counter()
+        results[name] = BLP(session=FakeSession(responder)).bdh(tickers, list(kinds), date(2000, 1, 1), date(2001, 1, 1), 
+                                                                 field_types=field_types)
+        timings[name] = time.perf_counter() - start
+
+    dtypes = {field: str(df.dtypes.iloc[0]) for field, df in results['typed'].items()}
+    print(f"Typed decoding, {nb_tickers} tickers x {nb_dates} dates : auto {timings['auto']:.2f}s, typed {timings['typed']:.2f}s {dtypes}")
+    return timings
+
+
+def bench_parquet_cache(filepath:str='Data/Bloomberg_Data.xlsx', sheet_name:str='PX LAST', directory:str='Data/parquet/'):
+    """
+    Compares the load times of an Excel sheet : cold (Excel parse and typed Parquet write), warm through the
+    former string Parquet cache (parsed back to floats column by column) and warm through the typed,
+    memory-mapped Parquet cache used by Data.
+
+    :param filepath: Excel file.
+    :param sheet_name: Sheet to be read.
+    :param directory: Directory in which the benchmark Parquet files are written.
+    :return: Dictionary with the timings in seconds and the file sizes in bytes.
+    """
+    from data import Data, to_typed_parquet, read_typed_parquet
+
+    typed_path = os.path.join(directory, "bench_typed.parquet")
+    legacy_path = os.path.join(directory, "bench_legacy.parquet")
+
+    start = time.perf_counter()
+    raw = pd.read_excel(filepath, sheet_name, index_col=0)
+    to_typed_parquet(raw, typed_path)
+    cold = time.perf_counter() - start
+    raw.astype(str).to_parquet(legacy_path, engine='pyarrow')
+
+    start = time.perf_counter()
+    legacy = pd.read_parquet(legacy_path)
+    for col in legacy.columns:
+        try:
+            legacy[col] = legacy[col].astype(float)
+        except:
+            legacy[col] = legacy[col].apply(Data.convertToFloatOrStr, args=(None,))
+    legacy_warm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_typed_parquet(typed_path)
+    typed_warm = time.perf_counter() - start
+
+    sizes = {'excel': os.path.getsize(filepath), 'legacy': os.path.getsize(legacy_path), 'typed': os.path.getsize(typed_path)}
+    os.remove(typed_path)
+    os.remove(legacy_path)
+    print(f"{filepath} [{sheet_name}] : cold {cold:.2f}s, warm string cache {legacy_warm:.2f}s ({sizes['legacy'] / 1e6:.1f}MB), "
+          f"warm typed cache {typed_warm:.3f}s ({sizes['typed'] / 1e6:.1f}MB)")
+    return {'cold': cold, 'legacy_warm': legacy_warm, 'typed_warm': typed_warm, 'sizes': sizes}
+
+
+def synthetic_data(nb_dates:int, nb_tickers:int, nb_members:int=None, J:int=3, seed:int=0):
+    """
+    Builds a Data instance on random daily prices and volumes, with a composition snapshot every 21 dates
+    made of nb_members tickers drawn from the universe.
+
+    :param nb_dates: Number of dates.
+    :param nb_tickers: Number of tickers in the universe.
+    :param nb_members: Number of index members per snapshot, defaults to 80% of the universe.
+    :param J: Number of periods of the volatility window.
+    :param seed: Seed of the random generator.
+    :return: Data instance.
+    """
+    from data import Data
+    from compo import CompositionStore
+
+    rng = np.random.default_rng(seed)
+    nb_members = nb_members or int(nb_tickers * 0.8)
+    dates = pd.bdate_range("2000-01-03", periods=nb_dates)
+    tickers = [f"T{i} UN" for i in range(nb_tickers)]
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (nb_dates, nb_tickers)), axis=0))
+    prices[rng.random(prices.shape) < 0.05] = np.nan
+
+    df_px_last = pd.DataFrame(prices, index=dates, columns=tickers)
+    df_px_volume = pd.DataFrame(rng.integers(1, 10**6, (nb_dates, nb_tickers)).astype(float), index=dates, columns=tickers)
+    data = Data.from_frames(df_px_last, df_px_volume, CompositionStore(), J)
+    data.compo = CompositionStore()
+    for date in dates[::21]:
+        data.compo.add_snapshot(date, list(rng.choice(tickers + [f"X{i} UN" for i in range(nb_tickers // 10)], nb_members, replace=False)))
+    return data
+
+
+def legacy_benchmark(data, df_compo:pd.DataFrame) -> pd.DataFrame:
+    """
+    Reference implementation of the former Data.get_benchmark loop, on the former dense composition DataFrame :
+    one nearest date search, reindex and sum per return date.
+    """
+    results = []
+    for date in data.df_returns.index:
+        nearest_date = min(pd.to_datetime(df_compo.columns), key=lambda x: abs(x - pd.to_datetime(date)))
+        tickers = df_compo[nearest_date].dropna().tolist()
+        returns = data.df_returns.loc[date].reindex(tickers).dropna()
+        equal_weight = 1 / len(tickers) if tickers else 0
+        results.append([nearest_date, (returns * equal_weight).sum()])
+    return pd.DataFrame(results, columns=['DATES', 'WEIGHTED_RETURNS']).set_index('DATES')
+
+
+def legacy_get_data(data, df_compo:pd.DataFrame, K:int=1) -> dict:
+    """
+    Reference implementation of the former Data.get_data, on the former dense composition DataFrame : one
+    transposed DataFrame per rebalancing date, built from four loc / reindex / dropna / concat calls.
+    """
+    result = {}
+    valid_index = data.df_px_last.index[data.J]
+    rebalance_dates = pd.date_range(valid_index, data.df_px_last.index[-1], freq=f'{K}ME')
+    for date in rebalance_dates:
+        if date in data.df_px_last.index:
+            nearest_date = min(pd.to_datetime(df_compo.columns), key=lambda x: abs(x - pd.to_datetime(date)))
+            tickers = df_compo[nearest_date].dropna().tolist()
+            frames = [(df.loc[[date]].rename(index={date: nearest_date}), field) for df, field in 
+                      [(data.df_px_last, "PX_LAST"), (data.df_px_volume, "PX_VOLUME"), (data.df_returns, "RETURNS"), (data.df_volatility, "VOLATILITY")]]
+            result[nearest_date] = pd.concat([df.reindex(tickers, axis='columns').dropna(axis=1).rename(index={nearest_date: field}) 
+                                              for df, field in frames]).T
+    return result
+
+
+def bench_benchmark(nb_dates_values=(250, 1000, 2500), nb_tickers:int=3000):
+    """
+    Compares the former per-date benchmark loop with the masked matrix reduction of Data.get_benchmark,
+    on daily synthetic data of growing length.
+
+    :param nb_dates_values: Numbers of dates to compare.
+    :param nb_tickers: Number of tickers in the universe.
+    :return: Dictionary {nb_dates: (legacy seconds, vectorized seconds)}.
+    """
+    timings = {}
+    for nb_dates in nb_dates_values:
+        data = synthetic_data(nb_dates, nb_tickers)
+        df_compo = data.compo.to_frame()
+        start = time.perf_counter()
+        legacy_benchmark(data, df_compo)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data.get_benchmark()
+        vectorized_time = time.perf_counter() - start
+
+        timings[nb_dates] = (legacy_time, vectorized_time)
+        print(f"Benchmark, {nb_dates} dates x {nb_tickers} tickers : loop {legacy_time:.2f}s, vectorized {vectorized_time:.3f}s")
+    return timings
+
+
+def bench_append(nb_dates_values=(500, 2000, 8000), nb_tickers:int=1000, nb_new:int=21):
+    """
+    Compares adding nb_new dates to Data with append against recomputing returns and volatility on the whole
+    history, for several history lengths.
+
+    :param nb_dates_values: Numbers of dates in the history.
+    :param nb_tickers: Number of tickers.
+    :param nb_new: Number of dates appended.
+    :return: Dictionary {nb_dates: (full recomputation seconds, append seconds)}.
+    """
+    from data import Data
+
+    timings = {}
+    for nb_dates in nb_dates_values:
+        data = synthetic_data(nb_dates + nb_new, nb_tickers)
+        px_last, px_volume = data.df_px_last, data.df_px_volume
+
+        start = time.perf_counter()
+        full = Data.from_frames(px_last, px_volume, data.compo, data.J)
+        full.df_volatility
+        full_time = time.perf_counter() - start
+
+        history = Data.from_frames(px_last.iloc[:nb_dates], px_volume.iloc[:nb_dates], data.compo, data.J)
+        history.df_volatility
+        start = time.perf_counter()
+        history.append(px_last.iloc[nb_dates:], px_volume.iloc[nb_dates:])
+        history.df_volatility
+        append_time = time.perf_counter() - start
+
+        timings[nb_dates] = (full_time, append_time)
+        print(f"Append {nb_new} dates to {nb_dates} x {nb_tickers} : full recomputation {full_time:.3f}s, append {append_time:.3f}s")
+    return timings
+
+
+def bench_compact(path:str="Data", J:int=3, K:int=6, n:int=10, m:int=3, ponderation_method:str="equi"):
+    """
+    Compares Data in float64 and in compact mode : memory held by each panel, and the performance metrics of
+    the strategy (tools.run_app) computed on both.
+
+    :param path: Path of the Excel data, as for Data.
+    :param J: Number of periods of the volatility window.
+    :param K: Rebalancing interval in months.
+    :param n: Number of return-based portfolios.
+    :param m: Number of volume-based portfolios.
+    :param ponderation_method: Weighting method, as for tools.run_app.
+    :return: Dictionary with both memory reports and the largest absolute difference of each metric.
+    """
+    from data import Data
+    from tools import run_app
+
+    reports, tables = {}, {}
+    for compact in (False, True):
+        data = Data(path=path, J=J, compact=compact)
+        _, tables[compact] = run_app(data, K, n, m, ponderation_method, "perf")
+        reports[compact] = data.memory_report()
+
+    differences = (tables[True] - tables[False]).abs().max()
+    print(f"Compact mode : {reports[False].loc['TOTAL', 'bytes'] / 1e6:.1f}MB -> {reports[True].loc['TOTAL', 'bytes'] / 1e6:.1f}MB")
+    print(f"Largest metric differences :\n{differences.to_string()}")
+    return {'float64': reports[False], 'compact': reports[True], 'differences': differences}
+
+
+def bench_panel(nb_dates:int=2500, nb_tickers:int=3000, K:int=1):
+    """
+    Compares the former dict of DataFrames built by Data.get_data with the Panel : build time and memory.
+
+    :param nb_dates: Number of daily dates.
+    :param nb_tickers: Number of tickers in the universe.
+    :param K: Rebalancing interval in months.
+    :return: Dictionary with the build times in seconds and the memory in bytes of both.
+    """
+    data = synthetic_data(nb_dates, nb_tickers)
+    data.df_returns, data.df_volatility
+    df_compo = data.compo.to_frame()
+
+    start = time.perf_counter()
+    legacy = legacy_get_data(data, df_compo, K)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    panel = data.get_data(K)
+    panel_time = time.perf_counter() - start
+
+    legacy_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in legacy.values())
+    print(f"get_data, {len(panel)} dates x {nb_tickers} tickers : dict of frames {legacy_time:.2f}s / {legacy_bytes / 1e6:.1f}MB, "
+          f"panel {panel_time:.2f}s / {panel.nbytes() / 1e6:.1f}MB")
+    return {'legacy': legacy_time, 'panel': panel_time, 'legacy_bytes': legacy_bytes, 'panel_bytes': panel.nbytes()}
+
+
+def legacy_simple_portfolios(dict_data:dict, n:int, m:int) -> tuple:
+    """
+    Reference implementation of the former Signal.create_simple_portfolios, on the former dict of DataFrames
+    returned by get_data (see legacy_get_data) : two sort_values per date, then one iloc slice per bucket with
+    the POSITION column set on it.
+    """
+    dict_returns, dict_volume = {}, {}
+    for date, date_data in dict_data.items():
+        dated_data = date_data.dropna()
+        for column, nb_buckets, prefix, result in [("RETURNS", n, 'R', dict_returns), ("PX_VOLUME", m, 'V', dict_volume)]:
+            sorted_data = dated_data.sort_values(by=column)
+            ptf = {}
+            for i in range(nb_buckets):
+                ptf[f'{prefix}{i+1}'] = sorted_data.iloc[i * len(sorted_data) // nb_buckets:(i + 1) * len(sorted_data) // nb_buckets].copy()
+                ptf[f'{prefix}{i+1}']["POSITION"] = "LONG"
+            result[date] = ptf
+    return dict_returns, dict_volume
+
+
+def bench_buckets(nb_tickers_values=(500, 3000), buckets=((5, 3), (20, 10), (100, 50)), nb_dates:int=2500, K:int=1):
+    """
+    Compares the former sort and slice loop of Signal with the vectorized bucket labels, alone and with the
+    portfolios built from them, for several universe sizes and numbers of buckets.
+
+    :param nb_tickers_values: Numbers of tickers in the universe.
+    :param buckets: Pairs (n, m) of numbers of returns and volume buckets.
+    :param nb_dates: Number of daily dates.
+    :param K: Rebalancing interval in months.
+    :return: Dictionary {(nb_tickers, n, m): (legacy, labels, portfolios)} of timings in seconds.
+    """
+    from signals import Signal
+
+    results = {}
+    for nb_tickers in nb_tickers_values:
+        data = synthetic_data(nb_dates, nb_tickers)
+        df_compo = data.compo.to_frame()
+        for n, m in buckets:
+            signal = Signal(data, K=K, n_returns=n, m_volume=m)
+            dict_data = legacy_get_data(data, df_compo, K)
+
+            start = time.perf_counter()
+            legacy_simple_portfolios(dict_data, n, m)
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            signal.create_bucket_labels()
+            labels_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            signal.create_simple_portfolios()
+            portfolios_time = time.perf_counter() - start
+
+            print(f"buckets, {len(signal.data)} dates x {nb_tickers} tickers, n={n} m={m} : loop {legacy_time:.2f}s, "
+                  f"labels {labels_time:.2f}s, labels + portfolios {portfolios_time:.2f}s")
+            results[(nb_tickers, n, m)] = (legacy_time, labels_time, portfolios_time)
+    return results
+
+
+def legacy_intersected_portfolios(returns_ptf:dict, volume_ptf:dict) -> dict:
+    """
+    Reference implementation of the former Signal.create_intersected_portfolios : one index intersection, loc copy
+    and two label-aligned additions per pair of portfolios and per date.
+    """
+    result = {}
+    for date in returns_ptf:
+        result[date] = {}
+        for R_i, R_portfolio in returns_ptf[date].items():
+            for V_j, V_portfolio in volume_ptf[date].items():
+                intersection_index = R_portfolio.index.intersection(V_portfolio.index)
+                intersected_portfolio = R_portfolio.loc[intersection_index].copy()
+                intersected_portfolio["WEIGHT"] = R_portfolio["WEIGHT"] + V_portfolio.loc[intersection_index, "WEIGHT"]
+                intersected_portfolio["WEIGHTED_RETURNS"] = (R_portfolio.loc[intersection_index, "WEIGHTED_RETURNS"] +
+                                                             V_portfolio.loc[intersection_index, "WEIGHTED_RETURNS"])
+                result[date][f'{R_i}_{V_j}'] = intersected_portfolio
+    return result
+
+
+def bench_intersections(nb_tickers_values=(500, 3000), buckets=((10, 3), (20, 10), (50, 20)), nb_dates:int=2500, K:int=6):
+    """
+    Compares the former pairwise intersection loop of Signal with the intersection engine, for several universe
+    sizes and numbers of buckets, on equally weighted portfolios.
+
+    :param nb_tickers_values: Numbers of tickers in the universe.
+    :param buckets: Pairs (n, m) of numbers of returns and volume buckets.
+    :param nb_dates: Number of daily dates.
+    :param K: Rebalancing interval in months.
+    :return: Dictionary {(nb_tickers, n, m): (legacy, engine)} of timings in seconds.
+    """
+    from signals import Signal
+    from optimisation import Optimisation
+
+    results = {}
+    for nb_tickers in nb_tickers_values:
+        data = synthetic_data(nb_dates, nb_tickers)
+        for n, m in buckets:
+            signal = Signal(data, K=K, n_returns=n, m_volume=m)
+            returns_ptf, volume_ptf = signal.create_simple_portfolios()
+            returns_ptf, volume_ptf = Optimisation.get_equal_weight(returns_ptf), Optimisation.get_equal_weight(volume_ptf)
+
+            start = time.perf_counter()
+            legacy_intersected_portfolios(returns_ptf, volume_ptf)
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            signal.create_intersected_portfolios(returns_ptf, volume_ptf)
+            engine_time = time.perf_counter() - start
+
+            print(f"intersections, {len(signal.data)} dates x {nb_tickers} tickers, n={n} m={m} : "
+                  f"loop {legacy_time:.2f}s, engine {engine_time:.2f}s")
+            results[(nb_tickers, n, m)] = (legacy_time, engine_time)
+    return results
+
+
+def legacy_bucket_returns(dict_data:dict, signal, first:str, second:str, n:int, m:int) -> pd.DataFrame:
+    """
+    Reference implementation of a sort on two signals with the former per-date loop, on the former dict of
+    DataFrames returned by get_data (see legacy_get_data) : one sort_values and n or m iloc slices per signal and
+    per date, then one index intersection per pair of buckets.
+    """
+    results = {}
+    for date, date_data in dict_data.items():
+        dated_data = pd.concat([date_data] + [signal.signal_values(name).loc[date].rename(name) for name in 
+                                              dict.fromkeys([first, second]) if name not in date_data.columns], axis=1).dropna()
+        buckets = {}
+        for name, nb_buckets in [(first, n), (second, m)]:
+            sorted_data = dated_data.sort_values(by=name, kind='stable')
+            buckets[name] = [sorted_data.iloc[i * len(sorted_data) // nb_buckets:(i + 1) * len(sorted_data) // nb_buckets] 
+                             for i in range(nb_buckets)]
+        results[date] = {f'{first}{i+1}_{second}{j+1}': 
+                         first_ptf.loc[first_ptf.index.intersection(second_ptf.index), "RETURNS"].mean()
+                         for i, first_ptf in enumerate(buckets[first]) for j, second_ptf in enumerate(buckets[second])}
+    return pd.DataFrame(results).T
+
+
+def bench_signal_sweep(nb_dates:int=2500, nb_tickers:int=3000, n:int=5, m:int=3, K:int=1):
+    """
+    Compares a sweep over every pair of registered signals with the per-date loop against the batched ranking of
+    Signal.bucket_returns.
+
+    :param nb_dates: Number of daily dates.
+    :param nb_tickers: Number of tickers in the universe.
+    :param n: Number of buckets of the first signal of each pair.
+    :param m: Number of buckets of the second signal of each pair.
+    :param K: Rebalancing interval in months.
+    :return: Dictionary with the timings in seconds of both sweeps.
+    """
+    from itertools import permutations
+    from signals import Signal, SIGNALS
+
+    data = synthetic_data(nb_dates, nb_tickers)
+    signal = Signal(data, K=K)
+    pairs = list(permutations(SIGNALS, 2))
+    for name in SIGNALS:
+        signal.signal_values(name)
+    dict_data = legacy_get_data(data, data.compo.to_frame(), K)
+
+    start = time.perf_counter()
+    for pair in pairs:
+        legacy_bucket_returns(dict_data, signal, *pair, n, m)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pair in pairs:
+        signal.bucket_returns(*pair, n, m)
+    batched_time = time.perf_counter() - start
+
+    print(f"signal sweep, {len(pairs)} pairs, {len(signal.data)} dates x {nb_tickers} tickers, n={n} m={m} : "
+          f"loop {legacy_time:.2f}s, batched {batched_time:.2f}s")
+    return {'legacy': legacy_time, 'batched': batched_time}
+
+
+def legacy_weights(portfolios:dict, scheme:str) -> dict:
+    """
+    Reference implementation of the former Optimisation.get_*_weight loops : boolean masks and .loc assignments on
+    every portfolio of every date.
+    """
+    for date in portfolios:
+        for name, ptf in portfolios[date].items():
+            long, short = ptf["POSITION"] == "LONG", ptf["POSITION"] == "SHORT"
+            if scheme == 'equal':
+                nb_long, nb_short = len(ptf[long].dropna()), len(ptf[short].dropna())
+                ptf.loc[long, "WEIGHT"] = 1 / nb_long if nb_long != 0 else 0
+                ptf.loc[short, "WEIGHT"] = -1 / nb_short if nb_short != 0 else 0
+            else:
+                score = {'volume': ptf["PX_VOLUME"], 'inverse_volatility': 1 / ptf["VOLATILITY"], 
+                         'dollar_volume': ptf["PX_LAST"] * ptf["PX_VOLUME"]}[scheme]
+                total_long, total_short = score[long].sum(), score[short].sum()
+                ptf.loc[long, "WEIGHT"] = score[long] / total_long if total_long != 0 else 0
+                ptf.loc[short, "WEIGHT"] = -score[short] / total_short if total_short != 0 else 0
+            ptf["WEIGHTED_RETURNS"] = ptf["RETURNS"] * ptf["WEIGHT"]
+    return portfolios
+
+
+def legacy_full_results(portfolios:dict) -> dict:
+    """
+    Reference implementation of the former Optimisation.get_full_results : one concat per portfolio and per date.
+    """
+    dict_returns = {}
+    for date, ptf in portfolios.items():
+        for key, portfolio_df in ptf.items():
+            if key not in dict_returns:
+                dict_returns[key] = pd.DataFrame(columns=["DATES", "RETURNS"]).set_index("DATES")
+            new_data = pd.DataFrame({"DATES": [date], "RETURNS": [portfolio_df["WEIGHTED_RETURNS"].sum()]}).set_index("DATES")
+            dict_returns[key] = pd.concat([dict_returns[key].dropna(axis=1, how='all'), new_data])
+    return dict_returns
+
+
+def bench_weighting(nb_dates:int=2500, nb_tickers:int=3000, K:int=1, n:int=10, m:int=3):
+    """
+    Compares the former weighting loops with the segmented weighting kernel for every scheme, and the former
+    get_full_results with the new one, on the portfolios of the run_excel path.
+
+    :param nb_dates: Number of daily dates.
+    :param nb_tickers: Number of tickers in the universe.
+    :param K: Rebalancing interval in months.
+    :param n: Number of returns portfolios.
+    :param m: Number of volume portfolios.
+    :return: Dictionary {stage: (legacy, new)} of timings in seconds.
+    """
+    from signals import Signal
+    from optimisation import Optimisation
+
+    data = synthetic_data(nb_dates, nb_tickers)
+    signal = Signal(data, K=K, n_returns=n, m_volume=m)
+    optim = Optimisation({}, {})
+    results = {}
+    for scheme, method in [('equal', Optimisation.get_equal_weight), ('volume', Optimisation.get_volume_weight),
+                           ('inverse_volatility', Optimisation.get_inverse_volatility_weight), 
+                           ('dollar_volume', Optimisation.get_dollar_volume_weight)]:
+        legacy_ptf, _ = signal.create_simple_portfolios()
+        start = time.perf_counter()
+        legacy_weights(legacy_ptf, scheme)
+        legacy_time = time.perf_counter() - start
+
+        weighted_ptf, _ = signal.create_simple_portfolios()
+        start = time.perf_counter()
+        method(weighted_ptf)
+        kernel_time = time.perf_counter() - start
+
+        results[scheme] = (legacy_time, kernel_time)
+        print(f"weighting {scheme}, {len(signal.data)} dates, {n + 1} portfolios per date : "
+              f"loop {legacy_time:.2f}s, kernel {kernel_time:.3f}s")
+
+    intersections = signal.create_intersected_portfolios(*[Optimisation.get_equal_weight(ptf) for ptf in signal.create_simple_portfolios()])
+    start = time.perf_counter()
+    legacy_full_results(intersections)
+    legacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    full_results = optim.get_full_results(intersections)
+    new_time = time.perf_counter() - start
+    results['full_results'] = (legacy_time, new_time)
+    print(f"get_full_results, {len(full_results)} portfolios : concat loop {legacy_time:.2f}s, lists {new_time:.3f}s")
+    return results
+
+
+def bench_best_weighting(nb_dates:int=2500, nb_tickers:int=3000, K:int=1, n:int=10, m:int=3):
+    """
+    Compares the former get_best_weighting_method, which weighted the same portfolios in place with each method and
+    ran get_full_results and Performance on each, with the evaluation of all the methods side by side.
+
+    :param nb_dates: Number of daily dates.
+    :param nb_tickers: Number of tickers in the universe.
+    :param K: Rebalancing interval in months.
+    :param n: Number of returns portfolios.
+    :param m: Number of volume portfolios.
+    :return: Dictionary with the timings in seconds of both.
+    """
+    from signals import Signal
+    from optimisation import Optimisation
+    from performance import Performance
+
+    data = synthetic_data(nb_dates, nb_tickers)
+    signal = Signal(data, K=K, n_returns=n, m_volume=m)
+    returns_ptf, _ = signal.create_simple_portfolios()
+    optim = Optimisation({}, {})
+
+    start = time.perf_counter()
+    for scheme in ['equal', 'volume', 'inverse_volatility', 'dollar_volume']:
+        full_returns = legacy_full_results(legacy_weights(returns_ptf, scheme))
+        max(Performance(portfolios=full_returns, bench=None).sharpe_ratio().values())
+    legacy_time = time.perf_counter() - start
+
+    returns_ptf, _ = signal.create_simple_portfolios()
+    start = time.perf_counter()
+    optim.get_best_weighting_method(returns_ptf)
+    best_time = time.perf_counter() - start
+
+    print(f"best weighting method, {len(signal.data)} dates x {nb_tickers} tickers : "
+          f"sequential in place {legacy_time:.2f}s, side by side {best_time:.2f}s")
+    return {'legacy': legacy_time, 'best': best_time}
+
+
+def bench_executor(nb_years:int=20, nb_tickers:int=3000, K:int=1, n:int=10, m:int=3, workers_values=(1, 2, 4, 8)):
+    """
+    Speedup of the thread and process backends of the executor over the serial run, for the portfolio creation,
+    the equal weighting and the intersections of Signal and Optimisation, on a synthetic daily universe.
+
+    :param nb_years: Number of years of daily dates (252 dates per year).
+    :param nb_tickers: Number of tickers in the universe.
+    :param K: Rebalancing interval in months.
+    :param n: Number of returns portfolios.
+    :param m: Number of volume portfolios.
+    :param workers_values: Numbers of workers tried, up to the number of CPUs.
+    :return: DataFrame of the timings in seconds of each stage and of the speedup, per backend and number of workers.
+    """
+    from signals import Signal
+    from optimisation import Optimisation
+    from executor import Executor, SERIAL, THREAD, PROCESS
+
+    data = synthetic_data(252 * nb_years, nb_tickers)
+    configurations = [(SERIAL, 1)] + [(backend, workers) for backend in (THREAD, PROCESS) 
+                                      for workers in workers_values if workers <= (os.cpu_count() or 1)]
+    rows = {}
+    for backend, workers in configurations:
+        with Executor(backend, workers) as executor:
+            timings = {}
+            signal = Signal(data, K=K, n_returns=n, m_volume=m, executor=executor)
+            start = time.perf_counter()
+            returns_ptf, volume_ptf = signal.create_simple_portfolios()
+            timings['portfolios'] = time.perf_counter() - start
+            start = time.perf_counter()
+            returns_ptf = Optimisation.get_equal_weight(returns_ptf, executor)
+            volume_ptf = Optimisation.get_equal_weight(volume_ptf, executor)
+            timings['weights'] = time.perf_counter() - start
+            start = time.perf_counter()
+            signal.create_intersected_portfolios(returns_ptf, volume_ptf)
+            timings['intersections'] = time.perf_counter() - start
+        timings['total'] = sum(timings.values())
+        rows[(backend, workers)] = timings
+
+    report = pd.DataFrame(rows).T.rename_axis(['backend', 'workers'])
+    report['speedup'] = report.loc[(SERIAL, 1), 'total'] / report['total']
+    print(f"executor, {len(signal.data)} dates x {nb_tickers} tickers, n={n} m={m}, {os.cpu_count()} CPUs :")
+    print(report.round(2).to_string())
+    return report
+
+
+def bench_ingest(filepath:str='Data/Bloomberg_Data.xlsx', sheet_name:str='PX LAST', field:str='PX_LAST', 
+                 directory:str='Data/bench_dataset/', start_date='2010-01-01', end_date='2012-12-31'):
+    """
+    Compares reading an Excel sheet whole with pd.read_excel against ingesting it in chunks into the partitioned
+    Parquet dataset, then reading the dataset whole and for a date range and half of the tickers.
+
+    :param filepath: Excel file.
+    :param sheet_name: Sheet to be ingested.
+    :param field: Field of the sheet.
+    :param directory: Directory of the benchmark dataset, removed afterwards.
+    :param start_date: First date of the range read.
+    :param end_date: Last date of the range read.
+    :return: Dictionary of timings in seconds.
+    """
+    import shutil
+    import ingest
+
+    timings = {}
+    start = time.perf_counter()
+    pd.read_excel(filepath, sheet_name, index_col=0)
+    timings['read_excel'] = time.perf_counter() - start
+
+    shutil.rmtree(directory, ignore_errors=True)
+    start = time.perf_counter()
+    ingest.ingest_excel(filepath, sheet_name, field, directory)
+    timings['ingest'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full = ingest.read_field(directory, field)
+    timings['read_dataset'] = time.perf_counter() - start
+
+    tickers = list(full.columns[::2])
+    start = time.perf_counter()
+    part = ingest.read_field(directory, field, start_date, end_date, tickers)
+    timings['read_slice'] = time.perf_counter() - start
+    shutil.rmtree(directory)
+
+    print(f"{filepath} [{sheet_name}] : read_excel {timings['read_excel']:.2f}s, ingest {timings['ingest']:.2f}s, "
+          f"dataset {timings['read_dataset']:.2f}s, {part.shape[0]} dates x {part.shape[1]} tickers {timings['read_slice']:.2f}s")
+    return timings
+
+
+if __name__ == "__main__":
+    bench_bdh_builder()
+    bench_typed_decoding()
+    bench_bds_pipelining()
+    bench_live_feed()
+    bench_benchmark()
+    bench_append()
+    bench_panel()
+    bench_buckets()
+    bench_intersections()
+    bench_signal_sweep()
+    bench_weighting()
+    bench_best_weighting()
+    bench_executor()
+    if os.path.exists('Data/Bloomberg_Data.xlsx'):
+        bench_parquet_cache()
+        bench_compact()
+        bench_ingest()
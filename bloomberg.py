@@ -1,53 +1,273 @@
 from datetime import datetime, timedelta
+from collections import deque
+import itertools
+import threading
+import time
 import pandas as pd
 import numpy as np
-import blpapi
-# A installer sur les ordi bloom : python -m pip install --index-url=https://bcms.bloomberg.com/pip/simple blpapi
+try:
+    # A installer sur les ordi bloom : python -m pip install --index-url=https://bcms.bloomberg.com/pip/simple blpapi
+    import blpapi
+    from blpapi import Name, CorrelationId
+    CONVERSION_ERRORS = (blpapi.InvalidConversionException, ValueError, TypeError)
+except ImportError:
+    # Without blpapi, BLP only runs on the local sessions of blp_session (FakeSession, ReplaySession)
+    blpapi = None
+    from blp_session import CorrelationId
+    Name = str
+    CONVERSION_ERRORS = (ValueError, TypeError)
+
+from blp_session import session_pool, RESPONSE, PARTIAL_RESPONSE, TIMEOUT
+from live import LiveFeed
+from compo import CompositionStore
+
+# Correlation ids are unique in the process, so that a late reply to another request loop is never mistaken for one
+# of the current loop, on a session shared between BLP instances
+_correlation_ids = itertools.count(1)
+
+# Request loops wait for events EVENT_TIMEOUT milliseconds at a time, so that a lost response ends them with a
+# TimeoutError (see BLP timeout) instead of blocking the session forever
+EVENT_TIMEOUT = 500
+
+# Sessions on which a request loop is running ; a second loop on the same thread (e.g. a bdh while a bdh_iter is
+# suspended) would consume and drop the events of the first one, and leave it waiting forever
+_streaming = set()
 
 # Bloomberg names : 
-DATE = blpapi.Name("date")
-ERROR_INFO = blpapi.Name("errorInfo")
-EVENT_TIME = blpapi.Name("EVENT_TIME")
-FIELD_DATA = blpapi.Name("fieldData")
-FIELD_EXCEPTIONS = blpapi.Name("fieldExceptions")
-FIELD_ID = blpapi.Name("fieldId")
-SECURITY = blpapi.Name("security")
-SECURITY_DATA = blpapi.Name("securityData")
+DATE = Name("date")
+ERROR_INFO = Name("errorInfo")
+EVENT_TIME = Name("EVENT_TIME")
+FIELD_DATA = Name("fieldData")
+FIELD_EXCEPTIONS = Name("fieldExceptions")
+FIELD_ID = Name("fieldId")
+FIELD_INFO = Name("fieldInfo")
+DATATYPE = Name("datatype")
+MNEMONIC = Name("mnemonic")
+RESPONSE_ERROR = Name("responseError")
+SECURITY = Name("security")
+SECURITY_DATA = Name("securityData")
+
+
+# Datatype of common fields, saves a //blp/apiflds lookup : 'float', 'int', 'datetime' or 'category'
+FIELD_TYPES = {"PX_LAST": "float", "PX_OPEN": "float", "PX_HIGH": "float", "PX_LOW": "float", "PX_VOLUME": "float",
+               "LAST_PRICE": "float", "VOLUME": "float", "CUR_MKT_CAP": "float", "EQY_SH_OUT": "float", 
+               "EQY_WEIGHTED_AVG_PX": "float", "TOT_RETURN_INDEX_GROSS_DVDS": "float", "DAY_TO_DAY_TOT_RETURN_GROSS_DVDS": "float",
+               "NAME": "category", "TICKER": "category", "CRNCY": "category", "ID_ISIN": "category", "COUNTRY": "category",
+               "GICS_SECTOR_NAME": "category", "GICS_INDUSTRY_NAME": "category", "EXCH_CODE": "category",
+               "DVD_EX_DT": "datetime", "LAST_UPDATE_DT": "datetime", "ANNOUNCEMENT_DT": "datetime"}
+
+# //blp/apiflds datatypes
+APIFLDS_TYPES = {"Double": "float", "Float": "float", "Real": "float", "Price": "float", 
+                 "Int32": "int", "Int64": "int", "Integer": "int", "Long": "int",
+                 "Date": "datetime", "Datetime": "datetime", 
+                 "String": "category", "Character": "category", "Enumeration": "category", "Boolean": "category"}
+
+# Storage of each datatype : (dtype, missing value)
+_STORAGE = {'auto': (np.float64, np.nan), 'float': (np.float64, np.nan), 'int': (np.int64, 0), 
+            'datetime': ('datetime64[ns]', np.datetime64('NaT')), 'category': (object, None)}
+
+
+# Column dtype of each datatype in BDP results
+BDP_DTYPES = {'auto': None, 'float': 'float64', 'int': 'Int64', 'datetime': 'datetime64[ns]', 'category': 'category'}
+
+
+def extract_value(element, kind):
+    """
+    Reads a blpapi element with the typed extractor of its datatype ; 'auto' tries a float, else a string.
+    """
+    if kind == 'float':
+        return element.getValueAsFloat()
+    if kind == 'int':
+        return element.getValueAsInteger()
+    if kind == 'datetime':
+        return element.getValueAsDatetime()
+    if kind == 'category':
+        return element.getValueAsString()
+    try:
+        return element.getValueAsFloat()
+    except CONVERSION_ERRORS:
+        return element.getValueAsString()
+
+
+class ColumnarAccumulator():
+    """
+    Accumulates historical data in preallocated (dates x tickers) arrays, one per field, typed after the
+    datatype of the field (float64, int64, datetime64 or categories). Dates and tickers are mapped to integer
+    positions in order of arrival, arrays grow by doubling, and each field DataFrame is only built once, at the end.
+    """
+
+    def __init__(self, fields, nb_dates=256, nb_tickers=64, kinds=None):
+        """
+        :param fields: list of str : fields to accumulate.
+        :param nb_dates: initial number of date rows allocated.
+        :param nb_tickers: initial number of ticker columns allocated.
+        :param kinds: optional dict {field: 'float', 'int', 'datetime', 'category' or 'auto'} ; 'auto' (default)
+                      tries a float and falls back to a string, for fields of unknown datatype.
+        """
+        self.fields = list(fields)
+        self.kinds = {field: (kinds or {}).get(field, 'auto') for field in self.fields}
+        self.date_pos = {}
+        self.ticker_pos = {}
+        shape = (max(nb_dates, 1), max(nb_tickers, 1))
+        self.values = {field: np.full(shape, _STORAGE[kind][1], dtype=_STORAGE[kind][0]) for field, kind in self.kinds.items()}
+        # Integers have no missing value : filled cells are tracked in a mask
+        self.filled = {field: np.zeros(shape, dtype=bool) for field, kind in self.kinds.items() if kind == 'int'}
+        # Non numeric values of 'auto' fields are rare : kept aside as {field: {(row, col): str}}
+        self.strings = {field: {} for field in self.fields}
+
+    def ticker(self, ticker) -> int:
+        """Returns the column of ticker, allocating it if needed."""
+        col = self.ticker_pos.get(ticker)
+        if col is None:
+            col = self.ticker_pos[ticker] = len(self.ticker_pos)
+            self.__grow(nb_tickers=col + 1)
+        return col
+
+    def date(self, date) -> int:
+        """Returns the row of date, allocating it if needed."""
+        row = self.date_pos.get(date)
+        if row is None:
+            row = self.date_pos[date] = len(self.date_pos)
+            self.__grow(nb_dates=row + 1)
+        return row
+
+    def set(self, field, row, col, value):
+        """Writes value at (row, col) of an 'auto' field ; floats go to the array, anything else aside."""
+        if isinstance(value, float):
+            self.values[field][row, col] = value
+            self.strings[field].pop((row, col), None)
+        else:
+            self.values[field][row, col] = np.nan
+            self.strings[field][(row, col)] = value
+
+    def decode(self, field, row, col, element):
+        """Reads a blpapi element with the extractor of its field datatype and writes it at (row, col)."""
+        kind = self.kinds[field]
+        if kind == 'float':
+            self.values[field][row, col] = element.getValueAsFloat()
+        elif kind == 'int':
+            self.values[field][row, col] = element.getValueAsInteger()
+            self.filled[field][row, col] = True
+        elif kind == 'datetime':
+            self.values[field][row, col] = np.datetime64(element.getValueAsDatetime(), 'ns')
+        elif kind == 'category':
+            self.values[field][row, col] = element.getValueAsString()
+        else:
+            self.set(field, row, col, extract_value(element, 'auto'))
+
+    def to_frames(self) -> dict:
+        """
+        :return: A dict {field: DataFrame} with dates in index and tickers in columns, in order of arrival.
+        """
+        index = pd.Index(list(self.date_pos))
+        columns = list(self.ticker_pos)
+        frames = {}
+        for field, kind in self.kinds.items():
+            values = self.values[field][:len(index), :len(columns)]
+            frame = pd.DataFrame(values, index=index, columns=columns, copy=False)
+            if kind == 'int':
+                filled = self.filled[field][:len(index), :len(columns)]
+                if not filled.all():
+                    frame = frame.astype('Int64').mask(~filled)
+            elif kind == 'category':
+                frame = frame.astype('category')
+            elif self.strings[field]:
+                for col in sorted({col for _, col in self.strings[field]}):
+                    frame.isetitem(col, frame.iloc[:, col].astype(object))
+                for (row, col), value in self.strings[field].items():
+                    frame.iat[row, col] = value
+            frames[field] = frame
+        return frames
+
+    def __grow(self, nb_dates=0, nb_tickers=0):
+        rows, cols = self.values[self.fields[0]].shape if self.fields else (0, 0)
+        if nb_dates <= rows and nb_tickers <= cols:
+            return
+        new_shape = (max(rows, 1) * 2 if nb_dates > rows else rows, max(cols, 1) * 2 if nb_tickers > cols else cols)
+        for field, array in self.values.items():
+            dtype, missing = _STORAGE[self.kinds[field]]
+            grown = np.full(new_shape, missing, dtype=dtype)
+            grown[:rows, :cols] = array
+            self.values[field] = grown
+        for field, array in self.filled.items():
+            grown = np.zeros(new_shape, dtype=bool)
+            grown[:rows, :cols] = array
+            self.filled[field] = grown
 
 
 class BLP():    
     
-    def __init__(self):
+    def __init__(self, session=None, shared=True, timeout=60):
+        """
+            Summary:
+                Opens a Bloomberg session and the //blp/refdata service.
 
-        # Create Session object
-        self.session = blpapi.Session()
-        
-        # Exit if can't start the Session
-        if not self.session.start():
-            print("Failed to start session.")
-            return
-        
-        # Open & Get RefData Service or exit if impossible
-        if not self.session.openService("//blp/refdata"):
-            print("Failed to open //blp/refdata")
-            return
-        
-        self.session.openService('//BLP/refdata')
-        self.refDataSvc = self.session.getService('//BLP/refdata')
+            Inputs:
+                session: optional, an already started session exposing the blpapi.Session interface
+                         (e.g. blp_session.FakeSession).
+                shared: if no session is given, True reuses the long-lived session of blp_session.session_pool
+                        (started once per process), False starts a private blpapi.Session.
+                timeout: seconds without any response event after which a request raises TimeoutError
+        """
+
+        self.shared = session is None and shared
+        self.timeout = timeout
+        self.lock = threading.RLock()
+
+        if session is not None:
+            self.session = session
+        elif shared:
+            self.session, self.lock = session_pool.acquire(("//blp/refdata",))
+        else:
+            if blpapi is None:
+                raise ImportError("blpapi is required to start a Bloomberg session")
+            # Create Session object
+            self.session = blpapi.Session()
+            
+            # Exit if can't start the Session
+            if not self.session.start():
+                print("Failed to start session.")
+                return
+            
+            # Open & Get RefData Service or exit if impossible
+            if not self.session.openService("//blp/refdata"):
+                print("Failed to open //blp/refdata")
+                return
 
         print('Session open')
+
+    def __acquire(self, services=("//blp/refdata",)):
+        """
+            Summary:
+                Session and lock to send the next requests on. The shared session is looked up in the pool each
+                time, so that an instance follows it when the pool restarts it.
+
+            Output:
+                A tuple (session, lock)
+        """
+        if self.shared:
+            self.session, self.lock = session_pool.acquire(services)
+        return self.session, self.lock
+
+    @property
+    def refDataSvc(self):
+        return self.__acquire()[0].getService('//blp/refdata')
     
     #-----------------------------------------------------------------------------------------------------
     #------------------------------------------ BDH ------------------------------------------------------
     #-----------------------------------------------------------------------------------------------------
     
     def bdh(self, strSecurity, strFields, startdate, enddate, per='DAILY', perAdj = 'CALENDAR', 
-            days = 'NON_TRADING_WEEKDAYS', fill = 'PREVIOUS_VALUE', curr = "EUR"):
+            days = 'NON_TRADING_WEEKDAYS', fill = 'PREVIOUS_VALUE', curr = "EUR", 
+            chunk_size = None, date_chunk = None, max_in_flight = 4, max_retries = 2, cache = None, field_types = None):
         
         """
             Summary:
                 HistoricalDataRequest ; 
-                Gets historical data for a set of securities and fields
+                Gets historical data for a set of securities and fields.
+                Securities (and optionally dates) are split into chunks, each sent as its own correlated request,
+                with up to max_in_flight chunks outstanding on the session. Failed chunks are re-sent up to
+                max_retries times. Per-chunk statistics are stored in self.bdh_stats.
 
             Inputs:
                 strSecurity: list of str : list of tickers
@@ -59,20 +279,120 @@ class BLP():
                 Days: nonTradingDayFillOption : NON_TRADING_WEEKDAYS*, ALL_CALENDAR_DAYS or ACTIVE_DAYS_ONLY
                 fill: nonTradingDayFillMethod :  PREVIOUS_VALUE, NIL_VALUE
                 Options can be selected these are outlined in “Reference Services and Schemas Guide.”    
+                chunk_size: int, number of securities per request, None sends all securities in one request
+                date_chunk: int, number of calendar years per request, None requests the whole date range at once
+                max_in_flight: int, maximum number of chunk requests outstanding at once
+                max_retries: int, number of times a failed chunk is re-sent before being given up
+                cache: optional cache.BloombergCache ; for float fields, only the dates and tickers missing from it
+                       are requested, then the result is read back from the cache. Other fields are not cached.
+                field_types: optional dict {field: 'float', 'int', 'datetime', 'category' or 'auto'} overriding
+                             the datatypes found by field_types()
             
             Output:
-                A list containing as many dataframes as requested fields          
+                A dict {field: DataFrame} with dates in index and tickers in columns
         """
 
-                ############### Create request ###############
-    
-        request = self.refDataSvc.createRequest('HistoricalDataRequest')
+                ############### Create requests ###############
         
         # Put field and securities in list if single value is passed
         if type(strFields) == str:
             strFields = [strFields]
         if type(strSecurity) == str:
             strSecurity = [strSecurity]
+
+        options = {'periodicitySelection': per, 'periodicityAdjustment': perAdj, 'nonTradingDayFillOption': days, 
+                   'nonTradingDayFillMethod': fill, 'currency': curr}
+
+        # Top-up the cache with what is missing, then serve everything from it ; the cache only stores floats, 
+        # fields of any other datatype are always requested
+        if cache is not None:
+            field_types = {**self.field_types([field for field in strFields if field not in (field_types or {})]), **(field_types or {})}
+            cached = [field for field in strFields if field_types[field] == 'float']
+            live = [field for field in strFields if field not in cached]
+            results = self.bdh(strSecurity, live, startdate, enddate, per, perAdj, days, fill, curr, chunk_size, date_chunk, 
+                               max_in_flight, max_retries, field_types=field_types) if live else {}
+            if cached:
+                for tickers, start, end in cache.missing_history(strSecurity, cached, startdate, enddate, options):
+                    fetched = self.bdh(tickers, cached, start, end, per, perAdj, days, fill, curr, 
+                                       chunk_size, date_chunk, max_in_flight, max_retries, field_types=field_types)
+                    cache.update_history(fetched, tickers, start, end, options)
+                for field, df in cache.get_history(strSecurity, cached, startdate, enddate, options).items():
+                    # Dates as datetime.date, as in a direct request
+                    results[field] = df.set_axis(pd.Index(df.index.date), axis=0)
+            return {field: results[field] for field in strFields}
+
+        chunks = self.__create_bdh_chunks(strSecurity, startdate, enddate, chunk_size, date_chunk)
+        requests = [(i, self.__create_bdh_request(securities, strFields, start, end, options)) 
+                    for i, (securities, start, end) in enumerate(chunks)]
+
+                ############### Send & receive requests ###############
+
+        field_types = field_types or {}
+        kinds = {**self.field_types([field for field in strFields if field not in field_types]), **field_types}
+        accumulator = ColumnarAccumulator(strFields, nb_tickers=len(strSecurity), kinds=kinds)
+        self.bdh_stats = [{'chunk': i, 'securities': len(securities), 'start': start, 'end': end, 'attempts': 0, 
+                           'messages': 0, 'seconds': 0.0, 'status': 'pending'} 
+                          for i, (securities, start, end) in enumerate(chunks)]
+
+        def on_send(i):
+            self.bdh_stats[i]['attempts'] += 1
+            self.bdh_stats[i]['sent'] = time.perf_counter()
+
+        def on_message(i, msg):
+            self.bdh_stats[i]['messages'] += 1
+            if msg.hasElement(RESPONSE_ERROR):
+                self.bdh_stats[i]['status'] = 'error'
+                return
+            self.__parse_bdh_message(msg, accumulator)
+
+        def on_response(i):
+            stats = self.bdh_stats[i]
+            stats['seconds'] += time.perf_counter() - stats.pop('sent')
+            if stats['status'] == 'error':
+                if stats['attempts'] <= max_retries:
+                    stats['status'] = 'pending'
+                    securities, start, end = chunks[i]
+                    return self.__create_bdh_request(securities, strFields, start, end, options)
+                stats['status'] = 'failed'
+                print(f"Chunk {i} failed after {stats['attempts']} attempts")
+            else:
+                stats['status'] = 'done'
+            return None
+
+        print(f"Sending {len(requests)} requests ({max_in_flight} in flight)")
+        self.__run_pipelined(requests, on_message, on_response, max_in_flight, on_send=on_send)
+
+        return accumulator.to_frames()
+
+    def __create_bdh_chunks(self, strSecurity, startdate, enddate, chunk_size, date_chunk):
+        """
+            Summary:
+                Splits the securities in groups of chunk_size and the date range in blocks of date_chunk calendar years.
+            
+            Output:
+                A list of (securities, startdate, enddate) tuples
+        """
+        if chunk_size is None:
+            chunk_size = max(len(strSecurity), 1)
+        security_chunks = [strSecurity[i:i + chunk_size] for i in range(0, len(strSecurity), chunk_size)]
+
+        date_ranges = [(startdate, enddate)]
+        if date_chunk is not None:
+            date_ranges = []
+            start, enddate = pd.Timestamp(startdate), pd.Timestamp(enddate)
+            while start <= enddate:
+                boundary = pd.Timestamp(start.year + date_chunk, 1, 1)
+                date_ranges.append((start, min(boundary - timedelta(days=1), enddate)))
+                start = boundary
+
+        return [(securities, start, end) for securities in security_chunks for start, end in date_ranges]
+
+    def __create_bdh_request(self, strSecurity, strFields, startdate, enddate, options):
+        """
+            Summary:
+                Builds a HistoricalDataRequest for the given securities, fields, dates and periodicity options.
+        """
+        request = self.refDataSvc.createRequest('HistoricalDataRequest')
     
         # Set paramaters :
         for strF in strFields:
@@ -81,66 +401,223 @@ class BLP():
             request.append('securities', strS)
         request.set('startDate', startdate.strftime('%Y%m%d'))
         request.set('endDate', enddate.strftime('%Y%m%d'))
-        request.set('periodicitySelection', per)
-        request.set('periodicityAdjustment', perAdj)
-        request.set('nonTradingDayFillOption', days)
-        request.set('nonTradingDayFillMethod', fill)
-        request.set('currency', curr)
-    
-                ############### Send request ###############
-                
-        requestID = self.session.sendRequest(request)
-        print("Sending request")
-        
-                ############### Receive request ###############
+        for name, value in options.items():
+            request.set(name, value)
+        return request
+
+    @staticmethod
+    def __parse_bdh_message(msg, accumulator):
+        """
+            Summary:
+                Writes the values of a HistoricalDataResponse message into a ColumnarAccumulator.
+        """
+        ticker = msg.getElement(SECURITY_DATA).getElement(SECURITY).getValue()
+        col = accumulator.ticker(ticker)
+            
+        for field_data in msg.getElement(SECURITY_DATA).getElement(FIELD_DATA):
+            row = accumulator.date(field_data.getElement(0).getValue())
+            
+            for i in range(1, (field_data.numElements())):
+                element = field_data.getElement(i)
+                accumulator.decode(str(element.name()), row, col, element)
+
+    def __run_pipelined(self, requests, on_message, on_response, max_in_flight, on_send=None):
+        """
+            Summary:
+                Sends correlated requests and dispatches every PARTIAL_RESPONSE / RESPONSE message to
+                on_message(key, msg) as it arrives (see __stream).
+
+            Inputs:
+                requests: list of (key, request)
+                on_message: callable(key, msg)
+                on_response: callable(key) -> request or None
+                max_in_flight: int
+                on_send: optional callable(key), called each time a request is sent
+        """
+        for key, msg in self.__stream(requests, max_in_flight, on_response, on_send):
+            on_message(key, msg)
+
+    def __stream(self, requests, max_in_flight=1, on_response=None, on_send=None):
+        """
+            Summary:
+                Generator sending correlated requests, keeping at most max_in_flight of them outstanding on the
+                session, and yielding every message of every PARTIAL_RESPONSE / RESPONSE event as it arrives,
+                so that parsing overlaps with the wait for the next event and no message is buffered.
+                Once the final message of a request has been consumed, on_response(key) is called and may return
+                a new request to send again under the same key (e.g. a retry).
+
+            Inputs:
+                requests: list of (key, request)
+                max_in_flight: int
+                on_response: optional callable(key) -> request or None
+                on_send: optional callable(key), called each time a request is sent
+
+            Output:
+                Yields (key, msg) tuples
+        """
+        # A session serves one request loop at a time, or events would be consumed by the wrong caller
+        session, lock = self.__acquire()
+        with lock:
+            if id(session) in _streaming:
+                raise RuntimeError("A request loop is already running on this session ; exhaust or close() the "
+                                   "pending bdh_iter before sending other requests")
+            _streaming.add(id(session))
+            try:
+                yield from self.__stream_locked(session, requests, max_in_flight, on_response, on_send)
+            finally:
+                _streaming.discard(id(session))
+
+    def __stream_locked(self, session, requests, max_in_flight, on_response, on_send):
+        pending = deque(requests)
+        in_flight = {}
+        max_in_flight = max(1, int(max_in_flight))
+
+        def send_next():
+            key, request = pending.popleft()
+            cid = CorrelationId(next(_correlation_ids))
+            in_flight[cid.value()] = (key, cid)
+            if on_send is not None:
+                on_send(key)
+            session.sendRequest(request, correlationId=cid)
+
+        try:
+            while pending and len(in_flight) < max_in_flight:
+                send_next()
+
+            idle = time.perf_counter()
+            while in_flight:
+                event = session.nextEvent(EVENT_TIMEOUT)
+
+                # Nothing received for too long : a response was lost, the outstanding requests are given up
+                if event.eventType() == TIMEOUT:
+                    if time.perf_counter() - idle > self.timeout:
+                        raise TimeoutError(f"No response in {self.timeout} seconds, {len(in_flight)} requests outstanding")
+                    continue
+                idle = time.perf_counter()
+
+                # Ignores anything that's not partial or final
+                if (event.eventType() != RESPONSE) & (event.eventType() != PARTIAL_RESPONSE):
+                    continue
+
+                cids = []
+                for msg in event:
+                    cid = msg.correlationIds()[0].value()
+                    if cid not in in_flight:
+                        continue
+                    if cid not in cids:
+                        cids.append(cid)
+                    yield in_flight[cid][0], msg
+
+                # Final event for these requests : free their slots and send the next ones
+                if event.eventType() == RESPONSE:
+                    for cid in cids:
+                        key, _ = in_flight.pop(cid)
+                        retry = on_response(key) if on_response is not None else None
+                        if retry is not None:
+                            pending.append((key, retry))
+                        if pending:
+                            send_next()
+        finally:
+            # Loop left early (consumer stopped iterating or raised) : cancels what is still outstanding before the
+            # session lock is released, so that no reply is left for the next caller
+            for _, cid in in_flight.values():
+                try:
+                    session.cancel(cid)
+                except Exception:
+                    pass
+
+    def bdh_iter(self, strSecurity, strFields, startdate, enddate, per='DAILY', perAdj = 'CALENDAR', 
+                 days = 'NON_TRADING_WEEKDAYS', fill = 'PREVIOUS_VALUE', curr = "EUR", 
+                 chunk_size = None, max_in_flight = 4, field_types = None):
         
-        dict_Security_Fields = {}
-        dict_tickers = {}
-        list_msg = []
+        """
+            Summary:
+                Streaming HistoricalDataRequest ; same request as bdh, but yields the data of each security as
+                soon as its message arrives instead of returning everything at the end.
+                The session is held until the generator is exhausted or closed : a consumer stopping early must
+                call close() on it (or let it be garbage collected) before sending other requests on the session.
+
+            Inputs:
+                Same as bdh
+
+            Output:
+                Yields (ticker, DataFrame) tuples, each DataFrame with dates in index and fields in columns
+        """
+
+        if type(strFields) == str:
+            strFields = [strFields]
+        if type(strSecurity) == str:
+            strSecurity = [strSecurity]
+
+        options = {'periodicitySelection': per, 'periodicityAdjustment': perAdj, 'nonTradingDayFillOption': days, 
+                   'nonTradingDayFillMethod': fill, 'currency': curr}
+        field_types = field_types or {}
+        kinds = {**self.field_types([field for field in strFields if field not in field_types]), **field_types}
+        chunks = self.__create_bdh_chunks(strSecurity, startdate, enddate, chunk_size, None)
+        requests = [(i, self.__create_bdh_request(securities, strFields, start, end, options)) 
+                    for i, (securities, start, end) in enumerate(chunks)]
+
+        for i, msg in self.__stream(requests, max_in_flight):
+            if msg.hasElement(RESPONSE_ERROR):
+                print(f"Chunk {i} failed")
+                continue
+            accumulator = ColumnarAccumulator(strFields, nb_tickers=1, kinds=kinds)
+            self.__parse_bdh_message(msg, accumulator)
+            frames = accumulator.to_frames()
+            for ticker in accumulator.ticker_pos:
+                yield ticker, pd.DataFrame({field: frames[field][ticker] for field in strFields})
+    
+    def field_types(self, strFields):
         
-        for field in strFields:
-            globals()['dict_'+ field]= {}
+        """
+            Summary:
+                Datatype of each field, looked up once in the local FIELD_TYPES registry, then for unknown fields
+                with a FieldInfoRequest on //blp/apiflds. Results are added to the registry. Fields whose datatype
+                cannot be found are 'auto' (float, else string).
+
+            Inputs:
+                strFields: list of str : list of fields
+
+            Output:
+                A dict {field: 'float', 'int', 'datetime', 'category' or 'auto'}
+        """
         
-        while True:
-            event = self.session.nextEvent()
-            
-            # Ignores anything that's not partial or final
-            if (event.eventType() !=blpapi.event.Event.RESPONSE) & (event.eventType() !=blpapi.event.Event.PARTIAL_RESPONSE):
-                continue      
-                        
-            # Extract the response message
-            msg = blpapi.event.MessageIterator(event).__next__()
-            
-            # Fill message list
-            list_msg.append(msg)
-                   
-            # Break loop if response is final
-            if event.eventType() == blpapi.event.Event.RESPONSE:
-                break        
-
-                ############### Exploit data ###############
+        if type(strFields) == str:
+            strFields = [strFields]
+
+        missing = [field for field in strFields if field.upper() not in FIELD_TYPES]
+        if missing:
+            try:
+                FIELD_TYPES.update(self.__query_field_types(missing))
+            except Exception as error:
+                print(f"Field types lookup failed ({error})")
+        return {field: FIELD_TYPES.get(field.upper(), 'auto') for field in strFields}
+
+    def __query_field_types(self, strFields):
+        """
+            Summary:
+                FieldInfoRequest on //blp/apiflds.
+
+            Output:
+                A dict {FIELD: datatype} for the fields found
+        """
+        session, _ = self.__acquire(("//blp/refdata", "//blp/apiflds"))
+        if not self.shared:
+            session.openService("//blp/apiflds")
+        request = session.getService("//blp/apiflds").createRequest("FieldInfoRequest")
+        for strF in strFields:
+            request.append("id", strF)
         
-        for msg in list_msg:
-            ticker = msg.getElement(SECURITY_DATA).getElement(SECURITY).getValue()
- 
-            # Create dict for each field
-            for field in strFields:
-                globals()['dict_'+ field][ticker] = {}
-                
-            for field_data in msg.getElement(SECURITY_DATA).getElement(FIELD_DATA):
-                dat = field_data.getElement(0).getValue()
-                
-                for i in range(1, (field_data.numElements())):
-                    field_name = str(field_data.getElement(i).name())
-                    try:
-                        globals()['dict_'+field_name][ticker][dat] = field_data.getElement(i).getValueAsFloat()
-                    except:
-                        globals()['dict_'+field_name][ticker][dat] = field_data.getElement(i).getValueAsString()
-                        
-            for field in strFields:
-                dict_Security_Fields[field] = pd.DataFrame.from_dict(globals()['dict_'+ field], orient='columns')
-                
-        return dict_Security_Fields    
+        types = {}
+        for key, msg in self.__stream([(0, request)]):
+            for field_data in msg.getElement(FIELD_DATA):
+                if not field_data.hasElement(FIELD_INFO):
+                    continue
+                info = field_data.getElement(FIELD_INFO)
+                datatype = APIFLDS_TYPES.get(info.getElementAsString(DATATYPE))
+                if datatype is not None:
+                    types[info.getElementAsString(MNEMONIC).upper()] = datatype
+        return types
     
     #-----------------------------------------------------------------------------------------------------
     #------------------------------------------- BDP -----------------------------------------------------
@@ -185,54 +662,33 @@ class BLP():
             o.setElement('fieldId', strOverrideField)
             o.setElement('value', strOverrideValue)
 
-                ############### Send request ###############
-
-        requestID = self.session.sendRequest(request)
-        print("Sending request")
-        
-                ############### Receive request ###############             
-                
-        list_msg = []
-        dict_Security_Fields = {}
-        dict_tickers = {}
-        list_pd = []
-        
-        while True:
-            event = self.session.nextEvent()
-            
-            # Ignores anything that's not partial or final
-            if (event.eventType() !=blpapi.event.Event.RESPONSE) & (event.eventType() !=blpapi.event.Event.PARTIAL_RESPONSE):
-                continue
-            
-            # Extract the response message
-            msg = blpapi.event.MessageIterator(event).__next__()
-            
-            # Fill message list
-            list_msg.append(msg)
-            
-            # Break loop if response is final
-            if event.eventType() == blpapi.event.Event.RESPONSE:
-                break    
+                ############### Send & receive request ###############
 
-                ############### Extract the data ###############
+        kinds = {field.upper(): kind for field, kind in self.field_types(strFields).items()}
+        tickers = []
+        columns = {}
 
-        for msg in list_msg:
+        def on_message(key, msg):
             for sec_data in msg.getElement(SECURITY_DATA): # Ticker
-                ticker = sec_data.getElement(SECURITY).getValue()
-                dict_Security_Fields = {}
+                row = len(tickers)
+                tickers.append(sec_data.getElement(SECURITY).getValue())
                 for field in sec_data.getElement(FIELD_DATA) : # Fields
-                    dict_Security_Fields[field.name()] = field.getValue()
-                dict_tickers[ticker] = pd.DataFrame.from_dict(dict_Security_Fields, orient='index')
-                dict_tickers[ticker].columns = [ticker] 
-                list_pd.append(dict_tickers[ticker].T)
-        
-        return pd.concat(list_pd)
+                    name = str(field.name())
+                    columns.setdefault(name, {})[row] = extract_value(field, kinds.get(name.upper(), 'auto'))
+
+        print("Sending request")
+        self.__run_pipelined([(0, request)], on_message, None, 1)
+
+        # One typed column per field
+        rows = range(len(tickers))
+        return pd.DataFrame({name: pd.Series([values.get(row) for row in rows], dtype=BDP_DTYPES[kinds.get(name.upper(), 'auto')]) 
+                             for name, values in columns.items()}).set_axis(tickers)
     
     #-----------------------------------------------------------------------------------------------------
     #------------------------------------------- BDS -----------------------------------------------------
     #-----------------------------------------------------------------------------------------------------
 
-    def bds(self, strSecurity, strFields, snapshot_date, curr=None):
+    def bds(self, strSecurity, strFields, snapshot_date, curr=None, cache=None):
         
         """
             Summary:
@@ -243,20 +699,96 @@ class BLP():
                 strFields: list of str: list of fields, must be static fields (e.g., px_last instead of last_price)
                 snapshot_date: date: the specific date for which you want the snapshot data
                 curr: string, else default currency is used
+                cache: optional cache.BloombergCache, the snapshot is only requested if it is not cached yet
 
             Output:
                 A DataFrame containing snapshot data for the requested securities and fields at the specified date
         """
+
+        if cache is not None:
+            return self.bds_batch(strSecurity, strFields, [snapshot_date], cache=cache)[snapshot_date]
            
                 ############### Create request ###############
     
-        request = self.refDataSvc.createRequest('ReferenceDataRequest')
-        
         # Put field and securities in list if single value is passed
         if type(strFields) == str:
             strFields = [strFields]
         if type(strSecurity) == str:
             strSecurity = [strSecurity]
+
+        request = self.__create_bds_request(strSecurity, strFields, snapshot_date)
+        
+                ############### Send & receive request ###############
+        
+        dict_Security_Fields = {}
+        list_compo = []
+        field_name = strFields[0]
+
+        def on_message(key, msg):
+            self.__parse_bds_message(msg, field_name, snapshot_date, list_compo, dict_Security_Fields)
+
+        print("Sending request")
+        self.__run_pipelined([(0, request)], on_message, None, 1)
+    
+        return dict_Security_Fields
+
+    def bds_batch(self, strSecurity, strFields, snapshot_dates, max_in_flight=8, cache=None):
+        
+        """
+            Summary:
+                Pipelined Reference Data Request ; sends one END_DT snapshot request per date, each with its own
+                CorrelationId, keeps up to max_in_flight of them outstanding on the session and routes every
+                response message back to its date as it arrives.
+
+            Inputs:
+                strSecurity: list of str: list of tickers
+                strFields: list of str: list of bulk fields (e.g. INDX_MWEIGHT_HIST)
+                snapshot_dates: list of dates: one snapshot request is sent per date
+                max_in_flight: int: maximum number of requests outstanding on the session at once
+                cache: optional cache.BloombergCache, only the snapshots missing from it are requested
+
+            Output:
+                A dict {snapshot_date: {ticker: DataFrame}}, each value shaped like the output of bds
+        """
+
+        if type(strFields) == str:
+            strFields = [strFields]
+        if type(strSecurity) == str:
+            strSecurity = [strSecurity]
+        field_name = strFields[0]
+
+        if cache is not None:
+            cached = {strS: cache.load_snapshots(strS, field_name) for strS in strSecurity}
+            missing = [date for date in snapshot_dates if any(pd.Timestamp(date) not in cached[strS] for strS in strSecurity)]
+            fetched = self.bds_batch(strSecurity, strFields, missing, max_in_flight) if missing else {}
+            for strS in strSecurity:
+                new = {date: fetched[date][strS][date].tolist() for date in missing if strS in fetched[date]}
+                cache.update_snapshots(strS, field_name, new)
+                cached[strS].update({pd.Timestamp(date): members for date, members in new.items()})
+            return {date: {strS: pd.DataFrame(cached[strS][pd.Timestamp(date)], columns=[date]) 
+                           for strS in strSecurity if pd.Timestamp(date) in cached[strS]} 
+                    for date in snapshot_dates}
+
+                ############### Send & receive requests ###############
+
+        requests = [(date, self.__create_bds_request(strSecurity, strFields, date)) for date in snapshot_dates]
+        list_compo = {date: [] for date in snapshot_dates}
+        results = {date: {} for date in snapshot_dates}
+
+        def on_message(date, msg):
+            self.__parse_bds_message(msg, field_name, date, list_compo[date], results[date])
+
+        print(f"Sending {len(requests)} requests ({max_in_flight} in flight)")
+        self.__run_pipelined(requests, on_message, None, max_in_flight)
+
+        return {date: results[date] for date in snapshot_dates}
+
+    def __create_bds_request(self, strSecurity, strFields, snapshot_date):
+        """
+            Summary:
+                Builds a ReferenceDataRequest with an END_DT override set to snapshot_date.
+        """
+        request = self.refDataSvc.createRequest('ReferenceDataRequest')
     
         # Set paramaters :
         for strF in strFields:
@@ -269,55 +801,64 @@ class BLP():
             override = overrides.appendElement()
             override.setElement('fieldId', 'END_DT')
             override.setElement('value', snapshot_date.strftime('%Y%m%d'))
-        
-                ############### Send request ###############
+        return request
 
-        requestID = self.session.sendRequest(request)
-        print("Sending request")
-        
-                ############### Receive request ###############
-        
-        list_msg = []
-        dict_Security_Fields = {}
-        list_compo = []
-        field_name = strFields[0]
-        
-        while True:
-            event = self.session.nextEvent()
-            
-            # Ignores anything that's not partial or final
-            if (event.eventType() !=blpapi.event.Event.RESPONSE) & (event.eventType() !=blpapi.event.Event.PARTIAL_RESPONSE):
-                continue
-            
-            # Extract the response message
-            msg = blpapi.event.MessageIterator(event).__next__() 
-            
-            # Fill message list
-            list_msg.append(msg)
-            
-            # Break loop if response is final
-            if event.eventType() == blpapi.event.Event.RESPONSE:
-                break        
-        
-                ############### Exploit data ###############
-    
-        for msg in list_msg:
-            for sec_data in msg.getElement(SECURITY_DATA):  # Ticker
-                ticker = sec_data.getElement(SECURITY).getValue()
-                dict_Security_Fields = {}
-                for member_data in sec_data.getElement(FIELD_DATA).getElement(field_name):
-                    member = member_data.getElementAsString("Index Member") 
-                    list_compo.append(member)
-                dict_Security_Fields[ticker] = pd.DataFrame(list_compo, columns=[snapshot_date])
-    
-        return dict_Security_Fields
+    @staticmethod
+    def __parse_bds_message(msg, field_name, snapshot_date, list_compo, dict_Security_Fields):
+        """
+            Summary:
+                Appends the members found in a bulk-field response message to list_compo and
+                stores the resulting one-column DataFrame in dict_Security_Fields[ticker].
+        """
+        for sec_data in msg.getElement(SECURITY_DATA):  # Ticker
+            ticker = sec_data.getElement(SECURITY).getValue()
+            for member_data in sec_data.getElement(FIELD_DATA).getElement(field_name):
+                member = member_data.getElementAsString("Index Member") 
+                list_compo.append(member)
+            dict_Security_Fields[ticker] = pd.DataFrame(list_compo, columns=[snapshot_date])
     
+    #-----------------------------------------------------------------------------------------------------
+    #------------------------------------------ Subscription ---------------------------------------------
+    #-----------------------------------------------------------------------------------------------------
+
+    def subscribe(self, strSecurity, capacity=1024, interval=None, session=None):
+        
+        """
+            Summary:
+                Real-time subscription ; streams LAST_PRICE and VOLUME ticks of the securities from //blp/mktdata
+                into an in-memory ring buffer. Each feed runs on a session of its own, started for it and stopped
+                with it, so that its reading thread never consumes the events of request loops or of other feeds.
+
+            Inputs:
+                strSecurity: list of str: list of tickers (e.g. the current index composition)
+                capacity: int: number of ticks kept per security
+                interval: float: optional conflation interval in seconds
+                session: optional started session with //blp/mktdata open, used by this feed only (e.g. a FakeSession)
+
+            Output:
+                A started live.LiveFeed ; call snapshot() for the current state and stop() to unsubscribe
+        """
+
+        if type(strSecurity) == str:
+            strSecurity = [strSecurity]
+
+        if session is not None:
+            return LiveFeed(session, strSecurity, capacity, interval=interval).start()
+        session = session_pool.create(("//blp/mktdata",))
+        return LiveFeed(session, strSecurity, capacity, interval=interval, close_session=True).start()
+
     def closeSession(self):
+        # The shared session stays open for the next callers, it is stopped when the process exits
+        if self.shared:
+            print("Session released")
+            return
         print("Session closed")
         self.session.stop()
 
 
-def fetch_bloomberg_data(start_date, end_date, index_ticker, data_fields = ["PX_LAST", "PX_VOLUME"]):
+def fetch_bloomberg_data(start_date, end_date, index_ticker, data_fields = ["PX_LAST", "PX_VOLUME"], 
+                         max_in_flight = 8, chunk_size = 200, session = None, cache = None, 
+                         skip_unchanged = False, as_store = False):
     """
     Fetches historical market data and index compositions from Bloomberg for specified tickers over a given date range.
     
@@ -325,36 +866,91 @@ def fetch_bloomberg_data(start_date, end_date, index_ticker, data_fields = ["PX_
     :param end_date (datetime): The end of the date range for data retrieval.
     :param index_ticker (str): The Bloomberg ticker for the index whose data is to be fetched.
     :param data_fields (list of str): Specific fields of data to retrieve, default is last price and volume.
+    :param max_in_flight (int): Maximum number of composition snapshot requests outstanding at once.
+    :param chunk_size (int): Number of securities per historical data request.
+    :param session: Optional started session to use instead of a new blpapi.Session (e.g. a FakeSession).
+    :param cache (BloombergCache): Optional local cache ; only history and snapshots missing from it are requested.
+    :param skip_unchanged (bool): If True, compositions are first fetched on a coarse grid of dates, and the dates
+                                  in between two identical snapshots are not requested (see fetch_compositions).
+    :param as_store (bool): If True, compositions are returned as a CompositionStore instead of a DataFrame.
 
     :returns : A dictionary containing historical data for all unique constituents of the index
-               and a DataFrame with index compositions on each date.
+               and a DataFrame (or CompositionStore) with index compositions on each date.
     """
     
-    blp = BLP()
+    blp = BLP(session=session)
 
     # Generate a list of dates in monthly intervals
     dates_list = [start_date + i * timedelta(days=30) for i in range((end_date - start_date).days // 30 + 1)]
-    
-    strFields_compo = ["INDX_MWEIGHT_HIST"]  
-    tickers = [index_ticker]
-    df_compo = pd.DataFrame()
-
-    for date in dates_list:
-        # Fetch index compositions for each date
-        results = blp.bds(strSecurity=tickers, strFields=strFields_compo, snapshot_date=date)
-        new_column = results[tickers[0]]
-        # Filter out entries where the column has digits
-        new_column = new_column[~new_column[date].astype(str).apply(lambda x: any(char.isdigit() for char in x))]
-        df_compo[date] = new_column[date]
-
-    # Flatten tickers to get a unique list for all dates
-    flattened_data = df_compo.values.ravel()
-    flattened_data_unique = list(set(flattened_data))
-    list_tickers = [str(ticker) + " Equity" for ticker in flattened_data_unique]
+
+    # Fetch index compositions, several requests in flight at once
+    store = fetch_compositions(blp, index_ticker, dates_list, max_in_flight=max_in_flight, cache=cache, 
+                               skip_unchanged=skip_unchanged)
+
+    # Every ticker that has been in the index, in a reproducible order so that requests can be replayed
+    list_tickers = [str(ticker) + " Equity" for ticker in store.tickers]
 
     # Fetch data for the tickers
     tickers = list_tickers
-    dict_data = blp.bdh(strSecurity=tickers, strFields=data_fields, startdate=start_date, enddate=end_date, per='MONTHLY', curr="USD")
+    dict_data = blp.bdh(strSecurity=tickers, strFields=data_fields, startdate=start_date, enddate=end_date, per='MONTHLY', curr="USD", 
+                        chunk_size=chunk_size, cache=cache)
     blp.closeSession() 
 
-    return dict_data, df_compo
\ No newline at end of file
+    return dict_data, (store if as_store else store.to_frame())
+
+
+def fetch_compositions(blp, index_ticker, dates_list, field = "INDX_MWEIGHT_HIST", max_in_flight = 8, cache = None, 
+                       skip_unchanged = False, step = 6):
+    """
+    Fetches the composition of an index on each date into a delta-encoded CompositionStore.
+    
+    :param blp (BLP): Open BLP object.
+    :param index_ticker (str): The Bloomberg ticker of the index.
+    :param dates_list (list of datetime): Snapshot dates.
+    :param field (str): Bulk field listing the index members.
+    :param max_in_flight (int): Maximum number of snapshot requests outstanding at once.
+    :param cache (BloombergCache): Optional local cache of snapshots.
+    :param skip_unchanged (bool): If True, snapshots are first fetched every step dates ; between two identical
+                                  snapshots the dates in between are assumed unchanged and not requested, otherwise
+                                  the interval is bisected. A change reverted within an interval is not seen.
+    :param step (int): Spacing of the coarse grid of dates used when skip_unchanged is True.
+
+    :returns : A CompositionStore with one snapshot per date.
+    """
+    members = {}
+
+    def fetch(positions):
+        if not positions:
+            return
+        snapshots = blp.bds_batch(strSecurity=[index_ticker], strFields=[field], 
+                                  snapshot_dates=[dates_list[p] for p in positions], max_in_flight=max_in_flight, cache=cache)
+        for p in positions:
+            column = snapshots[dates_list[p]][index_ticker][dates_list[p]].astype(str)
+            # Filter out entries which have digits
+            members[p] = column[~column.str.contains(r'\d')].tolist()
+
+    if not skip_unchanged:
+        fetch(list(range(len(dates_list))))
+    else:
+        grid = sorted(set(range(0, len(dates_list), step)) | {len(dates_list) - 1})
+        fetch(grid)
+        intervals = list(zip(grid[:-1], grid[1:]))
+        while intervals:
+            to_fetch, next_intervals = [], []
+            for a, b in intervals:
+                if b - a <= 1:
+                    continue
+                if set(members[a]) == set(members[b]):
+                    for p in range(a + 1, b):
+                        members[p] = members[a]
+                else:
+                    mid = (a + b) // 2
+                    to_fetch.append(mid)
+                    next_intervals += [(a, mid), (mid, b)]
+            fetch(to_fetch)
+            intervals = next_intervals
+
+    store = CompositionStore()
+    for p, date in enumerate(dates_list):
+        store.add_snapshot(date, members[p])
+    return store
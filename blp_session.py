@@ -0,0 +1,508 @@
+from contextlib import contextmanager
+import atexit
+import heapq
+import pickle
+import itertools
+import threading
+import time
+
+# Event types of blpapi.Event (same values), so that sessions can be faked without blpapi installed
+ADMIN, SESSION_STATUS, SUBSCRIPTION_STATUS, REQUEST_STATUS, RESPONSE, PARTIAL_RESPONSE = 1, 2, 3, 4, 5, 6
+SUBSCRIPTION_DATA, SERVICE_STATUS, TIMEOUT = 8, 9, 10
+
+
+class CorrelationId:
+    """Minimal stand-in for blpapi.CorrelationId ; ids created without a value are numbered automatically."""
+
+    __counter = itertools.count(1)
+
+    def __init__(self, value=None):
+        """
+        :param value: Integer identifying the request or subscription, a new one by default.
+        """
+        self._value = next(CorrelationId.__counter) if value is None else value
+
+    def value(self):
+        return self._value
+
+    def __eq__(self, other):
+        return isinstance(other, CorrelationId) and other._value == self._value
+
+    def __hash__(self):
+        return hash(self._value)
+
+    def __repr__(self):
+        return f"CorrelationId({self._value})"
+
+
+class FakeElement:
+    """Minimal stand-in for blpapi.Element, built from plain Python values (dicts, lists and scalars)."""
+
+    def __init__(self, name, value):
+        """
+        :param name: Name of the element.
+        :param value: A dict (complex element), a list (array element) or a scalar.
+        """
+        self._name = str(name)
+        self._value = value
+
+    def name(self):
+        return self._name
+
+    def isArray(self):
+        return isinstance(self._value, list)
+
+    def numElements(self):
+        return len(self._value) if isinstance(self._value, dict) else 0
+
+    def numValues(self):
+        return len(self._value) if isinstance(self._value, list) else 1
+
+    def hasElement(self, name):
+        return isinstance(self._value, dict) and str(name) in self._value
+
+    def getElement(self, name):
+        if isinstance(name, int):
+            key = list(self._value.keys())[name]
+            return FakeElement(key, self._value[key])
+        return FakeElement(name, self._value[str(name)])
+
+    def getValue(self, index=0):
+        if isinstance(self._value, list):
+            return self.__wrap(self._value[index])
+        return self._value
+
+    def getValueAsFloat(self, index=0):
+        return float(self.getValue(index))
+
+    def getValueAsInteger(self, index=0):
+        return int(self.getValue(index))
+
+    def getValueAsString(self, index=0):
+        return str(self.getValue(index))
+
+    def getValueAsDatetime(self, index=0):
+        return self.getValue(index)
+
+    def getElementAsString(self, name):
+        return self.getElement(name).getValueAsString()
+
+    def getElementAsFloat(self, name):
+        return self.getElement(name).getValueAsFloat()
+
+    def toPy(self):
+        return self._value
+
+    def __wrap(self, value):
+        return FakeElement("", value) if isinstance(value, (dict, list)) else value
+
+    def __iter__(self):
+        if isinstance(self._value, dict):
+            return (FakeElement(key, value) for key, value in self._value.items())
+        return (self.__wrap(value) for value in self._value)
+
+
+class FakeMessage(FakeElement):
+    """Minimal stand-in for blpapi.Message: an element tree tagged with the request's correlation id."""
+
+    def __init__(self, payload, correlation_id, message_type="Response"):
+        super().__init__(message_type, payload)
+        self._correlation_id = correlation_id
+
+    def correlationIds(self):
+        return [self._correlation_id]
+
+    def messageType(self):
+        return self._name
+
+    def asElement(self):
+        return self
+
+
+class FakeEvent:
+    """Minimal stand-in for blpapi.Event."""
+
+    def __init__(self, event_type, messages=()):
+        self._event_type = event_type
+        self._messages = list(messages)
+
+    def eventType(self):
+        return self._event_type
+
+    def __iter__(self):
+        return iter(self._messages)
+
+
+class FakeRequest:
+    """Minimal stand-in for blpapi.Request, recording the fields, securities, options and overrides set on it."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._values = {}
+
+    def append(self, name, value):
+        self._values.setdefault(name, []).append(value)
+
+    def set(self, name, value):
+        self._values[name] = value
+
+    def getElement(self, name):
+        return _FakeRequestArray(self._values.setdefault(name, []))
+
+    def asElement(self):
+        return FakeElement(self.operation, self._values)
+
+    def toPy(self):
+        return self._values
+
+
+class FakeSubscriptionList:
+    """Minimal stand-in for blpapi.SubscriptionList, recording the (topic, fields, options, correlation id) added to it."""
+
+    def __init__(self):
+        self.subscriptions = []
+
+    def add(self, topic, fields=None, options=None, correlationId=None):
+        self.subscriptions.append((topic, fields, options, correlationId))
+
+    def size(self):
+        return len(self.subscriptions)
+
+
+class _FakeRequestArray:
+    def __init__(self, values):
+        self._values = values
+
+    def appendElement(self):
+        item = _FakeRequestItem()
+        self._values.append(item.values)
+        return item
+
+
+class _FakeRequestItem:
+    def __init__(self):
+        self.values = {}
+
+    def setElement(self, name, value):
+        self.values[name] = value
+
+
+class _FakeService:
+    def __init__(self, name):
+        self.name = name
+
+    def createRequest(self, operation):
+        return FakeRequest(operation)
+
+
+class FakeSession:
+    """
+    Local stand-in for blpapi.Session. Each request sent is answered by a user supplied responder. Every response
+    becomes available latency seconds after it was sent, its partial events interval seconds apart, and the events
+    of all requests in flight are served back interleaved, in order of availability, so that the correlation and
+    pipelining logic of BLP can be exercised and timed without a terminal.
+    """
+
+    def __init__(self, responder, latency:float=0.0, interval:float=0.0, messages_per_event:int=1):
+        """
+        :param responder: Callable taking a request and returning the non-empty list of message payloads (dicts) of its response.
+        :param latency: Seconds between sending a request and its first event being available.
+        :param interval: Seconds between two consecutive events of the same response.
+        :param messages_per_event: Number of messages grouped in each PARTIAL_RESPONSE / RESPONSE event.
+        """
+        self.responder = responder
+        self.latency = latency
+        self.interval = interval
+        self.messages_per_event = max(1, int(messages_per_event))
+        self.requests = []
+        self.__events = []
+        self.__sent = 0
+        # Guards the queue of events, which push and nextEvent may use from different threads
+        self.__condition = threading.Condition()
+
+    def start(self):
+        return True
+
+    def stop(self):
+        return True
+
+    def openService(self, name):
+        return True
+
+    def getService(self, name):
+        return _FakeService(name)
+
+    def sendRequest(self, request, correlationId=None):
+        if correlationId is None:
+            correlationId = CorrelationId()
+        self.requests.append(request)
+        payloads = list(self.responder(request))
+        sent = time.perf_counter()
+
+        chunks = [payloads[i:i + self.messages_per_event] for i in range(0, len(payloads), self.messages_per_event)]
+        with self.__condition:
+            for k, chunk in enumerate(chunks):
+                event_type = RESPONSE if k == len(chunks) - 1 else PARTIAL_RESPONSE
+                ready = sent + self.latency + k * self.interval
+                # Ties are served round robin over the requests in flight
+                heapq.heappush(self.__events, (ready, k, self.__sent, event_type, correlationId, chunk))
+            self.__sent += 1
+            self.__condition.notify_all()
+        return correlationId
+
+    def cancel(self, correlationId):
+        """
+        Drops the events of a request not served yet.
+        """
+        with self.__condition:
+            self.__events = [entry for entry in self.__events if entry[4] != correlationId]
+            heapq.heapify(self.__events)
+
+    def subscribe(self, subscriptions, *args, **kwargs):
+        self.subscriptions = subscriptions
+
+    def unsubscribe(self, subscriptions):
+        self.subscriptions = None
+
+    def push(self, event):
+        """
+        Queues an event (e.g. a synthetic SUBSCRIPTION_DATA FakeEvent) to be served immediately by nextEvent.
+        """
+        with self.__condition:
+            heapq.heappush(self.__events, (time.perf_counter(), 0, self.__sent, event.eventType(), None, event))
+            self.__sent += 1
+            self.__condition.notify_all()
+
+    def nextEvent(self, timeout=0):
+        """
+        Waits for the next event to be available, as blpapi.Session.nextEvent.
+
+        :param timeout: Milliseconds after which a TIMEOUT event is returned if no event is available, 0 waits forever.
+        """
+        deadline = time.perf_counter() + timeout / 1000 if timeout else None
+        with self.__condition:
+            while True:
+                now = time.perf_counter()
+                if self.__events and self.__events[0][0] <= now:
+                    break
+                if deadline is not None and now >= deadline:
+                    return FakeEvent(TIMEOUT)
+                # Sleeps until the next event is ready, the deadline passes or an event is queued
+                wait = self.__events[0][0] - now if self.__events else None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.__condition.wait(wait)
+            _, _, _, event_type, correlation_id, chunk = heapq.heappop(self.__events)
+
+        if isinstance(chunk, FakeEvent):
+            return chunk
+        return FakeEvent(event_type, [FakeMessage(payload, correlation_id) for payload in chunk])
+
+
+class ReplaySession(FakeSession):
+    """
+    FakeSession serving the responses saved by a RecordingSession, optionally with latency and chunking injected,
+    so that the fetch path can be profiled and regression-tested on a machine without a terminal.
+    """
+
+    def __init__(self, path:str, latency:float=0.0, interval:float=0.0, messages_per_event:int=1):
+        """
+        :param path: Pickle file written by RecordingSession.save.
+        :param latency: Seconds between sending a request and its first event being available.
+        :param interval: Seconds between two consecutive events of the same response.
+        :param messages_per_event: Number of messages grouped in each event.
+        """
+        with open(path, 'rb') as file:
+            self.recording = pickle.load(file)
+        super().__init__(self.__respond, latency, interval, messages_per_event)
+
+    def __respond(self, request):
+        key = request_key(request)
+        if key not in self.recording:
+            raise KeyError(f"No recorded response for {key[0]} {key[1][:200]}")
+        return self.recording[key]
+
+
+class RecordingSession:
+    """
+    Wraps a started blpapi.Session, forwarding every call to it, and records each request along with the
+    messages of its response so that they can be saved to disk and served back by a ReplaySession.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: Started blpapi.Session (or any object with the same interface).
+        """
+        self.session = session
+        self.recording = {}
+        self.__keys = {}
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def sendRequest(self, request, correlationId=None, *args, **kwargs):
+        if correlationId is None:
+            import blpapi
+            correlationId = blpapi.CorrelationId()
+        key = request_key(request)
+        self.recording[key] = []
+        self.__keys[correlationId.value()] = key
+        return self.session.sendRequest(request, correlationId, *args, **kwargs)
+
+    def nextEvent(self, timeout=0):
+        event = self.session.nextEvent(timeout)
+        if event.eventType() in (RESPONSE, PARTIAL_RESPONSE):
+            for msg in event:
+                key = self.__keys.get(msg.correlationIds()[0].value())
+                if key is not None:
+                    self.recording[key].append(msg.asElement().toPy())
+        return event
+
+    def save(self, path:str):
+        """
+        Writes the recorded requests and responses to a pickle file.
+
+        :param path: Destination file.
+        """
+        with open(path, 'wb') as file:
+            pickle.dump(self.recording, file)
+
+
+def request_key(request) -> tuple:
+    """
+    Builds the key identifying a request in a recording.
+
+    :param request: blpapi.Request or FakeRequest.
+    :return: Tuple (operation name, repr of the request content).
+    """
+    element = request.asElement()
+    return str(element.name()), repr(element.toPy())
+
+
+class SessionPool:
+    """
+    Process-wide pool of long-lived Bloomberg sessions, one per server, shared between BLP instances (and
+    Streamlit reruns) so that session startup and service opening are only paid once. Each service is opened once
+    per session, sessions are health-checked before being handed out and restarted if needed, and all of them
+    are stopped when the process exits. A session serves one request loop at a time : callers hold its lock.
+    """
+
+    def __init__(self, factory=None):
+        """
+        :param factory: Optional callable(host, port) returning a new, not yet started session. Defaults to blpapi.Session.
+        """
+        self.factory = factory if factory is not None else self.__new_blpapi_session
+        self.stats = {'started': 0, 'startup_seconds': 0.0, 'acquired': 0, 'reused': 0, 'restarted': 0}
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    @staticmethod
+    def __new_blpapi_session(host, port):
+        import blpapi
+        options = blpapi.SessionOptions()
+        options.setServerHost(host)
+        options.setServerPort(port)
+        return blpapi.Session(options)
+
+    def acquire(self, services=("//blp/refdata",), host:str="localhost", port:int=8194, name:str="default") -> tuple:
+        """
+        Returns the shared session of a server, starting it and opening the requested services if needed.
+
+        :param services: Services that must be open on the session.
+        :param host: Server host.
+        :param port: Server port.
+        :param name: Name of the session, to keep separate sessions on the same server (e.g. for subscriptions).
+        :return: Tuple (session, lock) ; the lock must be held while sending requests and reading events.
+        """
+        with self.__lock:
+            self.stats['acquired'] += 1
+            entry = self.__sessions.get((host, port, name))
+            if entry is not None and not self.__is_healthy(entry):
+                self.stats['restarted'] += 1
+                self.__stop(entry)
+                entry = None
+            if entry is None:
+                start = time.perf_counter()
+                session = self.factory(host, port)
+                if not session.start():
+                    raise ConnectionError(f"Failed to start session on {host}:{port}")
+                entry = self.__sessions[(host, port, name)] = {'session': session, 'lock': threading.RLock(), 'services': set()}
+                self.stats['started'] += 1
+                self.stats['startup_seconds'] += time.perf_counter() - start
+            else:
+                self.stats['reused'] += 1
+
+            for service in services:
+                if service not in entry['services']:
+                    start = time.perf_counter()
+                    if not entry['session'].openService(service):
+                        raise ConnectionError(f"Failed to open {service}")
+                    entry['services'].add(service)
+                    self.stats['startup_seconds'] += time.perf_counter() - start
+            return entry['session'], entry['lock']
+
+    def create(self, services=("//blp/refdata",), host:str="localhost", port:int=8194):
+        """
+        Starts a new session outside the pool, for a caller which needs an event queue of its own (e.g. a
+        subscription read by its own thread). The caller stops it.
+
+        :param services: Services to open on the session.
+        :param host: Server host.
+        :param port: Server port.
+        :return: Started session.
+        """
+        session = self.factory(host, port)
+        if not session.start():
+            raise ConnectionError(f"Failed to start session on {host}:{port}")
+        for service in services:
+            if not session.openService(service):
+                session.stop()
+                raise ConnectionError(f"Failed to open {service}")
+        return session
+
+    @contextmanager
+    def session(self, services=("//blp/refdata",), host:str="localhost", port:int=8194, name:str="default"):
+        """
+        Context manager yielding the shared session of a server while holding its lock.
+        """
+        session, lock = self.acquire(services, host, port, name)
+        with lock:
+            yield session
+
+    def invalidate(self, host:str="localhost", port:int=8194, name:str="default"):
+        """
+        Stops the session of a server, e.g. after a failure, so that the next acquire starts a new one.
+        """
+        with self.__lock:
+            entry = self.__sessions.pop((host, port, name), None)
+            if entry is not None:
+                self.__stop(entry)
+
+    def shutdown(self):
+        """
+        Stops every session of the pool.
+        """
+        with self.__lock:
+            for entry in self.__sessions.values():
+                self.__stop(entry)
+            self.__sessions.clear()
+
+    @staticmethod
+    def __is_healthy(entry) -> bool:
+        try:
+            for service in entry['services']:
+                entry['session'].getService(service)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def __stop(entry):
+        try:
+            entry['session'].stop()
+        except Exception:
+            pass
+
+
+session_pool = SessionPool()
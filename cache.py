@@ -0,0 +1,164 @@
+import os
+import re
+from datetime import timedelta
+import pandas as pd
+
+cacheDirectory = "Data/cache/"
+
+
+class BloombergCache:
+    """
+    Local Parquet cache of Bloomberg responses, so that history already downloaded is never requested twice.
+
+    Historical data is stored as one wide (dates x tickers) Parquet file per field and request options
+    (periodicity, adjustment, fill options and currency), along with the date range covered for each ticker.
+    Bulk snapshots (e.g. INDX_MWEIGHT_HIST) are stored as one long (date, member) Parquet file per security and field.
+    """
+
+    def __init__(self, directory:str=cacheDirectory):
+        """
+        :param directory: Directory in which the Parquet files are stored, created if needed.
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    #-------------------------------------------- History ------------------------------------------------
+
+    @staticmethod
+    def history_key(field:str, options:dict) -> str:
+        """
+        Builds the file key of a field for the given HistoricalDataRequest options.
+
+        :param field: Bloomberg field, e.g. PX_LAST.
+        :param options: Dictionary of request options (periodicitySelection, currency, ...).
+        :return: String usable as a file name.
+        """
+        parts = [field] + [str(options[name]) for name in sorted(options)]
+        return re.sub(r'[^A-Za-z0-9_]+', '-', "_".join(parts))
+
+    def load_history(self, field:str, options:dict) -> tuple:
+        """
+        Loads the cached history of a field.
+
+        :return: Tuple (DataFrame of values with dates in index and tickers in columns,
+                 DataFrame of coverage with tickers in index and columns ['start', 'end']).
+        """
+        path = os.path.join(self.directory, self.history_key(field, options))
+        if not os.path.exists(path + ".parquet"):
+            return pd.DataFrame(index=pd.DatetimeIndex([])), pd.DataFrame(columns=['start', 'end'], dtype='datetime64[ns]')
+        return pd.read_parquet(path + ".parquet"), pd.read_parquet(path + "_coverage.parquet")
+
+    def missing_history(self, tickers:list, fields:list, start_date, end_date, options:dict) -> list:
+        """
+        Finds the parts of a request which are not in the cache yet.
+
+        :param tickers: List of tickers requested.
+        :param fields: List of fields requested.
+        :param start_date: Start of the requested date range.
+        :param end_date: End of the requested date range.
+        :param options: Dictionary of request options.
+        :return: List of (tickers, start_date, end_date) requests covering everything missing.
+        """
+        start_date, end_date = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+        coverages = [self.load_history(field, options)[1].reindex(tickers) for field in fields]
+        covered_start = pd.concat([coverage['start'] for coverage in coverages], axis=1).max(axis=1, skipna=False)
+        covered_end = pd.concat([coverage['end'] for coverage in coverages], axis=1).min(axis=1, skipna=False)
+
+        gaps = {}
+        for ticker in dict.fromkeys(tickers):
+            start, end = covered_start[ticker], covered_end[ticker]
+            if pd.isna(start) or pd.isna(end):
+                gaps.setdefault((start_date, end_date), []).append(ticker)
+                continue
+            if start_date < start:
+                gaps.setdefault((start_date, start - timedelta(days=1)), []).append(ticker)
+            if end_date > end:
+                gaps.setdefault((end + timedelta(days=1), end_date), []).append(ticker)
+        return [(gap_tickers, start, end) for (start, end), gap_tickers in gaps.items()]
+
+    def update_history(self, frames:dict, tickers:list, start_date, end_date, options:dict):
+        """
+        Merges freshly downloaded history into the cache and extends the coverage of the tickers requested.
+        Values are stored as floats : a field with non-numeric columns is not cached at all (BLP.bdh requests
+        such fields every time), and coverage stops the day before today so that today's values are refreshed.
+
+        :param frames: Dictionary {field: DataFrame} as returned by BLP.bdh.
+        :param tickers: List of tickers that were requested.
+        :param start_date: Start of the date range that was requested.
+        :param end_date: End of the date range that was requested.
+        :param options: Dictionary of request options.
+        """
+        start_date = pd.Timestamp(start_date).normalize()
+        end_date = min(pd.Timestamp(end_date).normalize(), pd.Timestamp.today().normalize() - timedelta(days=1))
+
+        for field, new in frames.items():
+            if len(new.select_dtypes('number').columns) != len(new.columns):
+                continue
+            new = new.astype(float)
+            new.index = pd.to_datetime(new.index)
+            values, coverage = self.load_history(field, options)
+
+            # New values take precedence on the dates they cover
+            values = new.combine_first(values)
+            values = values.loc[~values.index.duplicated(keep='last')].sort_index()
+
+            requested = list(dict.fromkeys(tickers))
+            update = pd.DataFrame({'start': start_date, 'end': end_date}, index=pd.Index(requested))
+            if start_date <= end_date:
+                old = coverage.reindex(update.index)
+                update['start'] = old['start'].where(old['start'] < start_date, start_date).fillna(start_date)
+                update['end'] = old['end'].where(old['end'] > end_date, end_date).fillna(end_date)
+                coverage = pd.concat([coverage.drop(index=update.index, errors='ignore'), update])
+
+            path = os.path.join(self.directory, self.history_key(field, options))
+            self.__write(values, path + ".parquet")
+            self.__write(coverage.astype('datetime64[ns]'), path + "_coverage.parquet")
+
+    def get_history(self, tickers:list, fields:list, start_date, end_date, options:dict) -> dict:
+        """
+        Reads a request from the cache.
+
+        :return: Dictionary {field: DataFrame} with dates in index and the requested tickers in columns.
+        """
+        start_date, end_date = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+        results = {}
+        for field in fields:
+            values = self.load_history(field, options)[0]
+            results[field] = values.loc[start_date:end_date].reindex(columns=list(dict.fromkeys(tickers)))
+        return results
+
+    #-------------------------------------------- Snapshots ----------------------------------------------
+
+    def load_snapshots(self, security:str, field:str) -> dict:
+        """
+        Loads the cached bulk snapshots of a security.
+
+        :return: Dictionary {snapshot date (Timestamp): list of members}.
+        """
+        path = self.__snapshot_path(security, field)
+        if not os.path.exists(path):
+            return {}
+        snapshots = pd.read_parquet(path)
+        return {date: group['member'].tolist() for date, group in snapshots.groupby('date', sort=False)}
+
+    def update_snapshots(self, security:str, field:str, snapshots:dict):
+        """
+        Adds bulk snapshots of a security to the cache.
+
+        :param snapshots: Dictionary {snapshot date: list of members}.
+        """
+        merged = self.load_snapshots(security, field)
+        merged.update({pd.Timestamp(date): list(members) for date, members in snapshots.items()})
+        long = pd.DataFrame([(date, str(member)) for date, members in merged.items() for member in members],
+                            columns=['date', 'member'])
+        long['date'] = pd.to_datetime(long['date'])
+        self.__write(long, self.__snapshot_path(security, field))
+
+    def __snapshot_path(self, security:str, field:str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_]+', '-', f"{security}_{field}") + "_snapshots.parquet")
+
+    @staticmethod
+    def __write(df:pd.DataFrame, path:str):
+        """Writes to a temporary file first so that an interrupted write never leaves a corrupted cache."""
+        df.to_parquet(path + ".tmp", engine='pyarrow')
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,179 @@
+import copy
+import numpy as np
+import pandas as pd
+
+
+class CompositionStore:
+    """
+    Delta-encoded history of an index composition. Tickers are interned once in a table and referred to by
+    integer codes ; the first snapshot is stored in full and every following one as the codes added and removed
+    since the previous snapshot. Full memberships are checkpointed every few snapshots so that the membership
+    at any date is rebuilt from the nearest checkpoint with a handful of set operations.
+    """
+
+    def __init__(self, checkpoint_every:int=12):
+        """
+        :param checkpoint_every: Number of snapshots between two full membership checkpoints.
+        """
+        self.checkpoint_every = checkpoint_every
+        self.tickers = []
+        self.codes = {}
+        self.dates = []
+        self.added = []
+        self.removed = []
+        self.checkpoints = {}
+        self.__last = np.array([], dtype=np.int32)
+        self.__index = None
+
+    @classmethod
+    def from_frame(cls, df_compo:pd.DataFrame, checkpoint_every:int=12) -> "CompositionStore":
+        """
+        Builds a store from a dense composition DataFrame (one column of tickers per snapshot date).
+
+        :param df_compo: DataFrame with snapshot dates in columns and tickers (NaN padded) in rows.
+        :param checkpoint_every: Number of snapshots between two full membership checkpoints.
+        """
+        store = cls(checkpoint_every)
+        for date in sorted(df_compo.columns):
+            store.add_snapshot(date, df_compo[date].dropna().tolist())
+        return store
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def intern(self, members:list) -> np.ndarray:
+        """
+        :param members: List of tickers.
+        :return: Sorted, unique array of their codes, new tickers being added to the table.
+        """
+        codes = self.codes
+        for member in members:
+            if member not in codes:
+                codes[member] = len(self.tickers)
+                self.tickers.append(member)
+        return np.unique(np.fromiter((codes[member] for member in members), dtype=np.int32, count=len(members)))
+
+    def copy(self) -> "CompositionStore":
+        """
+        :return: Store with the same snapshots, to which snapshots can be added without changing this one. The
+                 arrays of codes are shared, they are never modified once added.
+        """
+        store = copy.copy(self)
+        store.tickers, store.codes, store.dates = list(self.tickers), dict(self.codes), list(self.dates)
+        store.added, store.removed, store.checkpoints = list(self.added), list(self.removed), dict(self.checkpoints)
+        return store
+
+    def add_snapshot(self, date, members:list):
+        """
+        Appends the composition at date. Snapshots must be added in increasing date order.
+
+        :param date: Snapshot date.
+        :param members: List of tickers in the index at date.
+        """
+        date = pd.Timestamp(date)
+        if self.dates and date <= self.dates[-1]:
+            raise ValueError(f"Snapshot {date} must come after {self.dates[-1]}")
+        current = self.intern(members)
+        self.added.append(np.setdiff1d(current, self.__last, assume_unique=True))
+        self.removed.append(np.setdiff1d(self.__last, current, assume_unique=True))
+        if (len(self.dates)) % self.checkpoint_every == 0:
+            self.checkpoints[len(self.dates)] = current
+        self.dates.append(date)
+        self.__last = current
+
+    def codes_at(self, position:int) -> np.ndarray:
+        """
+        :param position: Position of the snapshot in self.dates.
+        :return: Sorted array of the member codes of the snapshot.
+        """
+        start = position - position % self.checkpoint_every
+        members = self.checkpoints[start]
+        for i in range(start + 1, position + 1):
+            members = np.union1d(np.setdiff1d(members, self.removed[i], assume_unique=True), self.added[i])
+        return members
+
+    def members_at(self, date, method:str='nearest') -> list:
+        """
+        :param date: Date for which the composition is needed.
+        :param method: 'nearest' uses the closest snapshot, 'asof' the last snapshot on or before date (no look-ahead).
+        :return: List of tickers in the index.
+        """
+        position = self.position(date, method)
+        if position < 0:
+            return []
+        return [self.tickers[code] for code in self.codes_at(position)]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """
+        Sorted DatetimeIndex of the snapshot dates, built once and rebuilt after a snapshot is added.
+        """
+        if self.__index is None or len(self.__index) != len(self.dates):
+            self.__index = pd.DatetimeIndex(self.dates)
+        return self.__index
+
+    def position(self, date, method:str='nearest') -> int:
+        """
+        :param date: Date for which the composition is needed.
+        :param method: 'nearest' or 'asof'.
+        :return: Position in self.dates of the snapshot to use, -1 if there is none.
+        """
+        return int(self.positions([date], method)[0])
+
+    def positions(self, dates, method:str='nearest') -> np.ndarray:
+        """
+        Resolves many dates at once with a binary search in the sorted snapshot dates.
+
+        :param dates: Dates for which the composition is needed.
+        :param method: 'nearest' uses the closest snapshot (the earlier one on ties), 'asof' the last snapshot
+                       on or before each date (no look-ahead).
+        :return: Array of positions in self.dates, -1 where there is no snapshot to use.
+        """
+        snapshots = self.index.asi8
+        dates = pd.DatetimeIndex(dates).asi8
+        right = np.searchsorted(snapshots, dates, side='right')
+        if method == 'asof':
+            return right - 1
+        if method != 'nearest':
+            raise ValueError(f"Invalid method: {method}")
+        if not len(snapshots):
+            return np.full(len(dates), -1)
+        after = np.minimum(np.searchsorted(snapshots, dates, side='left'), len(snapshots) - 1)
+        before = np.maximum(right - 1, 0)
+        return np.where(np.abs(snapshots[after] - dates) < np.abs(dates - snapshots[before]), after, before)
+
+    def membership(self) -> np.ndarray:
+        """
+        :return: Boolean array (snapshots x tickers), True where the ticker is in the index.
+        """
+        mask = np.zeros((len(self.dates), len(self.tickers)), dtype=bool)
+        current = np.zeros(len(self.tickers), dtype=bool)
+        for i in range(len(self.dates)):
+            current[self.removed[i]] = False
+            current[self.added[i]] = True
+            mask[i] = current
+        return mask
+
+    def to_frame(self, categorical:bool=False) -> pd.DataFrame:
+        """
+        :param categorical: If True, the columns are categoricals sharing the ticker table, storing integer codes
+                            instead of strings.
+        :return: Dense composition DataFrame, one column of tickers per snapshot date, NaN padded. Snapshots are
+                 stored as sets : the tickers of each column are listed in the order they were first added to the
+                 store (as members_at), not in the order of the snapshot they come from.
+        """
+        if categorical:
+            dtype = pd.CategoricalDtype(self.tickers)
+            columns = {date: pd.Series(pd.Categorical.from_codes(self.codes_at(i), dtype=dtype))
+                       for i, date in enumerate(self.dates)}
+        else:
+            columns = {date: pd.Series([self.tickers[code] for code in self.codes_at(i)], dtype=object)
+                       for i, date in enumerate(self.dates)}
+        return pd.DataFrame(columns)
+
+    def nbytes(self) -> int:
+        """
+        :return: Approximate memory used by the deltas, checkpoints and ticker table, in bytes.
+        """
+        arrays = self.added + self.removed + list(self.checkpoints.values())
+        return sum(array.nbytes for array in arrays) + sum(len(ticker) + 49 for ticker in self.tickers)
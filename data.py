@@ -2,45 +2,226 @@ import pandas as pd
 from datetime import datetime
 import pandas as pd
 import os
+import copy
+import shutil
 from datetime import datetime as dt
 from glob import glob
+import numpy as np
 import pyarrow.parquet as pq
 
+from compo import CompositionStore
+from panel import Panel
+
 VOLUME, PX_LAST, RETURNS, VOLATILITY, RFR, WEIGHT, WEIGHTED_RETURNS = "PX_VOLUME", "PX_LAST", "RETURNS", "VOLATILITY", "RFR", "WEIGHT", "WEIGHTED_RETURNS"
 parquetTempFilePath = "Data/parquet/"
+storeDirectory = "Data/store/"
+
+
+def to_typed_parquet(df:pd.DataFrame, path:str) -> pd.DataFrame:
+    """
+    Writes a DataFrame to Parquet keeping its types : numeric columns stay float64/int64, the index and column
+    labels keep their dtype (e.g. dates), object columns holding only numbers become float64 and the other
+    object columns (e.g. tickers) are stored as categoricals.
+
+    :param df: DataFrame to be written.
+    :param path: Destination Parquet file, written atomically.
+    :return: The typed DataFrame, as it will be read back by read_typed_parquet.
+    """
+    typed = df.copy(deep=False)
+    for col in df.columns[df.dtypes == object]:
+        numbers = pd.to_numeric(df[col], errors='coerce')
+        if numbers.notna().sum() == df[col].notna().sum():
+            typed[col] = numbers.astype(float)
+        else:
+            typed[col] = df[col].map(lambda val: val if pd.isna(val) else str(val)).astype('category')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    typed.to_parquet(path + ".tmp", engine='pyarrow')
+    os.replace(path + ".tmp", path)
+    return typed
+
+
+def read_typed_parquet(path:str) -> pd.DataFrame:
+    """
+    Reads a Parquet file written by to_typed_parquet. The file is memory-mapped and converted without
+    consolidating the columns into one block, so that columns without missing values are not copied.
+
+    :param path: Parquet file.
+    :return: DataFrame with the types it was written with.
+    """
+    return pq.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
 
 class Data:
     def __init__(self, path="", J=3, risk_free_rate:float=0.02, index_ticker = 'RIY Index', 
-                 start_date = datetime(2024, 1, 28), end_date = datetime.now()) -> None:
+                 start_date = datetime(2024, 1, 28), end_date = datetime.now(), use_cache:bool=True, compact:bool=False) -> None:
         """
         Initialize the Data class with the option to load data from a specified path or use predefined Bloomberg data.
         
         :param path: Path to the Excel files containing the data. If empty, uses predefined Bloomberg data.
         :param J: Number of periods used for calculating rolling statistics such as volatility and expected returns.
         :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param use_cache: If True, Bloomberg responses are cached under Data/cache/ and only missing history is requested.
+        :param compact: If True, prices, volumes and derived panels are stored as float32 and compositions as categoricals.
         """
 
         self.J = J  
         self.risk_free_rate = risk_free_rate
+        self.compact = compact
 
         if path == "":
             from bloomberg import fetch_bloomberg_data
-            dict_data, df_compo = fetch_bloomberg_data(start_date, end_date, index_ticker)
-            self.df_compo = df_compo
+            from cache import BloombergCache
+            dict_data, self.compo = fetch_bloomberg_data(start_date, end_date, index_ticker, 
+                                                         cache=BloombergCache() if use_cache else None, as_store=True)
             self.df_px_last = dict_data[PX_LAST].sort_index()
             self.df_px_volume = dict_data[VOLUME].sort_index()
         else:
-            self.df_compo = self.__read_file('Data/Bloomberg_Compo.xlsx', sheet_name="Compo")
+            df_compo = self.__read_file('Data/Bloomberg_Compo.xlsx', sheet_name="Compo")
+            df_compo.columns = pd.to_datetime(df_compo.columns, format='%Y%m%d')
+            self.compo = CompositionStore.from_frame(df_compo)
             self.df_px_last = self.__read_file('Data/Bloomberg_Data.xlsx', sheet_name='PX LAST', saveToParquet=True, index_col=0)
             self.df_px_volume = self.__read_file('Data/Bloomberg_Data.xlsx', sheet_name='PX VOLUME', saveToParquet=True, index_col=0)
         
-        self.df_px_last = self.__treat_df(self.df_px_last, format='%Y%m%d')
-        self.df_px_volume = self.__treat_df(self.df_px_volume, format='%Y%m%d')
-        self.df_compo.columns = pd.to_datetime(self.df_compo.columns, format='%Y%m%d')
-        self.df_returns = self.__calculate_returns()
-        self.df_volatility = self.__calculate_volatility()
-        
-        
+        self.df_px_last = self.__compact(self.__treat_df(self.df_px_last, format='%Y%m%d'))
+        self.df_px_volume = self.__compact(self.__treat_df(self.df_px_volume, format='%Y%m%d'))
+        self.__derived = {}
+
+    @classmethod
+    def from_frames(cls, df_px_last:pd.DataFrame, df_px_volume:pd.DataFrame, compo:CompositionStore, J:int=3, 
+                    risk_free_rate:float=0.02, compact:bool=False) -> "Data":
+        """
+        Builds a Data instance on prices, volumes and compositions already loaded.
+
+        :param df_px_last: Prices with dates in index and tickers in columns.
+        :param df_px_volume: Volumes with dates in index and tickers in columns.
+        :param compo: CompositionStore of the index.
+        :param J: Number of periods used for calculating rolling statistics.
+        :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param compact: If True, prices, volumes and derived panels are stored as float32 and compositions as categoricals.
+        """
+        data = cls.__new__(cls)
+        data.J = J
+        data.risk_free_rate = risk_free_rate
+        data.compact = compact
+        data.compo = compo
+        data.df_px_last = data.__compact(df_px_last)
+        data.df_px_volume = data.__compact(df_px_volume)
+        data.__derived = {}
+        return data
+
+    def with_params(self, J:int=None, risk_free_rate:float=None, compo:CompositionStore=None) -> "Data":
+        """
+        Returns a view of the same data with another window J, risk-free rate or index composition. Prices and
+        the derived panels already computed are shared, so that only the rolling statistics of a new J are computed.
+
+        :param J: Number of periods used for calculating rolling statistics, unchanged if None.
+        :param risk_free_rate: The risk-free rate, unchanged if None.
+        :param compo: CompositionStore of another index on the same prices, unchanged if None.
+        """
+        data = copy.copy(self)
+        data.J = self.J if J is None else J
+        data.risk_free_rate = self.risk_free_rate if risk_free_rate is None else risk_free_rate
+        data.compo = self.compo if compo is None else compo
+        return data
+
+    @property
+    def df_returns(self) -> pd.DataFrame:
+        """
+        Returns of every ticker, computed on first access and cached.
+        """
+        return self.returns()
+
+    @property
+    def df_volatility(self) -> pd.DataFrame:
+        """
+        Rolling volatility of every ticker over the window self.J, computed on first access and cached per J.
+        """
+        return self.volatility()
+
+    def returns(self, start=None, end=None, tickers:list=None) -> pd.DataFrame:
+        """
+        Returns computed on PX_LAST forward-filled. The full panel is cached ; a slice is taken from it when it
+        exists, otherwise only the requested tickers and the dates up to end are computed.
+
+        :param start: First date, from the beginning if None.
+        :param end: Last date, to the end if None.
+        :param tickers: List of tickers, all if None.
+        """
+        if ('returns',) in self.__derived or (start is None and end is None and tickers is None):
+            if ('returns',) not in self.__derived:
+                self.__derived[('returns',)], self.__derived[('last_price',)] = self.__calculate_returns(self.df_px_last)
+                self.__derived[('returns',)] = self.__compact(self.__derived[('returns',)])
+            return self.__slice(self.__derived[('returns',)], start, end, tickers)
+        return self.__compact(self.__slice(self.__calculate_returns(self.__slice(self.df_px_last, None, end, tickers))[0], start, None, None))
+
+    def volatility(self, J:int=None, start=None, end=None, tickers:list=None) -> pd.DataFrame:
+        """
+        Rolling volatility of the returns over a window of J periods. Full panels are cached per J ; a slice is
+        taken from them when they exist, otherwise only the requested tickers and the dates up to end are computed.
+
+        :param J: Number of periods of the window, self.J if None.
+        :param start: First date, from the beginning if None.
+        :param end: Last date, to the end if None.
+        :param tickers: List of tickers, all if None.
+        """
+        J = self.J if J is None else J
+        key = ('volatility', J)
+        if key in self.__derived or (start is None and end is None and tickers is None):
+            if key not in self.__derived:
+                self.__derived[key] = self.__compact(self.__calculate_volatility(self.returns(), J))
+            return self.__slice(self.__derived[key], start, end, tickers)
+        return self.__compact(self.__slice(self.__calculate_volatility(self.returns(None, end, tickers), J), start, None, None))
+
+    @property
+    def df_dollar_volume(self) -> pd.DataFrame:
+        """
+        PX_LAST x PX_VOLUME, computed on first access and cached.
+        """
+        if ('dollar_volume',) not in self.__derived:
+            self.__derived[('dollar_volume',)] = self.__compact(self.df_px_volume * self.df_px_last)
+        return self.__derived[('dollar_volume',)]
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Memory used by each panel held, including the derived panels computed so far and the composition store.
+
+        :return: DataFrame with one row per panel and columns ['rows', 'columns', 'dtype', 'bytes'], plus a total row.
+        """
+        panels = {PX_LAST: self.df_px_last, VOLUME: self.df_px_volume}
+        for key, df in self.__derived.items():
+            if isinstance(df, pd.DataFrame):
+                panels["_".join(str(part) for part in key).upper()] = df
+        rows = {name: [df.shape[0], df.shape[1], ", ".join(sorted(str(dtype) for dtype in df.dtypes.unique())), 
+                       int(df.memory_usage(deep=True).sum())] for name, df in panels.items()}
+        rows["COMPO"] = [len(self.compo.dates), len(self.compo.tickers), "int32 codes", self.compo.nbytes()]
+        report = pd.DataFrame.from_dict(rows, orient='index', columns=['rows', 'columns', 'dtype', 'bytes'])
+        report.loc["TOTAL"] = [None, None, None, report['bytes'].sum()]
+        return report
+
+    def __compact(self, df:pd.DataFrame) -> pd.DataFrame:
+        """
+        Casts a numeric panel to float32 in compact mode.
+        """
+        if self.compact and isinstance(df, pd.DataFrame):
+            return df.astype('float32')
+        return df
+
+    @staticmethod
+    def __slice(df:pd.DataFrame, start, end, tickers) -> pd.DataFrame:
+        if start is not None or end is not None:
+            df = df.loc[start:end]
+        if tickers is not None:
+            df = df.reindex(columns=tickers)
+        return df
+
+    @property
+    def df_compo(self) -> pd.DataFrame:
+        """
+        Dense composition DataFrame (one column of tickers per snapshot date), rebuilt on demand from the
+        delta-encoded composition store self.compo. Categorical in compact mode.
+        """
+        return self.compo.to_frame(categorical=self.compact)
+
     def __treat_df(self, df, format) -> pd.DataFrame:
         """
         Cleans DataFrame columns, including stripping of extra characters and standardizing date formats.
@@ -80,7 +261,7 @@ class Data:
         """
         
         if filepath.endswith(".parquet"):
-            return pd.read_parquet(filepath)
+            return read_typed_parquet(filepath)
         
         DATA = pd.DataFrame()
 
@@ -91,16 +272,11 @@ class Data:
         parquetFileName = filename[:-5].replace(' ', '_') + str(int(modification_time))
         if sheet_name:
             parquetFileName += "_" + sheet_name
-        parquetFileName += ".parquet"
+        parquetFileName += "_typed.parquet"
         parquetFilePath = os.path.join(parquetTempFilePath, parquetFileName)
         
         if os.path.exists(parquetFilePath):
-            DATA = pd.read_parquet(parquetFilePath)
-            for col in DATA.columns:
-                try:
-                    DATA[col] = DATA[col].astype(float)
-                except:
-                    DATA[col] = DATA[col].apply(self.convertToFloatOrStr)
+            DATA = read_typed_parquet(parquetFilePath)
         else:
             try:
                 FILE = pd.ExcelFile(filepath) #, engine="openpyxl")
@@ -112,66 +288,240 @@ class Data:
                 raise FileNotFoundError("\n\nThe file '"+filename+"' was not found in the directory '"+directory+"'.")
             
             if len(DATA) > 0 and saveToParquet:
-                DATA.astype(str).to_parquet(parquetFilePath, engine='pyarrow')
+                DATA = to_typed_parquet(DATA, parquetFilePath)
         
         return DATA
 
-    def __calculate_returns(self) -> pd.DataFrame:
+    @staticmethod
+    def __calculate_returns(df_px_last:pd.DataFrame, last_price:pd.Series=None) -> tuple:
         """
         Calculates the percentage change in PX_LAST to derive returns, applied on a forward-filled DataFrame.
+        Dates without any return are dropped.
+
+        :param df_px_last: Prices.
+        :param last_price: Optional last forward-filled prices before df_px_last, used as the starting point.
+        :return: Tuple (returns, last forward-filled prices).
         """
-        return self.df_px_last.apply(lambda colonne: colonne.ffill().pct_change(fill_method=None).dropna())
+        if last_price is not None:
+            df_px_last = pd.concat([last_price.to_frame().T, df_px_last]).rename_axis(df_px_last.index.name)
+        df_px_last = df_px_last.ffill()
+        df_returns = df_px_last.pct_change(fill_method=None)
+        if last_price is not None:
+            df_returns = df_returns.iloc[1:]
+        return df_returns.loc[df_returns.notna().any(axis=1)], df_px_last.iloc[-1]
     
-    def __calculate_volatility(self) -> pd.DataFrame:
+    @staticmethod
+    def __calculate_volatility(df_returns:pd.DataFrame, J:int) -> pd.DataFrame:
+        """
+        Calculates rolling volatility over the window J and handles any resulting NA values.
+        """
+        df_volatility = df_returns.rolling(window=J).std()
+        df_volatility = df_volatility.mask(df_volatility == 0)
+        return df_volatility.ffill().bfill()
+
+    def append(self, df_px_last:pd.DataFrame, df_px_volume:pd.DataFrame, snapshots:dict=None, directory:str=None):
+        """
+        Appends new dates of prices and volumes, and new composition snapshots. The returns and volatilities
+        already computed are only extended over the new dates, from the last forward-filled prices and the last
+        J - 1 returns, so that the cost does not depend on the length of the history. Views created with
+        with_params before the call keep the previous data.
+
+        :param df_px_last: New prices, with dates after the last date in index and tickers in columns.
+        :param df_px_volume: New volumes, same layout.
+        :param snapshots: Optional dictionary {snapshot date: list of members} of new compositions.
+        :param directory: Optional directory of a store written by save, to which the new data is added.
+        :raises ValueError: If the new dates do not come after the last date.
+        """
+        df_px_last = self.__compact(self.__treat_df(df_px_last.copy(), format='%Y%m%d'))
+        df_px_volume = self.__compact(self.__treat_df(df_px_volume.copy(), format='%Y%m%d'))
+        if len(df_px_last) and df_px_last.index[0] <= self.df_px_last.index[-1]:
+            raise ValueError(f"New dates must come after {self.df_px_last.index[-1]}")
+
+        derived = {}
+        if ('returns',) in self.__derived:
+            returns = self.__derived[('returns',)]
+            tail, derived[('last_price',)] = self.__calculate_returns(df_px_last, self.__derived[('last_price',)])
+            derived[('returns',)] = pd.concat([returns, self.__compact(tail)])
+
+            for key, volatility in self.__derived.items():
+                if key[0] != 'volatility':
+                    continue
+                J = key[1]
+                window = pd.concat([returns.iloc[max(len(returns) - (J - 1), 0):] if J > 1 else returns.iloc[:0], tail])
+                new = window.rolling(window=J).std().iloc[len(window) - len(tail):]
+                # Forward-filled volatilities are only missing on the last date for tickers without any so far
+                empty = volatility.iloc[-1].reindex(tail.columns).isna()
+                new = pd.concat([volatility.iloc[-1:], new.mask(new == 0)]).ffill().iloc[1:]
+                volatility = pd.concat([volatility, new])
+                # which are back-filled from their first one, as in a full computation
+                empty = empty.index[empty & new.notna().any()]
+                if len(empty):
+                    volatility[empty] = volatility[empty].bfill()
+                derived[key] = self.__compact(volatility)
+
+        self.df_px_last = pd.concat([self.df_px_last, df_px_last])
+        self.df_px_volume = pd.concat([self.df_px_volume, df_px_volume])
+        self.__derived = derived
+        if snapshots:
+            # The store may be shared with views : snapshots are added to a copy
+            self.compo = self.compo.copy()
+            for date in sorted(snapshots):
+                self.compo.add_snapshot(date, snapshots[date])
+
+        if directory is not None:
+            self.__write_part(directory, df_px_last, df_px_volume, snapshots or {})
+
+    def save(self, directory:str=storeDirectory):
+        """
+        Writes the prices, volumes and compositions to a Parquet store, as the first part of each dataset ;
+        append(..., directory=directory) then adds one part per call instead of rewriting the history.
+
+        :param directory: Directory of the store, replaced if it exists.
+        """
+        shutil.rmtree(directory, ignore_errors=True)
+        snapshots = {date: self.compo.members_at(date) for date in self.compo.dates}
+        self.__write_part(directory, self.df_px_last, self.df_px_volume, snapshots)
+
+    @classmethod
+    def load(cls, directory:str=storeDirectory, J:int=3, risk_free_rate:float=0.02, compact:bool=False) -> "Data":
         """
-        Calculates rolling volatility over the specified window J and handles any resulting NA values.
+        Reads a Parquet store written by save and append.
+
+        :param directory: Directory of the store.
+        :param J: Number of periods used for calculating rolling statistics.
+        :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param compact: If True, prices, volumes and derived panels are stored as float32.
+        """
+        frames = {}
+        for name in [PX_LAST, VOLUME, "COMPO"]:
+            parts = sorted(glob(os.path.join(directory, name, "part-*.parquet")))
+            frames[name] = pd.concat([read_typed_parquet(part) for part in parts]) if parts else None
+        compo = CompositionStore()
+        for date, group in ([] if frames["COMPO"] is None else frames["COMPO"].groupby('date', sort=True)):
+            compo.add_snapshot(date, group['member'].astype(str).tolist())
+        return cls.from_frames(frames[PX_LAST], frames[VOLUME], compo, J, risk_free_rate, compact)
+
+    @classmethod
+    def from_dataset(cls, directory:str=None, start_date=None, end_date=None, J:int=3, risk_free_rate:float=0.02, 
+                     compact:bool=False) -> "Data":
         """
-        df_volatility = self.df_returns.rolling(window=self.J).std()
-        df_volatility.replace(0, pd.NA, inplace=True)
-        df_volatility = df_volatility.fillna(method='ffill').fillna(method='bfill')
-        return df_volatility
+        Reads a Parquet dataset written by ingest.py (partitioned by field and year). Only the year partitions
+        of the date range are opened, and only the columns of the tickers that are in the compositions are read.
 
-    def get_data(self, K:int=1) -> dict:
+        :param directory: Root directory of the dataset, ingest.datasetDirectory if None.
+        :param start_date: First date, from the beginning if None.
+        :param end_date: Last date, to the end if None.
+        :param J: Number of periods used for calculating rolling statistics.
+        :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param compact: If True, prices, volumes and derived panels are stored as float32.
+        """
+        import ingest
+
+        directory = ingest.datasetDirectory if directory is None else directory
+        compo = CompositionStore()
+        for date, group in ingest.read_compo(directory, end_date).groupby(ingest.DATE, sort=True):
+            compo.add_snapshot(date, group[ingest.MEMBER].tolist())
+        tickers = [ticker + suffix for ticker in compo.tickers for suffix in ("", " Equity")]
+
+        frames = {}
+        for field in [PX_LAST, VOLUME]:
+            df = ingest.read_field(directory, field, start_date, end_date, tickers)
+            df.columns = df.columns.str.replace(" Equity", "")
+            if df.columns.has_duplicates:
+                # A ticker stored both with and without " Equity" is kept once
+                df = df.loc[:, ~df.columns.duplicated()]
+            frames[field] = df
+        return cls.from_frames(frames[PX_LAST], frames[VOLUME], compo, J, risk_free_rate, compact)
+
+    @staticmethod
+    def __write_part(directory:str, df_px_last:pd.DataFrame, df_px_volume:pd.DataFrame, snapshots:dict):
+        long = pd.DataFrame([(pd.Timestamp(date), str(member)) for date, members in snapshots.items() for member in members],
+                            columns=['date', 'member'])
+        for name, df in [(PX_LAST, df_px_last), (VOLUME, df_px_volume), ("COMPO", long)]:
+            if not len(df):
+                continue
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            number = len(glob(os.path.join(directory, name, "part-*.parquet")))
+            to_typed_parquet(df, os.path.join(directory, name, f"part-{number:05d}.parquet"))
+
+    def get_data(self, K:int=1, method:str='nearest') -> Panel:
         """
         Aggregates and aligns all financial data by rebalancing date intervals, tailored for portfolio construction.
         
         :param K: Frequency of rebalance in months.
+        :param method: Composition used at each rebalancing date : 'nearest' snapshot, or 'asof' for the last
+                       snapshot on or before the date (no look-ahead).
+        :return: Panel mapping each composition date to a DataFrame (tickers x [PX_LAST, PX_VOLUME, RETURNS, VOLATILITY]),
+                 in which tickers outside the index or without data are NaN.
         """
-        data = {}
         valid_index = self.df_px_last.index[self.J]  # +1
         rebalance_dates = pd.date_range(valid_index, self.df_px_last.index[-1], freq=f'{K}ME')
+        rebalance_dates = rebalance_dates[rebalance_dates.isin(self.df_px_last.index)]
+        positions = self.compo.positions(rebalance_dates, method)
 
-        for date in rebalance_dates :
-            if date in self.df_px_last.index:
-                nearest_date = min(pd.to_datetime(self.df_compo.columns), key=lambda x: abs(x - pd.to_datetime(date)))            
-                px_last = self.df_px_last.loc[[date]].rename(index={date: nearest_date})
-                px_volume = self.df_px_volume.loc[[date]].rename(index={date: nearest_date})
-                returns = self.df_returns.loc[[date]].rename(index={date: nearest_date})
-                volatility = self.df_volatility.loc[[date]].rename(index={date: nearest_date})
-
-                tickers = self.df_compo[nearest_date].dropna().tolist()
-                data[nearest_date] = pd.concat([px_last.reindex(tickers, axis='columns').dropna(axis=1).rename(index={nearest_date: PX_LAST}), 
-                                            px_volume.reindex(tickers, axis='columns').dropna(axis=1).rename(index={nearest_date: VOLUME}), 
-                                            returns.reindex(tickers, axis='columns').dropna(axis=1).rename(index={nearest_date: RETURNS}),
-                                            volatility.reindex(tickers, axis='columns').dropna(axis=1).rename(index={nearest_date: VOLATILITY})]).T
-        return data
+        # Each composition date is read at the last rebalancing date using it
+        rows = {}
+        for date, position in zip(rebalance_dates, positions):
+            if position >= 0:
+                rows[self.compo.dates[position]] = (date, position)
+        snapshots = self.compo.membership()[[position for _, position in rows.values()]]
 
-    def get_benchmark(self):
-        results = []
-        for date in self.df_returns.index:
-            nearest_date = min(pd.to_datetime(self.df_compo.columns), key=lambda x: abs(x - pd.to_datetime(date)))
-            tickers = self.df_compo[nearest_date].dropna().tolist()
-            returns = self.df_returns.loc[date].reindex(tickers).dropna()
-            if tickers:
-                equal_weight = 1 / len(tickers)
-            else:
-                equal_weight = 0
-            weighted_returns = (returns * equal_weight).sum()
+        frames = {PX_LAST: self.df_px_last, VOLUME: self.df_px_volume, RETURNS: self.df_returns, VOLATILITY: self.df_volatility}
+        return Panel.from_frames(frames, list(rows), self.compo.tickers, snapshots.reshape(len(rows), len(self.compo.tickers)), 
+                                 rows=[date for date, _ in rows.values()])
 
-            results.append([nearest_date, weighted_returns])
-        results_df = pd.DataFrame(results, columns=['DATES', 'WEIGHTED_RETURNS'])
+    def membership_mask(self, dates, method:str='nearest') -> tuple:
+        """
+        Index membership aligned to the return matrix.
 
-        results_df.set_index('DATES', inplace=True)
-        
-        return results_df
+        :param dates: Dates for which the composition is needed.
+        :param method: 'nearest' snapshot, or 'asof' for the last snapshot on or before each date (no look-ahead).
+        :return: Tuple (positions of the snapshots used, -1 where there is none ; boolean array dates x df_returns.columns,
+                 True where the ticker is in the index ; number of members of each snapshot used, including
+                 members without data).
+        """
+        positions = self.compo.positions(dates, method)
+        snapshots = self.compo.membership()[np.maximum(positions, 0)] & (positions >= 0)[:, None]
+        codes = pd.Index(self.compo.tickers).get_indexer(self.df_returns.columns)
+        mask = np.where(codes >= 0, snapshots[:, codes], False)
+        return positions, mask, snapshots.sum(axis=1)
+
+    def get_benchmark(self, method:str='nearest', weighting='equi') -> pd.DataFrame:
+        """
+        Returns of the index at each return date, computed as one masked reduction of the (dates x tickers)
+        return matrix.
+
+        :param method: Composition used at each date : 'nearest' snapshot, or 'asof' for the last snapshot on or
+                       before the date (no look-ahead).
+        :param weighting: 'equi' gives each member of the index a weight of 1 / number of members (members without
+                          a return count as 0), 'volume' and 'volumexprice' weight the members with a return by their
+                          volume or dollar volume of the previous date. A DataFrame of weights with dates in index
+                          and tickers in columns (e.g. market capitalisations) can be given instead.
+        :return: DataFrame with the composition dates in index and a WEIGHTED_RETURNS column.
+        """
+        positions, mask, sizes = self.membership_mask(self.df_returns.index, method)
+        valid = positions >= 0
+        positions, mask, sizes = positions[valid], mask[valid], sizes[valid]
+        returns = self.df_returns.to_numpy(dtype=float)[valid]
+        has_return = mask & ~np.isnan(returns)
+        returns = np.where(has_return, returns, 0.0)
+
+        if isinstance(weighting, str) and weighting == 'equi':
+            weighted_returns = np.divide(returns.sum(axis=1), sizes, out=np.zeros(len(sizes)), where=sizes > 0)
+        else:
+            if isinstance(weighting, pd.DataFrame):
+                weights = weighting
+            elif weighting == 'volume':
+                weights = self.df_px_volume
+            elif weighting == 'volumexprice':
+                weights = self.df_dollar_volume
+            else:
+                raise ValueError(f"Invalid weighting: {weighting}")
+            weights = weights.reindex(index=self.df_returns.index, columns=self.df_returns.columns).shift(1)
+            weights = weights.to_numpy(dtype=float)[valid]
+            weights = np.where(has_return & (weights > 0), weights, 0.0)
+            total = weights.sum(axis=1)
+            weighted_returns = np.divide((weights * returns).sum(axis=1), total, out=np.zeros(len(total)), where=total > 0)
 
+        dates = pd.Index(self.compo.index[positions], name='DATES')
+        return pd.DataFrame({WEIGHTED_RETURNS: weighted_returns}, index=dates)
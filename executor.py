@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+
+from panel import Panel
+
+SERIAL, THREAD, PROCESS = "serial", "thread", "process"
+
+
+class Executor:
+    """
+    Runs a function over the rebalancing dates, each date being independent : in the calling thread ('serial'), in
+    a pool of threads ('thread') or in a pool of processes ('process'). Dates are split in one contiguous chunk per
+    worker and the results are always returned in the order of the dates, whatever the backend.
+    With processes, the function must be importable (a module-level function or a public static method) ; the
+    values of a Panel are passed through shared memory instead of being pickled.
+    """
+
+    def __init__(self, backend:str=SERIAL, max_workers:int=None):
+        """
+        :param backend: 'serial', 'thread' or 'process'.
+        :param max_workers: Number of workers of the pool, the number of CPUs by default.
+        """
+        if backend not in (SERIAL, THREAD, PROCESS):
+            raise ValueError(f"Invalid backend: {backend}")
+        self.backend = backend
+        self.max_workers = 1 if backend == SERIAL else (max_workers or os.cpu_count() or 1)
+        self.__pool = None
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Shuts the pool down, it is started again by the next call.
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+    def map(self, function, *iterables) -> list:
+        """
+        :param function: Function called with one item of each iterable, as the built-in map.
+        :param iterables: Iterables of the arguments, e.g. the portfolios of each date.
+        :return: List of the results, in the order of the items.
+        """
+        items = list(zip(*iterables))
+        if self.backend == SERIAL or len(items) <= 1:
+            return [function(*item) for item in items]
+        return self.__gather(_run_chunk, function, [items[chunk] for chunk in self.__chunks(len(items))])
+
+    def map_panel(self, function, panel:Panel, *iterables) -> list:
+        """
+        :param function: Function called with the DataFrame of each date of the panel (see Panel.__getitem__),
+                         followed by one item of each iterable.
+        :param panel: Panel of the rebalancing dates.
+        :param iterables: Optional iterables of other arguments, one item per date of the panel.
+        :return: List of the results, in the order of the dates of the panel.
+        """
+        if self.backend != PROCESS or len(panel) <= 1:
+            return self.map(function, [panel[date] for date in panel], *iterables)
+
+        extras = [list(iterable) for iterable in iterables]
+        shared = shared_memory.SharedMemory(create=True, size=max(panel.values.nbytes, 1))
+        try:
+            np.ndarray(panel.values.shape, dtype=panel.values.dtype, buffer=shared.buf)[:] = panel.values
+            layout = (shared.name, panel.values.shape, panel.values.dtype.str, panel.tickers, panel.fields)
+            return self.__gather(_run_panel_chunk, function, [(layout, chunk, [extra[chunk] for extra in extras]) 
+                                                              for chunk in self.__chunks(len(panel))])
+        finally:
+            shared.close()
+            shared.unlink()
+
+    def __chunks(self, nb_items:int) -> list:
+        bounds = np.linspace(0, nb_items, min(self.max_workers, nb_items) + 1).astype(int)
+        return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def __gather(self, runner, function, chunks:list) -> list:
+        if self.__pool is None:
+            if self.backend == PROCESS:
+                # the workers attaching a shared panel register it with the tracker of the parent, which forgets it
+                # on unlink, instead of starting their own tracker that would report it leaked at shutdown
+                resource_tracker.ensure_running()
+            pool_class = ThreadPoolExecutor if self.backend == THREAD else ProcessPoolExecutor
+            self.__pool = pool_class(max_workers=self.max_workers)
+        futures = [self.__pool.submit(runner, function, chunk) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def _run_chunk(function, items:list) -> list:
+    return [function(*item) for item in items]
+
+
+def _run_panel_chunk(function, chunk:tuple) -> list:
+    """Copies the rows of the chunk out of the shared panel, then calls the function on each date."""
+    (name, shape, dtype, tickers, fields), rows, extras = chunk
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared.buf)[rows].copy()
+    finally:
+        shared.close()
+    return [function(pd.DataFrame(values[i], index=tickers, columns=fields, copy=False), *(extra[i] for extra in extras)) 
+            for i in range(len(values))]
@@ -0,0 +1,199 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+datasetDirectory = "Data/dataset/"
+DATE, FIELD, YEAR, MEMBER = "date", "field", "year", "member"
+COMPO = "COMPO"
+
+
+def parse_dates(values) -> pd.DatetimeIndex:
+    """
+    Parses the dates of an extract, given either as dates or as YYYYMMDD numbers / strings.
+
+    :param values: List of dates.
+    :return: DatetimeIndex.
+    """
+    values = pd.Index(values)
+    if values.inferred_type in ('datetime', 'datetime64', 'date'):
+        return pd.DatetimeIndex(values)
+    return pd.to_datetime(values.astype(str).str[:8], format='%Y%m%d')
+
+
+def ingest_prefix(filepath:str) -> str:
+    """
+    Prefix of the files written by one ingest : the name of the source file plus a random suffix, so that the
+    extracts ingested into the same partitions never overwrite each other.
+
+    :param filepath: Source file.
+    :return: Prefix of the file names.
+    """
+    return f"{os.path.splitext(os.path.basename(filepath))[0]}-{uuid.uuid4().hex[:8]}"
+
+
+def write_chunk(df:pd.DataFrame, field:str, directory:str, chunk:int, prefix:str="chunk"):
+    """
+    Appends a chunk of a wide (dates x tickers) extract to the dataset, partitioned by field and year.
+
+    :param df: DataFrame with dates in index and tickers in columns.
+    :param field: Field of the extract, e.g. PX_LAST.
+    :param directory: Root directory of the dataset.
+    :param chunk: Number of the chunk, used in the file names.
+    :param prefix: Prefix of the file names, unique per ingest (see ingest_prefix).
+    """
+    df = df.apply(pd.to_numeric, errors='coerce').astype('float64')
+    df.columns = df.columns.astype(str)
+    df.index = parse_dates(df.index).rename(DATE)
+    df = df.reset_index()
+    df[FIELD] = field
+    df[YEAR] = df[DATE].dt.year
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), directory, partition_cols=[FIELD, YEAR],
+                        basename_template=f"{prefix}-{chunk:05d}-{{i}}.parquet")
+
+
+def ingest_csv(filepath:str, field:str, directory:str=datasetDirectory, chunk_size:int=5000) -> int:
+    """
+    Converts a wide CSV export (dates in the first column, one column per ticker) into the Parquet dataset,
+    chunk_size rows at a time.
+
+    :param filepath: CSV file.
+    :param field: Field of the extract, e.g. PX_LAST.
+    :param directory: Root directory of the dataset.
+    :param chunk_size: Number of rows read at a time.
+    :return: Number of rows written.
+    """
+    rows, prefix = 0, ingest_prefix(filepath)
+    for chunk, df in enumerate(pd.read_csv(filepath, index_col=0, chunksize=chunk_size)):
+        write_chunk(df, field, directory, chunk, prefix)
+        rows += len(df)
+    return rows
+
+
+def ingest_excel(filepath:str, sheet_name:str, field:str, directory:str=datasetDirectory, chunk_size:int=5000) -> int:
+    """
+    Converts a wide Excel sheet (dates in the first column, one column per ticker) into the Parquet dataset.
+    The workbook is streamed in read-only mode, chunk_size rows at a time, instead of being loaded whole.
+
+    :param filepath: Excel file.
+    :param sheet_name: Sheet of the extract.
+    :param field: Field of the extract, e.g. PX_LAST.
+    :param directory: Root directory of the dataset.
+    :param chunk_size: Number of rows read at a time.
+    :return: Number of rows written.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    prefix = ingest_prefix(filepath)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows)
+        columns = [str(column) for column in header[1:]]
+        buffer, chunk, total = [], 0, 0
+        for row in rows:
+            if row[0] is None:
+                continue
+            buffer.append(row)
+            if len(buffer) == chunk_size:
+                total += _write_rows(buffer, columns, field, directory, chunk, prefix)
+                buffer, chunk = [], chunk + 1
+        if buffer:
+            total += _write_rows(buffer, columns, field, directory, chunk, prefix)
+    finally:
+        workbook.close()
+    return total
+
+
+def _write_rows(rows:list, columns:list, field:str, directory:str, chunk:int, prefix:str) -> int:
+    values = np.array([[np.nan if value is None else value for value in row[1:len(columns) + 1]] for row in rows], dtype=object)
+    write_chunk(pd.DataFrame(values, index=[row[0] for row in rows], columns=columns), field, directory, chunk, prefix)
+    return len(rows)
+
+
+def ingest_compo_excel(filepath:str, sheet_name:str="Compo", directory:str=datasetDirectory) -> int:
+    """
+    Converts a composition sheet (one column of tickers per snapshot date) into the dataset, as (date, member)
+    rows under field=COMPO, partitioned by year. The sheet is streamed in read-only mode.
+
+    :param filepath: Excel file.
+    :param sheet_name: Sheet of the compositions.
+    :param directory: Root directory of the dataset.
+    :return: Number of (date, member) rows written.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        dates = parse_dates([date for date in next(rows)])
+        long = [(dates[i], str(member)) for row in rows for i, member in enumerate(row[:len(dates)]) if member is not None]
+    finally:
+        workbook.close()
+    df = pd.DataFrame(long, columns=[DATE, MEMBER]).sort_values(DATE, kind='stable')
+    df[FIELD] = COMPO
+    df[YEAR] = df[DATE].dt.year
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), directory, partition_cols=[FIELD, YEAR],
+                        basename_template=f"compo-{ingest_prefix(filepath)}-{{i}}.parquet")
+    return len(df)
+
+
+def read_field(directory:str, field:str, start_date=None, end_date=None, tickers:list=None) -> pd.DataFrame:
+    """
+    Reads a field of the dataset. Partitions outside the date range are skipped and only the requested ticker
+    columns are read. The extracts ingested separately are combined : each ticker takes the first non-missing value
+    found on each date.
+
+    :param directory: Root directory of the dataset.
+    :param field: Field to be read, e.g. PX_LAST.
+    :param start_date: First date, from the beginning if None.
+    :param end_date: Last date, to the end if None.
+    :param tickers: Ticker columns to be read, all if None ; tickers missing from the dataset are ignored.
+    :return: DataFrame with dates in index and tickers in columns.
+    """
+    path = os.path.join(directory, f"{FIELD}={field}")
+    # Extracts of different tickers are stored in different files : the schema is the union of theirs, not the one
+    # of the first file found
+    files = ds.dataset(path, format='parquet', partitioning='hive')
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in files.get_fragments()] +
+                              [pa.schema([(YEAR, pa.int32())])])
+    dataset = ds.dataset(path, schema=schema, format='parquet', partitioning='hive')
+    expression = _date_filter(start_date, end_date)
+    columns = None
+    if tickers is not None:
+        available = set(schema.names)
+        columns = [DATE] + [ticker for ticker in dict.fromkeys(tickers) if ticker in available]
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    df = df.drop(columns=[YEAR], errors='ignore').set_index(DATE)
+    if df.index.has_duplicates:
+        return df.groupby(level=0).first()
+    return df.sort_index()
+
+
+def read_compo(directory:str, end_date=None) -> pd.DataFrame:
+    """
+    Reads the compositions of the dataset up to end_date (earlier snapshots are kept for as-of lookups).
+
+    :param directory: Root directory of the dataset.
+    :param end_date: Last snapshot date, all if None.
+    :return: Long DataFrame with columns [date, member], sorted by date.
+    """
+    dataset = ds.dataset(os.path.join(directory, f"{FIELD}={COMPO}"), format='parquet', partitioning='hive')
+    df = dataset.to_table(columns=[DATE, MEMBER], filter=_date_filter(None, end_date)).to_pandas()
+    # A sheet ingested twice lists its members once
+    return df.drop_duplicates().sort_values(DATE, kind='stable')
+
+
+def _date_filter(start_date, end_date):
+    """Filter on the dates, and on the year partitions so that the files outside the range are not opened."""
+    expression = None
+    for bound, compare in [(start_date, lambda a, b: a >= b), (end_date, lambda a, b: a <= b)]:
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        condition = compare(ds.field(YEAR), bound.year) & compare(ds.field(DATE), pa.scalar(bound, type=pa.timestamp('ns')))
+        expression = condition if expression is None else expression & condition
+    return expression
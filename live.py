@@ -0,0 +1,174 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+try:
+    from blpapi import Name, CorrelationId, SubscriptionList
+except ImportError:
+    # Without blpapi, feeds only run on the local sessions of blp_session (FakeSession)
+    from blp_session import CorrelationId, FakeSubscriptionList as SubscriptionList
+    Name = str
+
+from blp_session import SUBSCRIPTION_DATA
+from data import PX_LAST, VOLUME, RETURNS
+
+LAST_PRICE_NAME = Name("LAST_PRICE")
+VOLUME_NAME = Name("VOLUME")
+
+
+class TickRingBuffer:
+    """
+    Fixed-size, array-backed buffer of the last ticks of each security. Ticks are written in place in
+    (securities x capacity) NumPy arrays, and the last price and volume of each security are kept aside so that
+    a snapshot of the whole universe costs a few vectorized operations, whatever the tick history.
+    """
+
+    def __init__(self, tickers:list, capacity:int=1024):
+        """
+        :param tickers: List of securities followed.
+        :param capacity: Number of ticks kept per security ; older ticks are overwritten.
+        """
+        self.tickers = list(tickers)
+        self.codes = {ticker: code for code, ticker in enumerate(self.tickers)}
+        self.capacity = capacity
+        nb_tickers = len(self.tickers)
+        self.prices = np.full((nb_tickers, capacity), np.nan)
+        self.volumes = np.full((nb_tickers, capacity), np.nan)
+        self.times = np.full((nb_tickers, capacity), np.nan)
+        self.counts = np.zeros(nb_tickers, dtype=np.int64)
+        self.last_price = np.full(nb_tickers, np.nan)
+        self.last_volume = np.full(nb_tickers, np.nan)
+        self.first_price = np.full(nb_tickers, np.nan)
+        self.lock = threading.Lock()
+
+    def append(self, code:int, price:float=np.nan, volume:float=np.nan, timestamp:float=None):
+        """
+        Writes a tick. A missing price or volume carries the last known value forward.
+
+        :param code: Position of the security in self.tickers.
+        :param price: Last price, NaN if not in the tick.
+        :param volume: Cumulated volume, NaN if not in the tick.
+        :param timestamp: Time of the tick in seconds since epoch, defaults to now.
+        """
+        with self.lock:
+            if price == price:
+                self.last_price[code] = price
+                if self.first_price[code] != self.first_price[code]:
+                    self.first_price[code] = price
+            if volume == volume:
+                self.last_volume[code] = volume
+            i = self.counts[code] % self.capacity
+            self.prices[code, i] = self.last_price[code]
+            self.volumes[code, i] = self.last_volume[code]
+            self.times[code, i] = time.time() if timestamp is None else timestamp
+            self.counts[code] += 1
+
+    def history(self, ticker:str) -> pd.DataFrame:
+        """
+        :param ticker: Security.
+        :return: DataFrame of the ticks kept for the security, oldest first, with columns [PX_LAST, PX_VOLUME].
+        """
+        code = self.codes[ticker]
+        with self.lock:
+            count = self.counts[code]
+            order = np.arange(max(count - self.capacity, 0), count) % self.capacity
+            return pd.DataFrame({PX_LAST: self.prices[code, order], VOLUME: self.volumes[code, order]},
+                                index=pd.to_datetime(self.times[code, order], unit='s'))
+
+    def snapshot(self, reference_prices:pd.Series=None) -> pd.DataFrame:
+        """
+        Returns the current state of every security, in the layout of one date of Data.get_data, so that
+        Signal can rank it.
+
+        :param reference_prices: Optional Series of prices (e.g. last close) used to compute returns.
+                                 Defaults to the first price received for each security.
+        :return: DataFrame indexed by security with columns [PX_LAST, PX_VOLUME, RETURNS].
+        """
+        with self.lock:
+            last_price, last_volume = self.last_price.copy(), self.last_volume.copy()
+            reference = self.first_price.copy()
+        if reference_prices is not None:
+            reference = reference_prices.reindex(self.tickers).to_numpy(dtype=float)
+        return pd.DataFrame({PX_LAST: last_price, VOLUME: last_volume, RETURNS: last_price / reference - 1},
+                            index=pd.Index(self.tickers))
+
+
+class LiveFeed:
+    """
+    Real-time //blp/mktdata subscription to LAST_PRICE and VOLUME for a list of securities, written into a
+    TickRingBuffer by a background thread. The thread reads every event of the session, which must not be shared
+    with request loops or other feeds.
+    """
+
+    def __init__(self, session, tickers:list, capacity:int=1024, fields=("LAST_PRICE", "VOLUME"), interval:float=None, 
+                 close_session:bool=False):
+        """
+        :param session: Started session with //blp/mktdata open, dedicated to this feed.
+        :param tickers: List of securities to subscribe to (e.g. "AAPL UQ Equity").
+        :param capacity: Number of ticks kept per security.
+        :param fields: Fields subscribed to.
+        :param interval: Optional conflation interval in seconds.
+        :param close_session: If True, the session is stopped along with the feed.
+        """
+        self.session = session
+        self.close_session = close_session
+        self.buffer = TickRingBuffer(tickers, capacity)
+        self.fields = list(fields)
+        self.interval = interval
+        self.ticks = 0
+        self.__subscriptions = None
+        self.__thread = None
+        self.__running = False
+
+    def start(self):
+        """
+        Subscribes to every security, one CorrelationId per security, and starts reading events.
+        """
+        options = [f"interval={self.interval}"] if self.interval else []
+        self.__subscriptions = SubscriptionList()
+        for code, ticker in enumerate(self.buffer.tickers):
+            self.__subscriptions.add(f"//blp/mktdata/{ticker}", self.fields, options, CorrelationId(code))
+        self.session.subscribe(self.__subscriptions)
+
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        Unsubscribes and stops the reading thread.
+        """
+        self.__running = False
+        if self.__subscriptions is not None:
+            self.session.unsubscribe(self.__subscriptions)
+        if self.__thread is not None:
+            self.__thread.join()
+        if self.close_session:
+            self.session.stop()
+
+    def snapshot(self, reference_prices:pd.Series=None) -> pd.DataFrame:
+        """
+        See TickRingBuffer.snapshot.
+        """
+        return self.buffer.snapshot(reference_prices)
+
+    def process_event(self, event):
+        """
+        Writes the ticks of a SUBSCRIPTION_DATA event into the buffer ; other events are ignored.
+
+        :param event: blpapi.Event.
+        """
+        if event.eventType() != SUBSCRIPTION_DATA:
+            return
+        now = time.time()
+        for msg in event:
+            code = msg.correlationIds()[0].value()
+            price = msg.getElementAsFloat(LAST_PRICE_NAME) if msg.hasElement(LAST_PRICE_NAME) else np.nan
+            volume = msg.getElementAsFloat(VOLUME_NAME) if msg.hasElement(VOLUME_NAME) else np.nan
+            self.buffer.append(code, price, volume, now)
+            self.ticks += 1
+
+    def __run(self):
+        while self.__running:
+            self.process_event(self.session.nextEvent(500))
@@ -1,11 +1,50 @@
+from functools import partial
+import numpy as np
 import pandas as pd
 
 from signals import RETURNS, VOLUME, PX_LAST, WEIGHT, WEIGHTED_RETURNS, POSITION, LONG, SHORT, RETURNS, VOLATILITY, DATES
 from performance import Performance
+from executor import Executor, SERIAL
+
+# Score of each position for each weighting scheme, from a function giving the values of a column for all the
+# positions : the weight of a position is its score over the sum of the scores of its side (long or short) of its portfolio
+WEIGHTING_SCORES = {'equal': lambda column: np.ones(len(column(POSITION))),
+                    'volume': lambda column: column(VOLUME),
+                    'inverse_volatility': lambda column: 1 / column(VOLATILITY),
+                    'dollar_volume': lambda column: column(PX_LAST) * column(VOLUME)}
+
+
+def segmented_weights(segments:np.ndarray, sides:np.ndarray, scores:np.ndarray) -> np.ndarray:
+    """
+    Normalised weights of many portfolios at once.
+
+    :param segments: Segment of each position, one per side of each portfolio.
+    :param sides: 1 for long positions, -1 for short positions.
+    :param scores: Score of each position.
+    :return: sides x scores / sum of the scores of the segment, 0 in segments whose scores sum to 0.
+    """
+    totals = np.bincount(segments, weights=scores)[segments]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals != 0, sides * scores / totals, 0.0)
+
+
+def scheme_weights(scheme:str, segments:np.ndarray, sides:np.ndarray, column) -> np.ndarray:
+    """
+    Weights of flat positions for a weighting scheme.
+
+    :param scheme: Weighting scheme, a key of WEIGHTING_SCORES.
+    :param segments: Segment of each position, one per side of each portfolio.
+    :param sides: 1 for long positions, -1 for short positions, NaN for positions that are neither.
+    :param column: Function giving the values of a column for all the positions.
+    :return: Weight of each position, NaN for positions that are neither long nor short.
+    """
+    scores = np.where(np.isnan(sides), 0.0, WEIGHTING_SCORES[scheme](column))
+    return segmented_weights(segments, sides, scores)
 
 
 class Optimisation:
-    def __init__ (self, returns_portfolios:dict, volume_portfolios:dict, risk_free_rate:float=0.02, bench:pd.DataFrame=None):       
+    def __init__ (self, returns_portfolios:dict, volume_portfolios:dict, risk_free_rate:float=0.02, bench:pd.DataFrame=None,
+                  executor:Executor=None):       
         """
         Initialize the Optimisation class to manage portfolio weights and calculations based on different strategies.
         
@@ -13,117 +52,196 @@ class Optimisation:
         :param volume_portfolios: Dictionary containing volume sorted data for various portfolios.
         :param risk_free_rate: The risk-free rate used for calculations such as the Sharpe Ratio. Default value is 0.02.
         :param bench: Optional. A DataFrame containing benchmark data against which portfolio performance can be compared.
+        :param executor: Optional. Executor running the dates in parallel (see executor.py), serial by default.
         """
         self.returns_portfolios = returns_portfolios
         self.volume_portfolios = volume_portfolios
         self.risk_free_rate = risk_free_rate
         self.bench = bench
+        self.executor = executor or Executor()
 
         
     @staticmethod
-    def get_equal_weight(portfolios:dict) -> dict:
+    def get_equal_weight(portfolios:dict, executor:Executor=None) -> dict:
         """
         Assign equal weights to long and short positions within each portfolio.
         
         :param portfolios: Dictionary of portfolio data.
+        :param executor: Executor running the dates in parallel, serial by default.
         
         :return: Updated dictionary with equal weights assigned to long and short positions.
         """
-        for date in portfolios.keys():  
-            for name, ptf in portfolios[date].items():
-                nb_long_shares = len(ptf[ptf[POSITION] == LONG].dropna())
-                nb_short_shares = len(ptf[ptf[POSITION] == SHORT].dropna())
-                ptf.loc[ptf[POSITION] == LONG, WEIGHT] =  1 / nb_long_shares if nb_long_shares != 0 else 0
-                ptf.loc[ptf[POSITION] == SHORT, WEIGHT] = - 1 / nb_short_shares if nb_short_shares != 0 else 0
-                ptf[WEIGHTED_RETURNS] = ptf[RETURNS] * ptf[WEIGHT]
-        return portfolios
+        return Optimisation.__weigh('equal', Optimisation.get_dated_equal_weight, portfolios, executor)
+
+    @staticmethod
+    def get_dated_equal_weight(dated_portfolios:dict) -> dict:
+        """
+        Equal weights of the portfolios of one date (see get_equal_weight).
+        
+        :param dated_portfolios: Dictionary of the portfolios of a date, updated in place.
+        :return: The dictionary of portfolios of the date.
+        """
+        return Optimisation.weigh([dated_portfolios], 'equal')[0]
         
     @staticmethod
-    def get_volume_weight(portfolios: dict) -> dict:
+    def get_volume_weight(portfolios: dict, executor:Executor=None) -> dict:
         """
         Adjust weights based on the trading volume of each position in the portfolio, separately for long and short positions.
     
         :param portfolios: Dictionary of portfolio data.
+        :param executor: Executor running the dates in parallel, serial by default.
     
         :return: Updated dictionary with weights based on trading volume for both long and short positions.
         """
-        for date in portfolios.keys():
-            for name, ptf in portfolios[date].items():
-                total_long_volume = ptf.loc[ptf[POSITION] == LONG, VOLUME].sum()
-                total_short_volume = ptf.loc[ptf[POSITION] == SHORT, VOLUME].sum()
-            
-                ptf.loc[ptf[POSITION] == LONG, WEIGHT] = ptf[VOLUME] / total_long_volume if total_long_volume != 0 else 0
-                ptf.loc[ptf[POSITION] == SHORT, WEIGHT] = -ptf[VOLUME] / total_short_volume if total_short_volume != 0 else 0
-            
-                ptf[WEIGHTED_RETURNS] = ptf[RETURNS] * ptf[WEIGHT]
-        return portfolios
+        return Optimisation.__weigh('volume', Optimisation.get_dated_volume_weight, portfolios, executor)
+
+    @staticmethod
+    def get_dated_volume_weight(dated_portfolios:dict) -> dict:
+        """
+        Volume weights of the portfolios of one date (see get_volume_weight).
+        
+        :param dated_portfolios: Dictionary of the portfolios of a date, updated in place.
+        :return: The dictionary of portfolios of the date.
+        """
+        return Optimisation.weigh([dated_portfolios], 'volume')[0]
     
     @staticmethod
-    def get_inverse_volatility_weight(portfolios: dict) -> dict:
+    def get_inverse_volatility_weight(portfolios: dict, executor:Executor=None) -> dict:
         """
         Adjust weights inversely proportional to the volatility of each position in the portfolio, with normalization,
         separately for long and short positions.
     
         :param portfolios: Dictionary of portfolio data.
+        :param executor: Executor running the dates in parallel, serial by default.
         :return: Updated dictionary with normalized inverse volatility weights for both long and short positions.
         """
-        for date in portfolios.keys():
-            for name, ptf in portfolios[date].items():
-                long_inverse_volatility = 1 / ptf.loc[ptf[POSITION] == LONG, VOLATILITY]
-                short_inverse_volatility = 1 / ptf.loc[ptf[POSITION] == SHORT, VOLATILITY]
-            
-                total_long_inv_vol = long_inverse_volatility.sum()
-                total_short_inv_vol = short_inverse_volatility.sum()
-            
-                ptf.loc[ptf[POSITION] == LONG, WEIGHT] = long_inverse_volatility / total_long_inv_vol if total_long_inv_vol != 0 else 0
-                ptf.loc[ptf[POSITION] == SHORT, WEIGHT] = -short_inverse_volatility / total_short_inv_vol if total_short_inv_vol != 0 else 0
-            
-                ptf[WEIGHTED_RETURNS] = ptf[RETURNS] * ptf[WEIGHT]
-        return portfolios
+        return Optimisation.__weigh('inverse_volatility', Optimisation.get_dated_inverse_volatility_weight, portfolios, executor)
+
+    @staticmethod
+    def get_dated_inverse_volatility_weight(dated_portfolios:dict) -> dict:
+        """
+        Inverse volatility weights of the portfolios of one date (see get_inverse_volatility_weight).
+        
+        :param dated_portfolios: Dictionary of the portfolios of a date, updated in place.
+        :return: The dictionary of portfolios of the date.
+        """
+        return Optimisation.weigh([dated_portfolios], 'inverse_volatility')[0]
     
     @staticmethod
-    def get_dollar_volume_weight(portfolios: dict) -> dict:
+    def get_dollar_volume_weight(portfolios: dict, executor:Executor=None) -> dict:
         """
         Adjust weights based on the dollar volume (price * volume) of each position, separately for long and short positions.
     
         :param portfolios: Dictionary of portfolio data.
+        :param executor: Executor running the dates in parallel, serial by default.
         :return: Updated dictionary with weights based on dollar volume for both long and short positions.
         """
-        for date in portfolios.keys():
-            for name, ptf in portfolios[date].items():
-                long_dollar_volume = ptf.loc[ptf[POSITION] == LONG, PX_LAST] * ptf.loc[ptf[POSITION] == LONG, VOLUME]
-                short_dollar_volume = ptf.loc[ptf[POSITION] == SHORT, PX_LAST] * ptf.loc[ptf[POSITION] == SHORT, VOLUME]
-            
-                total_long_dollar_vol = long_dollar_volume.sum()
-                total_short_dollar_vol = short_dollar_volume.sum()
-            
-                ptf.loc[ptf[POSITION] == LONG, WEIGHT] = long_dollar_volume / total_long_dollar_vol if total_long_dollar_vol != 0 else 0
-                ptf.loc[ptf[POSITION] == SHORT, WEIGHT] = -short_dollar_volume / total_short_dollar_vol if total_short_dollar_vol != 0 else 0
-            
-                ptf[WEIGHTED_RETURNS] = ptf[RETURNS] * ptf[WEIGHT]
+        return Optimisation.__weigh('dollar_volume', Optimisation.get_dated_dollar_volume_weight, portfolios, executor)
+
+    @staticmethod
+    def get_dated_dollar_volume_weight(dated_portfolios:dict) -> dict:
+        """
+        Dollar volume weights of the portfolios of one date (see get_dollar_volume_weight).
+        
+        :param dated_portfolios: Dictionary of the portfolios of a date, updated in place.
+        :return: The dictionary of portfolios of the date.
+        """
+        return Optimisation.weigh([dated_portfolios], 'dollar_volume')[0]
+
+    @staticmethod
+    def weigh(dated_portfolios:list, scheme:str) -> list:
+        """
+        Weights every portfolio of several dates in one pass : the positions of all the portfolios are gathered in
+        flat arrays (segment = side of a portfolio, side, score of the scheme) and normalised with segmented sums.
+        
+        :param dated_portfolios: List of dictionaries of the portfolios of a date, updated in place.
+        :param scheme: Weighting scheme, a key of WEIGHTING_SCORES.
+        :return: The list of dictionaries of portfolios.
+        """
+        frames = [ptf for portfolios in dated_portfolios for ptf in portfolios.values()]
+        if not frames:
+            return dated_portfolios
+        bounds, segments, sides, column = Optimisation.__flatten(frames)
+        weights = scheme_weights(scheme, segments, sides, column)
+        weighted_returns = column(RETURNS) * weights
+        for k, ptf in enumerate(frames):
+            ptf[WEIGHT] = weights[bounds[k]:bounds[k + 1]]
+            ptf[WEIGHTED_RETURNS] = weighted_returns[bounds[k]:bounds[k + 1]]
+        return dated_portfolios
+
+    @staticmethod
+    def __flatten(frames:list) -> tuple:
+        """
+        Gathers the positions of several portfolios in flat arrays.
+        
+        :param frames: List of portfolios.
+        :return: Tuple (bounds of the rows of each portfolio, segment of each position (one per side of each portfolio),
+                 side of each position, function giving the values of a column for all the positions).
+        """
+        columns = {}
+        def column(name:str) -> np.ndarray:
+            if name not in columns:
+                columns[name] = np.concatenate([ptf[name].to_numpy() for ptf in frames])
+            return columns[name]
+        
+        lengths = [len(ptf) for ptf in frames]
+        sides = np.where(column(POSITION) == LONG, 1.0, np.where(column(POSITION) == SHORT, -1.0, np.nan))
+        segments = 2 * np.repeat(np.arange(len(frames)), lengths) + (sides < 0)
+        return np.cumsum([0] + lengths), segments, sides, column
+
+    @staticmethod
+    def __weigh(scheme:str, dated_weighting, portfolios:dict, executor:Executor=None) -> dict:
+        """
+        Applies a weighting to the portfolios of every date, in one pass or through the executor.
+        
+        :param scheme: Weighting scheme, a key of WEIGHTING_SCORES.
+        :param dated_weighting: Weighting of the portfolios of one date, run by the executor.
+        :param portfolios: Dictionary of portfolio data, keyed by date.
+        :param executor: Executor running the dates in parallel, serial by default.
+        :return: The dictionary of portfolios, with the weighted portfolios of each date.
+        """
+        if executor is None or executor.backend == SERIAL:
+            Optimisation.weigh(list(portfolios.values()), scheme)
+            return portfolios
+        results = executor.map(dated_weighting, portfolios.values())
+        for date, dated_portfolios in zip(list(portfolios), results):
+            portfolios[date] = dated_portfolios
         return portfolios    
 
     
-    def get_best_weighting_method(self, portfolios: dict) -> dict:
+    def get_best_weighting_method(self, portfolios: dict, executor:Executor=None) -> dict:
         """
         Test all weighting methods and return the results for the best one based on the Sharpe Ratio.
+        The portfolios given are left unchanged : the weights of every method are computed side by side on the same
+        flat positions (in parallel with a thread or process executor), and the returns of every method and portfolio
+        are summed into one matrix from which the Sharpe Ratios are computed. Only the portfolios of the best method
+        are built.
         
         :param portfolios: Dictionary of portfolio data.
-        :return: Updated dictionary with weights based on best ponderation method.
+        :param executor: Executor running the weighting methods in parallel, the one of the instance by default.
+        :return: Dictionary of portfolios (copies) with the weights of the best ponderation method.
         """
-        weighting_methods = {
-            'equal': self.get_equal_weight,
-            'volume': self.get_volume_weight,
-            'inverse_volatility': self.get_inverse_volatility_weight,
-            'dollar_volume': self.get_dollar_volume_weight
-        }
-
-        best_sharpe_ratio, best_method, best_portfolios = -float('inf'), None, None
-
-        for name, method in weighting_methods.items():
-            weighted_returns = method(portfolios)
-            full_returns = self.get_full_results(weighted_returns)
-
+        keys = [(date, name) for date, dated_portfolios in portfolios.items() for name in dated_portfolios]
+        frames = [portfolios[date][name] for date, name in keys]
+        bounds, segments, sides, column = self.__flatten(frames)
+        columns = {name: column(name) for name in [POSITION, RETURNS, VOLUME, PX_LAST, VOLATILITY]}
+        
+        methods = list(WEIGHTING_SCORES)
+        weights = (executor or self.executor).map(partial(scheme_weights, segments=segments, sides=sides, column=columns.__getitem__), methods)
+        weighted_returns = np.stack([columns[RETURNS] * method_weights for method_weights in weights])
+        # Returns matrix : (methods x portfolios of each date), NaN weighted returns being skipped as in get_full_results
+        returns = np.stack([np.bincount(segments // 2, weights=np.nan_to_num(method_returns), minlength=len(frames)) 
+                            for method_returns in weighted_returns])
+        
+        best_sharpe_ratio, best_method, best_portfolio = -float('inf'), None, None
+        for k, name in enumerate(methods):
+            full_returns = {}
+            for (date, key), value in zip(keys, returns[k]):
+                full_returns.setdefault(key, ([], []))
+                full_returns[key][0].append(date)
+                full_returns[key][1].append(value)
+            full_returns = {key: pd.DataFrame({RETURNS: values}, index=pd.Index(dates, name=DATES)) for key, (dates, values) in full_returns.items()}
+            
             method_performance = Performance(portfolios=full_returns, 
                                              bench=self.bench, 
                                              risk_free_rate=self.risk_free_rate) 
@@ -137,11 +255,15 @@ class Optimisation:
             # Check if this method has the best maximum Sharpe Ratio
             if max_sharpe_ratio > best_sharpe_ratio:
                 best_sharpe_ratio = max_sharpe_ratio
-                best_method = name
+                best_method = k
                 best_portfolio = portfolio_with_max_sharpe
-                best_portfolios_data = weighted_returns
 
-        print(f"Best weighting method: {best_method}, maximizing portfolio: {best_portfolio} with Sharpe Ratio: {round(best_sharpe_ratio, 2)}")
+        print(f"Best weighting method: {methods[best_method]}, maximizing portfolio: {best_portfolio} with Sharpe Ratio: {round(best_sharpe_ratio, 2)}")
+        best_portfolios_data = {date: {} for date in portfolios}
+        for i, (date, name) in enumerate(keys):
+            rows = slice(bounds[i], bounds[i + 1])
+            best_portfolios_data[date][name] = frames[i].assign(**{WEIGHT: weights[best_method][rows], 
+                                                                   WEIGHTED_RETURNS: weighted_returns[best_method][rows]})
         return best_portfolios_data
     
     @staticmethod
@@ -164,14 +286,11 @@ class Optimisation:
         :return: Dictionary keyed by portfolio name with DataFrames containing cumulative returns and volatility data.
         """
     
-        dict_returns = {}
+        dict_dates, dict_values = {}, {}
         for date, ptf in portfolios.items():
             for key, portfolio_df in ptf.items():
-                full_returns = self.__get_dated_results(portfolio_df)
-                if key not in dict_returns:
-                    dict_returns[key] = pd.DataFrame(columns=[DATES, RETURNS]).set_index(DATES)
-                new_data = pd.DataFrame({DATES: [date], RETURNS: [full_returns]}).set_index(DATES)
-                dict_returns[key] = dict_returns[key].dropna(axis=1, how='all')
-                dict_returns[key] = pd.concat([dict_returns[key], new_data], ignore_index=False)
-        return dict_returns
+                dict_dates.setdefault(key, []).append(date)
+                dict_values.setdefault(key, []).append(self.__get_dated_results(portfolio_df))
+        return {key: pd.DataFrame({RETURNS: np.array(dict_values[key], dtype=float)}, index=pd.Index(dict_dates[key], name=DATES)) 
+                for key in dict_dates}
 
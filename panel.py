@@ -0,0 +1,79 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+
+class Panel(Mapping):
+    """
+    Contiguous (dates x tickers x fields) array of the data of each rebalancing date, with a membership mask.
+    It behaves as the former dict {date: DataFrame} : panel[date] is a (tickers x fields) DataFrame built without
+    copy on the array, in which tickers that are not in the index at that date are NaN (dropna removes them).
+    """
+
+    def __init__(self, dates, tickers, fields, values:np.ndarray, mask:np.ndarray, rows=None):
+        """
+        :param dates: Dates of the first axis.
+        :param tickers: Tickers of the second axis.
+        :param fields: Fields of the third axis.
+        :param values: Array (dates x tickers x fields) ; values of non-members should be NaN.
+        :param mask: Boolean array (dates x tickers), True where the ticker is in the index.
+        :param rows: Dates at which the values were read for each date of the first axis, defaults to dates.
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = pd.Index(tickers)
+        self.fields = pd.Index(fields)
+        self.values = np.ascontiguousarray(values)
+        self.mask = mask
+        self.rows = self.dates if rows is None else pd.DatetimeIndex(rows)
+        self.date_pos = {date: i for i, date in enumerate(self.dates)}
+        self.ticker_pos = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_frames(cls, frames:dict, dates, tickers, mask:np.ndarray, rows=None) -> "Panel":
+        """
+        Gathers (dates x tickers) panels into one array.
+
+        :param frames: Dictionary {field: DataFrame with dates in index and tickers in columns}.
+        :param dates: Dates of the panel.
+        :param tickers: Tickers of the panel.
+        :param mask: Boolean array (dates x tickers), True where the ticker is in the index ; other values are set to NaN.
+        :param rows: Optional dates to read in the frames for each date of the panel, defaults to dates.
+        """
+        rows = dates if rows is None else rows
+        dtype = np.result_type(*[df.dtypes.iloc[0] if df.shape[1] else np.float64 for df in frames.values()], np.float32)
+        values = np.empty((len(dates), len(tickers), len(frames)), dtype=dtype)
+        for k, df in enumerate(frames.values()):
+            values[:, :, k] = df.reindex(index=rows, columns=tickers).to_numpy(dtype=dtype)
+        values[~mask] = np.nan
+        return cls(dates, tickers, list(frames), values, mask, rows)
+
+    def __getitem__(self, date) -> pd.DataFrame:
+        i = self.date_pos[pd.Timestamp(date)]
+        return pd.DataFrame(self.values[i], index=self.tickers, columns=self.fields, copy=False)
+
+    def __iter__(self):
+        return iter(self.dates)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def members(self, date) -> pd.DataFrame:
+        """
+        :param date: Date of the panel.
+        :return: DataFrame of the tickers in the index at date only (a copy).
+        """
+        i = self.date_pos[pd.Timestamp(date)]
+        return pd.DataFrame(self.values[i, self.mask[i]], index=self.tickers[self.mask[i]], columns=self.fields)
+
+    def field(self, field:str) -> pd.DataFrame:
+        """
+        :param field: Field of the panel.
+        :return: DataFrame (dates x tickers) of the field, built without copy on the array.
+        """
+        return pd.DataFrame(self.values[:, :, self.fields.get_loc(field)], index=self.dates, columns=self.tickers, copy=False)
+
+    def nbytes(self) -> int:
+        """
+        :return: Memory used by the values and the mask, in bytes.
+        """
+        return self.values.nbytes + self.mask.nbytes
@@ -1,14 +1,75 @@
+from functools import partial
+import numpy as np
 import pandas as pd
-import warnings
-warnings.filterwarnings('ignore')
 
 from data import Data, RETURNS, VOLUME, PX_LAST, VOLATILITY
+from executor import Executor
 WEIGHT, WEIGHTED_RETURNS = "WEIGHT", "WEIGHTED_RETURNS"
 POSITION, LONG, SHORT = "POSITION", "LONG", "SHORT"
 DATES = "DATES"
+MOMENTUM, DOLLAR_VOLUME, TURNOVER = "MOMENTUM", "DOLLAR_VOLUME", "TURNOVER"
+
+SIGNALS = {}
+
+
+def register_signal(name:str):
+    """
+    Declares a signal that portfolios can be sorted on : a function of a Data returning a DataFrame (dates x tickers),
+    computed once over the whole history.
+    
+    :param name: Name of the signal.
+    :return: Decorator registering the function in SIGNALS.
+    """
+    def decorator(function):
+        SIGNALS[name] = function
+        return function
+    return decorator
+
+
+register_signal(RETURNS)(lambda data: data.df_returns)
+register_signal(VOLUME)(lambda data: data.df_px_volume)
+register_signal(VOLATILITY)(lambda data: data.df_volatility)
+register_signal(DOLLAR_VOLUME)(lambda data: data.df_dollar_volume)
+
+
+@register_signal(MOMENTUM)
+def momentum(data:Data) -> pd.DataFrame:
+    """
+    Price change over the last J periods.
+    """
+    return data.df_px_last / data.df_px_last.shift(data.J) - 1
+
+
+@register_signal(TURNOVER)
+def turnover(data:Data) -> pd.DataFrame:
+    """
+    Volume relative to its average over the last J periods (shares outstanding are not fetched).
+    """
+    return data.df_px_volume / data.df_px_volume.rolling(window=data.J, min_periods=1).mean()
+
+
+def rank_buckets(values:np.ndarray, nb_buckets, valid:np.ndarray) -> tuple:
+    """
+    Sorts values along their last axis (the tickers) and labels each valid one with its bucket ; every ranking of
+    Signal goes through it. Invalid values are sorted last, ties keep the order of the tickers (stable sort), and
+    bucket i of n holds the sorted positions [i * L // n, (i + 1) * L // n) of the L valid values.
+
+    :param values: Array (..., tickers) of signal values.
+    :param nb_buckets: Number of buckets, or array of them broadcasting against values (e.g. one per signal).
+    :param valid: Boolean array of the shape of values, True where the value is ranked.
+    :return: Tuple (order : positions along the last axis sorting the valid values first, counts : number of valid
+             values along the last axis, labels : buckets from 1 to nb_buckets, 0 where not valid).
+    """
+    order = np.argsort(np.where(valid, values, np.nan), axis=-1, kind='stable')
+    positions = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(positions, order, np.arange(values.shape[-1]), axis=-1)
+    counts = valid.sum(axis=-1)
+    labels = np.where(valid, ((positions + 1) * nb_buckets - 1) // np.maximum(counts, 1)[..., None] + 1, 0)
+    return order, counts, labels
+
 
 class Signal:
-    def __init__(self, data:Data, K:int=1, n_returns:int=5, m_volume:int=3):
+    def __init__(self, data:Data, K:int=1, n_returns:int=5, m_volume:int=3, executor:Executor=None):
         """
         Initialize the Signal class to manage and analyze financial signals.
         
@@ -16,55 +77,169 @@ class Signal:
         :param K: Frequency of data retrieval in terms of months.
         :param n_returns: Number of portfolios to create based on returns.
         :param m_volume: Number of portfolios to create based on volume.
+        :param executor: Executor running the dates in parallel (see executor.py), serial by default.
         """
+        self.market_data = data
         self.data = data.get_data(K=K)
         self.n = n_returns
         self.m = m_volume
+        self.executor = executor or Executor()
         self.simple_returns_portfolios = None
         self.simple_volume_portfolios = None
         self.intersected_portfolios = None
+        self.__signals = {}
+
+    def signal_values(self, name:str) -> pd.DataFrame:
+        """
+        Values of a registered signal at each rebalancing date, computed once for the whole panel.
+        
+        :param name: Name of the signal, a key of SIGNALS.
+        :return: DataFrame (dates x tickers) aligned to the panel, NaN for tickers outside the index.
+        """
+        if name not in self.__signals:
+            if name in self.data.fields:
+                self.__signals[name] = self.data.field(name)
+            else:
+                values = SIGNALS[name](self.market_data).reindex(index=self.data.rows, columns=self.data.tickers).to_numpy(dtype=float)
+                values[~self.data.mask] = np.nan
+                self.__signals[name] = pd.DataFrame(values, index=self.data.dates, columns=self.data.tickers)
+        return self.__signals[name]
+
+    def rank_signals(self, buckets:dict) -> dict:
+        """
+        Labels every ticker of every date with its bucket for several signals in one pass : the signals are stacked
+        into one (signals x dates x tickers) array sorted along the tickers. Tickers are ranked at a date when all
+        their data and all the signals are available, ties keep the order of the tickers, and bucket i of a signal
+        split in n holds the sorted positions [i * L // n, (i + 1) * L // n).
+        
+        :param buckets: Dictionary {signal name: number of buckets}.
+        :return: Dictionary {signal name: DataFrame (dates x tickers) of labels from 1 to its number of buckets,
+                 0 where the ticker is not ranked}.
+        """
+        names = list(buckets)
+        _, _, labels = self.__rank_panel(names, [buckets[name] for name in names])
+        return {name: pd.DataFrame(labels[k], index=self.data.dates, columns=self.data.tickers).rename_axis(DATES) 
+                for k, name in enumerate(names)}
+
+    def bucket_returns(self, first:str, second:str, n:int, m:int) -> pd.DataFrame:
+        """
+        Equally weighted returns of the intersections of the n buckets of a signal with the m buckets of another,
+        at each rebalancing date.
+        
+        :param first: Name of the first signal.
+        :param second: Name of the second signal.
+        :param n: Number of buckets of the first signal.
+        :param m: Number of buckets of the second signal.
+        :return: DataFrame with the dates in index and one column per intersection, e.g. MOMENTUM1_VOLATILITY2.
+        """
+        labels = self.rank_signals({first: n, second: m})
+        first_labels, second_labels = labels[first].to_numpy(), labels[second].to_numpy()
+        returns = self.signal_values(RETURNS).to_numpy(dtype=float)
+        
+        ranked = first_labels > 0
+        keys = (np.arange(len(self.data.dates))[:, None] * n * m + (first_labels - 1) * m + second_labels - 1)[ranked]
+        sums = np.bincount(keys, weights=returns[ranked], minlength=len(self.data.dates) * n * m)
+        counts = np.bincount(keys, minlength=len(self.data.dates) * n * m)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (sums / counts).reshape(len(self.data.dates), n * m)
+        columns = [f'{first}{i+1}_{second}{j+1}' for i in range(n) for j in range(m)]
+        return pd.DataFrame(means, index=self.data.dates, columns=columns).rename_axis(DATES)
+
+    def create_bucket_labels(self) -> tuple:
+        """
+        Ranks every ticker of every date by returns and by volume and labels it with its bucket, without
+        building any portfolio. Buckets are the same as in create_simple_portfolios (see rank_signals).
+        
+        :return: Tuple of DataFrames (dates x tickers) of integer labels, 1 to n for returns and 1 to m for volume,
+                 0 where the ticker is not ranked at that date.
+        """
+        labels = self.rank_signals({RETURNS: self.n, VOLUME: self.m})
+        return labels[RETURNS], labels[VOLUME]
 
     def create_simple_portfolios(self) -> tuple:
         """
-        Create simple portfolios based on top n returns and top m volumes.
+        Create simple portfolios based on top n returns and top m volumes. The tickers of every date are ranked
+        at once over the panel (see rank_signals), then the buckets of each date are sliced from its ranked rows.
         
         :return: Tuple containing dictionaries of returns portfolios and volume portfolios.
         """
-        dict_returns, dict_volume = {}, {}
-        for date, date_data in self.data.items():    
-            dated_data = date_data.dropna()  
-            dict_returns[date], dict_volume[date] = self.__create_dated_portfolio(dated_data)
+        order, counts, _ = self.__rank_panel([RETURNS, VOLUME], [self.n, self.m])
+        rankings = [{RETURNS: order[0, i, :counts[0, i]], VOLUME: order[1, i, :counts[1, i]]} for i in range(len(self.data))]
+        results = self.executor.map_panel(partial(Signal.create_ranked_portfolios, n=self.n, m=self.m), self.data, rankings)
         
-        self.simple_returns_portfolios = dict_returns
-        self.simple_volume_portfolios = dict_volume
+        self.simple_returns_portfolios = {date: returns_ptf for date, (returns_ptf, _) in zip(self.data.keys(), results)}
+        self.simple_volume_portfolios = {date: volume_ptf for date, (_, volume_ptf) in zip(self.data.keys(), results)}
         return self.simple_returns_portfolios, self.simple_volume_portfolios
 
-    def __create_dated_portfolio(self, dated_data) -> tuple:
+    def __rank_panel(self, names:list, nb_buckets:list) -> tuple:
         """
-        Create portfolios for a specific date sorted by returns and volume.
+        Ranks the tickers of every date on several signals with one sort of a (signals x dates x tickers) array.
+        Tickers are ranked at a date when all their data and all the signals are available.
         
-        :param dated_data: DataFrame containing the data for a specific date.
-        :return: Tuple of dictionaries for returns-based and volume-based portfolios.
+        :return: Tuple (order, counts, labels) of rank_buckets, with the signals on the first axis.
         """
-        returns_ptf, volume_ptf = {}, {}
-        sorted_by_returns = dated_data.sort_values(by=RETURNS) 
-        sorted_by_volume = dated_data.sort_values(by=VOLUME) 
+        values = np.stack([self.signal_values(name).to_numpy(dtype=float) for name in names])
+        valid = ~np.isnan(self.data.values).any(axis=2) & ~np.isnan(values).any(axis=0)
+        return rank_buckets(values, np.array(nb_buckets)[:, None, None], np.broadcast_to(valid, values.shape))
 
-        for i in range(self.n):
-            portfolio = sorted_by_returns.iloc[i * len(sorted_by_returns) // self.n:(i + 1) * len(sorted_by_returns) // self.n]
-            portfolio[POSITION] = LONG
-            returns_ptf[f'R{i+1}'] = portfolio
-        returns_ptf[f'R{i+1}-R1'] = self.__add_longshort_portfolios(long_ptf=returns_ptf[f'R{i+1}'], short_ptf=returns_ptf[f'R1'].copy())
+    def create_live_portfolios(self, snapshot:pd.DataFrame) -> tuple:
+        """
+        Create returns and volume portfolios from a live snapshot (see live.LiveFeed.snapshot), with the same
+        bucketing as for each rebalancing date.
+        
+        :param snapshot: DataFrame indexed by ticker with at least the columns [RETURNS, PX_VOLUME].
+        :return: Tuple of dictionaries for returns-based and volume-based portfolios.
+        """
+        return Signal.create_dated_portfolios(snapshot, self.n, self.m)
 
-        for j in range(self.m):
-            portfolio = sorted_by_volume.iloc[j * len(sorted_by_volume) // self.m:(j + 1) * len(sorted_by_volume) // self.m]
-            portfolio[POSITION] = LONG
-            volume_ptf[f'V{j+1}'] = portfolio
-        volume_ptf[f'V{j+1}-V1'] = self.__add_longshort_portfolios(long_ptf=volume_ptf[f'V{j+1}'], short_ptf=volume_ptf[f'V1'].copy())
+    @staticmethod
+    def create_dated_portfolios(date_data:pd.DataFrame, n:int, m:int) -> tuple:
+        """
+        Create the returns and volume portfolios of one date.
+        
+        :param date_data: DataFrame (tickers x fields) of a date ; tickers with missing values are left out.
+        :param n: Number of portfolios based on returns.
+        :param m: Number of portfolios based on volume.
+        :return: Tuple of dictionaries for returns-based and volume-based portfolios.
+        """
+        return Signal.create_ranked_portfolios(date_data, Signal.__rank(date_data, n, m), n, m)
 
+    @staticmethod
+    def create_ranked_portfolios(date_data:pd.DataFrame, ranking:dict, n:int, m:int) -> tuple:
+        """
+        Create portfolios for a specific date from the ranking of its tickers by returns and volume.
+        
+        :param date_data: DataFrame (tickers x fields) of a date.
+        :param ranking: Dictionary {RETURNS / VOLUME: rows of the ranked tickers, in increasing order of the signal}.
+        :param n: Number of portfolios based on returns.
+        :param m: Number of portfolios based on volume.
+        :return: Tuple of dictionaries for returns-based and volume-based portfolios.
+        """
+        returns_ptf, volume_ptf = {}, {}
+        for ptf, column, prefix, nb_buckets in [(returns_ptf, RETURNS, 'R', n), (volume_ptf, VOLUME, 'V', m)]:
+            order = ranking[column]
+            bounds = np.arange(nb_buckets + 1) * len(order) // nb_buckets
+            sorted_data = date_data.take(order).assign(**{POSITION: LONG})
+            for i in range(nb_buckets):
+                ptf[f'{prefix}{i+1}'] = sorted_data.iloc[bounds[i]:bounds[i + 1]].copy()
+            ptf[f'{prefix}{nb_buckets}-{prefix}1'] = Signal.__add_longshort_portfolios(long_ptf=ptf[f'{prefix}{nb_buckets}'].copy(), 
+                                                                                       short_ptf=ptf[f'{prefix}1'].copy())
         return returns_ptf, volume_ptf
+
+    @staticmethod
+    def __rank(date_data:pd.DataFrame, n:int, m:int) -> dict:
+        """
+        Ranks the tickers of a date by returns and by volume (see rank_buckets), those with missing values left out.
+        
+        :return: Dictionary {RETURNS / VOLUME: rows of the ranked tickers, in increasing order of the signal}.
+        """
+        values = date_data[[RETURNS, VOLUME]].to_numpy(dtype=float).T
+        valid = np.broadcast_to(date_data.notna().all(axis=1).to_numpy(), values.shape)
+        order, counts, _ = rank_buckets(values, np.array([n, m])[:, None], valid)
+        return {RETURNS: order[0, :counts[0]], VOLUME: order[1, :counts[1]]}
     
-    def __add_longshort_portfolios(self, long_ptf:pd.DataFrame, short_ptf:pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    def __add_longshort_portfolios(long_ptf:pd.DataFrame, short_ptf:pd.DataFrame) -> pd.DataFrame:
         """
         Combine long and short portfolios into a single DataFrame.
         
@@ -77,6 +252,62 @@ class Signal:
         return pd.concat([long_ptf, short_ptf])
     
 
+    @staticmethod
+    def intersect_dated_portfolios(returns_ptf: dict, volume_ptf: dict) -> pd.DataFrame:
+        """
+        Intersects all the returns portfolios of a date with all its volume portfolios at once : the rows of every
+        portfolio are stacked with the number of their portfolio and matched on the ticker, and each match gets the
+        sum of its returns and volume weights and weighted returns.
+        
+        :param returns_ptf: Dictionary of weighted returns portfolios of a date.
+        :param volume_ptf: Dictionary of weighted volume portfolios of a date.
+        :return: DataFrame with one row per ticker of each intersection, sorted by returns portfolio, volume portfolio
+                 and row of the returns portfolio, with the columns R and V (numbers of the portfolios in the
+                 dictionaries), R_POSITION (row in the returns portfolio), WEIGHT and WEIGHTED_RETURNS.
+        """
+        stacked = []
+        for portfolios in [returns_ptf, volume_ptf]:
+            frames = list(portfolios.values())
+            if any(WEIGHT not in ptf.columns for ptf in frames):
+                raise ValueError("Intersected portfolios requires asset weighting")
+            stacked.append(pd.DataFrame({'TICKER': np.concatenate([ptf.index.to_numpy() for ptf in frames]),
+                                         'PTF': np.repeat(np.arange(len(frames)), [len(ptf) for ptf in frames]),
+                                         'ROW': np.concatenate([np.arange(len(ptf)) for ptf in frames]),
+                                         WEIGHT: np.concatenate([ptf[WEIGHT].to_numpy() for ptf in frames]),
+                                         WEIGHTED_RETURNS: np.concatenate([ptf[WEIGHTED_RETURNS].to_numpy() for ptf in frames])}))
+        
+        table = stacked[0].merge(stacked[1], on='TICKER', suffixes=('_R', '_V'))
+        table = table.sort_values(['PTF_R', 'PTF_V', 'ROW_R'], kind='stable')
+        return pd.DataFrame({'R': table['PTF_R'].to_numpy(), 'V': table['PTF_V'].to_numpy(), 'R_POSITION': table['ROW_R'].to_numpy(),
+                             WEIGHT: table[f'{WEIGHT}_R'].to_numpy() + table[f'{WEIGHT}_V'].to_numpy(),
+                             WEIGHTED_RETURNS: table[f'{WEIGHTED_RETURNS}_R'].to_numpy() + table[f'{WEIGHTED_RETURNS}_V'].to_numpy()})
+
+    @staticmethod
+    def create_dated_intersections(returns_ptf: dict, volume_ptf: dict) -> dict:
+        """
+        Create the intersected portfolios of one date, from its table of intersections (see intersect_dated_portfolios).
+        
+        :param returns_ptf: Dictionary of weighted returns portfolios of a date.
+        :param volume_ptf: Dictionary of weighted volume portfolios of a date.
+        :return: Dictionary of intersected portfolios, named R_i_V_j.
+        """
+        R_names, V_names = list(returns_ptf), list(volume_ptf)
+        table = Signal.intersect_dated_portfolios(returns_ptf, volume_ptf)
+        pairs = table['R'].to_numpy() * len(V_names) + table['V'].to_numpy()
+        bounds = np.searchsorted(pairs, np.arange(len(R_names) * len(V_names) + 1))
+        weights, weighted_returns, positions = table[WEIGHT].to_numpy(), table[WEIGHTED_RETURNS].to_numpy(), table['R_POSITION'].to_numpy()
+        
+        intersections = {}
+        for i, R_i in enumerate(R_names):
+            R_portfolio = returns_ptf[R_i]
+            for j, V_j in enumerate(V_names):
+                rows = slice(bounds[i * len(V_names) + j], bounds[i * len(V_names) + j + 1])
+                intersected_portfolio = R_portfolio.take(positions[rows])
+                intersected_portfolio[WEIGHT] = weights[rows]
+                intersected_portfolio[WEIGHTED_RETURNS] = weighted_returns[rows]
+                intersections[f'{R_i}_{V_j}'] = intersected_portfolio
+        return intersections
+
     def create_intersected_portfolios(self, returns_ptf: dict, volume_ptf: dict) -> dict:
         """
         Create portfolios that intersect based on returns and volume portfolio positions.
@@ -85,23 +316,9 @@ class Signal:
         :param volume_ptf: Dictionary of volume portfolios.
         :return: Dictionary of intersected portfolios.
         """        
-        dict_intersections = {}
-    
-        for date in self.data.keys():
-            dict_intersections[date] = {}
-            for R_i, R_portfolio in returns_ptf[date].items():
-                for V_j, V_portfolio in volume_ptf[date].items():
-                    if not WEIGHT in R_portfolio.columns or not WEIGHT in V_portfolio.columns:
-                        raise ("Intersected portfolios requires asset weighting")
-                    intersection_index = R_portfolio.index.intersection(V_portfolio.index)
-                    
-                    intersected_portfolio = R_portfolio.loc[intersection_index].copy()
-                    intersected_portfolio[WEIGHT] = R_portfolio[WEIGHT] + V_portfolio.loc[intersection_index, WEIGHT]
-                    intersected_portfolio[WEIGHTED_RETURNS] = (R_portfolio.loc[intersection_index, WEIGHTED_RETURNS] +
-                                                                    V_portfolio.loc[intersection_index, WEIGHTED_RETURNS])
-                    
-                    dict_intersections[date][f'{R_i}_{V_j}'] = intersected_portfolio
-                    
+        results = self.executor.map(Signal.create_dated_intersections, [returns_ptf[date] for date in self.data.keys()], 
+                                    [volume_ptf[date] for date in self.data.keys()])
+        dict_intersections = dict(zip(self.data.keys(), results))
         self.intersected_portfolios = dict_intersections
         return self.intersected_portfolios
 
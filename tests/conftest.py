@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compo import CompositionStore
+from data import Data
+
+
+@pytest.fixture
+def data():
+    """
+    Four tickers over 70 business days from 2024-01-01 ; DD has no price on the first 5 dates. The index holds
+    AA, BB and CC, then from the snapshot of 2024-02-15 BB, CC, DD and EE, which has no data.
+    """
+    dates = pd.bdate_range("2024-01-01", periods=70)
+    rng = np.random.default_rng(0)
+    tickers = ["AA", "BB", "CC", "DD"]
+    prices = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.02, (len(dates), 4)), axis=0), index=dates, columns=tickers)
+    prices.iloc[:5, 3] = np.nan
+    volumes = pd.DataFrame(rng.integers(1, 100, (len(dates), 4)).astype(float), index=dates, columns=tickers)
+    compo = CompositionStore()
+    compo.add_snapshot("2024-01-01", ["AA", "BB", "CC"])
+    compo.add_snapshot("2024-02-15", ["BB", "CC", "DD", "EE"])
+    return Data.from_frames(prices, volumes, compo, J=3)
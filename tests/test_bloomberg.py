@@ -0,0 +1,306 @@
+from datetime import date
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from blp_session import SessionPool, FakeSession, FakeElement, FakeEvent, FakeMessage, CorrelationId, session_pool, RESPONSE, SUBSCRIPTION_DATA, TIMEOUT
+import bloomberg
+from bloomberg import BLP, extract_value, fetch_compositions
+from cache import BloombergCache
+
+DATES = [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 28)]
+
+
+def responder(request):
+    """Answers HistoricalDataRequests with one message per security, and INDX_MWEIGHT_HIST snapshots in two messages."""
+    values = request.toPy()
+    if 'overrides' in values:
+        day = int(values['overrides'][0]['value'][-2:])
+        members = [{"Index Member": f"M{day}{k} UN", "Percent Weight": 20.0} for k in range(5)]
+        return [{"securityData": [{"security": security, "fieldData": {values['fields'][0]: part}}
+                                  for security in values['securities']]} for part in (members[:2], members[2:])]
+    return [{"securityData": {"security": security,
+                              "fieldData": [dict([("date", d)] + [(field, "USD" if field == "CRNCY" else 10.0 * i + len(security) + k)
+                                                                  for k, field in enumerate(values['fields'])])
+                                            for i, d in enumerate(DATES)]}}
+            for security in values['securities']]
+
+
+def expected_history(tickers, field_position):
+    return pd.DataFrame({ticker: [10.0 * i + len(ticker) + field_position for i in range(len(DATES))] for ticker in tickers},
+                        index=pd.Index(DATES))
+
+
+def test_bdh_interleaved_chunks():
+    session = FakeSession(responder, latency=0.001, interval=0.001)
+    tickers = ["A UN Equity", "BB UN Equity", "CCC UN Equity"]
+    result = BLP(session=session).bdh(tickers, ["PX_LAST", "PX_VOLUME"], date(2024, 1, 1), date(2024, 3, 31),
+                                      chunk_size=1, max_in_flight=3)
+
+    assert len(session.requests) == 3
+    pd.testing.assert_frame_equal(result["PX_LAST"][tickers], expected_history(tickers, 0))
+    pd.testing.assert_frame_equal(result["PX_VOLUME"][tickers], expected_history(tickers, 1))
+
+
+def test_bdh_aligns_securities_on_the_union_of_their_dates():
+    def ragged_responder(request):
+        return [{"securityData": {"security": security,
+                                  "fieldData": [{"date": d, "PX_LAST": float(d.month)} for d in (DATES[:2] if security.startswith("A") else DATES[1:])]}}
+                for security in request.toPy()['securities']]
+
+    result = BLP(session=FakeSession(ragged_responder)).bdh(["A UN Equity", "B UN Equity"], "PX_LAST", date(2024, 1, 1), date(2024, 3, 31))["PX_LAST"]
+
+    expected = pd.DataFrame({"A UN Equity": [1.0, 2.0, np.nan], "B UN Equity": [np.nan, 2.0, 3.0]}, index=pd.Index(DATES))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_bdh_date_chunks_cover_the_whole_range():
+    def ranged_responder(request):
+        values = request.toPy()
+        dates = pd.date_range(values['startDate'], values['endDate'], freq='QE').date
+        return [{"securityData": {"security": security, "fieldData": [{"date": d, "PX_LAST": float(d.year * 100 + d.month)}
+                                                                       for d in dates]}}
+                for security in values['securities']]
+
+    session = FakeSession(ranged_responder, latency=0.001, messages_per_event=2)
+    tickers = ["A UN Equity", "B UN Equity", "C UN Equity"]
+    result = BLP(session=session).bdh(tickers, "PX_LAST", date(2022, 1, 1), date(2024, 12, 31),
+                                      chunk_size=2, date_chunk=1, max_in_flight=4)["PX_LAST"]
+
+    assert len(session.requests) == 6
+    dates = pd.date_range("2022-01-01", "2024-12-31", freq='QE').date
+    assert result.index.tolist() == list(dates)
+    for ticker in tickers:
+        assert result[ticker].tolist() == [float(d.year * 100 + d.month) for d in dates]
+
+
+def test_bdh_resends_failed_chunks():
+    failures = {"B UN Equity": 1, "C UN Equity": 5}
+
+    def flaky_responder(request):
+        security = request.toPy()['securities'][0]
+        if failures.get(security, 0) > 0:
+            failures[security] -= 1
+            return [{"responseError": {"message": "Busy"}}]
+        return responder(request)
+
+    blp = BLP(session=FakeSession(flaky_responder, latency=0.001))
+    tickers = ["A UN Equity", "B UN Equity", "C UN Equity"]
+    result = blp.bdh(tickers, "PX_LAST", date(2024, 1, 1), date(2024, 3, 31), chunk_size=1, max_in_flight=2, max_retries=2)
+
+    assert [(stats['attempts'], stats['status']) for stats in blp.bdh_stats] == [(1, 'done'), (2, 'done'), (3, 'failed')]
+    pd.testing.assert_frame_equal(result["PX_LAST"], expected_history(tickers[:2], 0))
+
+
+def test_bdh_iter_yields_each_security_as_it_arrives():
+    session = FakeSession(responder, latency=0.001, interval=0.001)
+    tickers = ["A UN Equity", "BB UN Equity", "CCC UN Equity"]
+    stream = BLP(session=session).bdh_iter(tickers, ["PX_LAST", "PX_VOLUME"], date(2024, 1, 1), date(2024, 3, 31),
+                                           chunk_size=1, max_in_flight=3)
+    result = dict(stream)
+
+    assert sorted(result) == tickers
+    for ticker in tickers:
+        expected = pd.DataFrame({"PX_LAST": expected_history([ticker], 0)[ticker], "PX_VOLUME": expected_history([ticker], 1)[ticker]})
+        pd.testing.assert_frame_equal(result[ticker], expected)
+
+
+def test_bdp_types_each_field():
+    def reference_responder(request):
+        return [{"securityData": [{"security": security, "fieldData": {"PX_LAST": float(len(security)), "CRNCY": "USD"}}]}
+                for security in request.toPy()['securities']]
+
+    result = BLP(session=FakeSession(reference_responder, messages_per_event=2)).bdp(["A UN Equity", "BB UN Equity"], ["PX_LAST", "CRNCY"])
+
+    assert result.index.tolist() == ["A UN Equity", "BB UN Equity"]
+    assert result["PX_LAST"].tolist() == [11.0, 12.0]
+    assert result["CRNCY"].dtype == "category" and result["CRNCY"].tolist() == ["USD", "USD"]
+
+
+def test_fake_session_waits_up_to_the_timeout():
+    session = FakeSession(lambda request: [{}], latency=0.2)
+    start = time.perf_counter()
+    assert session.nextEvent(50).eventType() == TIMEOUT
+    assert time.perf_counter() - start >= 0.05
+
+    session.sendRequest(session.getService('//blp/refdata').createRequest('ReferenceDataRequest'))
+    assert session.nextEvent(50).eventType() == TIMEOUT
+    assert session.nextEvent(1000).eventType() == RESPONSE
+    assert time.perf_counter() - start >= 0.25
+
+
+def test_lost_response_raises_timeout_error():
+    class LosingSession(FakeSession):
+        def sendRequest(self, request, correlationId=None):
+            self.requests.append(request)
+            return correlationId
+
+    blp = BLP(session=LosingSession(responder), timeout=0.2)
+    with pytest.raises(TimeoutError):
+        blp.bdh(["A UN Equity"], "PX_LAST", date(2024, 1, 1), date(2024, 3, 31))
+
+
+def test_extract_value_falls_back_to_strings_for_unknown_fields():
+    assert extract_value(FakeElement("FIELD", "1.5"), 'auto') == 1.5
+    assert extract_value(FakeElement("FIELD", "USD"), 'auto') == "USD"
+    assert extract_value(FakeElement("FIELD", 3.0), 'int') == 3
+
+
+def test_bdh_decodes_each_field_with_its_type():
+    result = BLP(session=FakeSession(responder)).bdh(["A UN Equity", "BB UN Equity"], ["PX_LAST", "CRNCY", "PX_VOLUME"],
+                                                     date(2024, 1, 1), date(2024, 3, 31), field_types={"PX_VOLUME": "int"})
+
+    assert result["PX_LAST"].dtypes.tolist() == ["float64", "float64"]
+    assert result["PX_VOLUME"]["A UN Equity"].tolist() == [13, 23, 33] and result["PX_VOLUME"].dtypes.tolist() == ["int64", "int64"]
+    assert result["CRNCY"]["BB UN Equity"].tolist() == ["USD"] * 3
+
+
+def test_typed_and_generic_decoding_agree():
+    def dated_responder(request):
+        return [{"securityData": {"security": security, "fieldData": [{"date": d, "PX_LAST": 100 + i / 7, "DVD_EX_DT": date(2023, 12, 1)}
+                                                                       for i, d in enumerate(DATES)]}}
+                for security in request.toPy()['securities']]
+
+    results = {name: BLP(session=FakeSession(dated_responder)).bdh(["A UN Equity"], ["PX_LAST", "DVD_EX_DT"], date(2024, 1, 1),
+                                                                   date(2024, 3, 31), field_types=field_types)
+               for name, field_types in [("auto", {"PX_LAST": "auto", "DVD_EX_DT": "auto"}), ("typed", {"PX_LAST": "float", "DVD_EX_DT": "datetime"})]}
+
+    pd.testing.assert_frame_equal(results["auto"]["PX_LAST"], results["typed"]["PX_LAST"])
+    assert results["typed"]["DVD_EX_DT"].dtypes.tolist() == ["datetime64[ns]"]
+    assert results["typed"]["DVD_EX_DT"]["A UN Equity"].tolist() == [pd.Timestamp("2023-12-01")] * 3
+    # the generic fallback keeps what it cannot read as a float as a string
+    assert results["auto"]["DVD_EX_DT"]["A UN Equity"].tolist() == ["2023-12-01"] * 3
+
+
+def test_bds_members():
+    result = BLP(session=FakeSession(responder)).bds("RIY Index", "INDX_MWEIGHT_HIST", date(2024, 1, 5))
+    assert result["RIY Index"][date(2024, 1, 5)].tolist() == [f"M5{k} UN" for k in range(5)]
+
+
+def test_bds_batch_routes_snapshots_to_their_date():
+    dates = [date(2024, 1, d) for d in range(1, 7)]
+    session = FakeSession(responder, latency=0.001, interval=0.001)
+    result = BLP(session=session).bds_batch(["RIY Index"], ["INDX_MWEIGHT_HIST"], dates, max_in_flight=3)
+    for d in dates:
+        assert result[d]["RIY Index"][d].tolist() == [f"M{d.day}{k} UN" for k in range(5)]
+
+
+def test_bds_batch_reads_every_message_of_a_response_event():
+    session = FakeSession(responder, latency=0.001, messages_per_event=2)
+    dates = [date(2024, 1, d) for d in range(1, 5)]
+    result = BLP(session=session).bds_batch(["RIY Index"], ["INDX_MWEIGHT_HIST"], dates, max_in_flight=2)
+    for d in dates:
+        assert result[d]["RIY Index"][d].tolist() == [f"M{d.day}{k} UN" for k in range(5)]
+
+
+def test_fetch_compositions_builds_one_snapshot_per_date():
+    def compo_responder(request):
+        day = int(request.toPy()['overrides'][0]['value'][-2:])
+        members = ["AAA UN", "BBB UN", "CCC UN" if day % 2 else "DDD UN", "1234 UN"]
+        return [{"securityData": [{"security": "RIY Index", "fieldData": {"INDX_MWEIGHT_HIST": [{"Index Member": member}]}}]}
+                for member in members]
+
+    dates = [date(2024, 1, d) for d in range(1, 6)]
+    blp = BLP(session=FakeSession(compo_responder, latency=0.001, messages_per_event=3))
+    store = fetch_compositions(blp, "RIY Index", dates, max_in_flight=2)
+    for d in dates:
+        assert sorted(store.members_at(d)) == ["AAA UN", "BBB UN", "CCC UN" if d.day % 2 else "DDD UN"]
+
+
+def test_fetch_compositions_skips_dates_between_identical_snapshots():
+    def compo_responder(request):
+        day = int(request.toPy()['overrides'][0]['value'][-2:])
+        members = ["AAA UN", "BBB UN"] if day < 8 else ["AAA UN", "CCC UN"]
+        return [{"securityData": [{"security": "RIY Index", "fieldData": {"INDX_MWEIGHT_HIST": [{"Index Member": member}
+                                                                                                 for member in members]}}]}]
+
+    dates = [date(2024, 1, d) for d in range(1, 14)]
+    full = fetch_compositions(BLP(session=FakeSession(compo_responder)), "RIY Index", dates)
+    session = FakeSession(compo_responder)
+    store = fetch_compositions(BLP(session=session), "RIY Index", dates, skip_unchanged=True, step=6)
+
+    assert len(session.requests) < len(dates)
+    assert store.dates == full.dates
+    np.testing.assert_array_equal(store.membership(), full.membership())
+
+
+def test_bdh_cache_keeps_non_numeric_fields(tmp_path):
+    cache = BloombergCache(str(tmp_path))
+    tickers = ["A UN Equity", "BB UN Equity"]
+    direct = BLP(session=FakeSession(responder)).bdh(tickers, ["PX_LAST", "CRNCY"], date(2024, 1, 1), date(2024, 3, 31))
+    for _ in range(2):
+        session = FakeSession(responder)
+        cached = BLP(session=session).bdh(tickers, ["PX_LAST", "CRNCY"], date(2024, 1, 1), date(2024, 3, 31), cache=cache)
+        pd.testing.assert_frame_equal(cached["PX_LAST"], direct["PX_LAST"])
+        pd.testing.assert_frame_equal(cached["CRNCY"], direct["CRNCY"])
+    # Second call : PX_LAST is served from the cache, CRNCY requested again
+    assert [request.toPy()['fields'] for request in session.requests] == [["CRNCY"]]
+
+
+def test_abandoned_stream_does_not_leak_into_next_request():
+    session = FakeSession(responder, latency=0.001)
+    blp = BLP(session=session)
+    stream = blp.bdh_iter(["A1 Equity", "A2 Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31), chunk_size=1, max_in_flight=2)
+    next(stream)
+    stream.close()
+    assert session.nextEvent(50).eventType() == TIMEOUT
+
+    result = blp.bdh(["B1 Equity", "B2 Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31), chunk_size=1, max_in_flight=2)
+    assert sorted(result["PX_LAST"].columns) == ["B1 Equity", "B2 Equity"]
+
+
+def test_request_while_a_stream_is_suspended_raises():
+    session = FakeSession(responder, latency=0.001)
+    blp = BLP(session=session)
+    stream = blp.bdh_iter(["A1 Equity", "A2 Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31), chunk_size=1, max_in_flight=2)
+    first = next(stream)
+    with pytest.raises(RuntimeError):
+        blp.bdh(["B1 Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31))
+
+    # The suspended stream is left intact, and the session is free again once it is exhausted
+    assert [first[0]] + [ticker for ticker, _ in stream] == ["A1 Equity", "A2 Equity"]
+    result = blp.bdh(["B1 Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31))
+    pd.testing.assert_frame_equal(result["PX_LAST"], expected_history(["B1 Equity"], 0))
+
+
+def test_instances_follow_a_restarted_pooled_session(monkeypatch):
+    class BreakableSession(FakeSession):
+        broken = False
+
+        def getService(self, name):
+            if self.broken:
+                raise ConnectionError("Session down")
+            return super().getService(name)
+
+    sessions = []
+    pool = SessionPool(lambda host, port: sessions.append(BreakableSession(responder)) or sessions[-1])
+    monkeypatch.setattr(bloomberg, "session_pool", pool)
+    first, second = BLP(), BLP()
+    sessions[0].broken = True
+    first.bdh(["A UN Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31))
+    result = second.bdh(["B UN Equity"], ["PX_LAST"], date(2024, 1, 1), date(2024, 3, 31))
+
+    assert len(sessions) == 2 and sessions[0].requests == [] and len(sessions[1].requests) == 2
+    pd.testing.assert_frame_equal(result["PX_LAST"], expected_history(["B UN Equity"], 0))
+
+
+def test_feeds_read_their_own_session(monkeypatch):
+    sessions = []
+    monkeypatch.setattr(session_pool, "factory", lambda host, port: sessions.append(FakeSession(None)) or sessions[-1])
+    blp = BLP(session=FakeSession(responder))
+    feeds = [blp.subscribe(["A UN Equity", "B UN Equity"]), blp.subscribe(["C UN Equity", "D UN Equity"])]
+    assert len(sessions) == 2
+
+    for session, price in zip(sessions, (10.0, 20.0)):
+        session.push(FakeEvent(SUBSCRIPTION_DATA, [FakeMessage({"LAST_PRICE": price + code, "VOLUME": 1.0}, CorrelationId(code),
+                                                               "MarketDataEvents") for code in range(2)]))
+    deadline = time.time() + 5
+    while any(feed.ticks < 2 for feed in feeds) and time.time() < deadline:
+        time.sleep(0.01)
+    for feed in feeds:
+        feed.stop()
+
+    assert feeds[0].snapshot()["PX_LAST"].tolist() == [10.0, 11.0]
+    assert feeds[1].snapshot()["PX_LAST"].tolist() == [20.0, 21.0]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compo import CompositionStore
+
+SNAPSHOTS = {"2024-01-31": ["AA", "BB", "CC"], "2024-02-29": ["BB", "CC", "DD"], "2024-03-29": ["DD", "CC", "BB"],
+             "2024-04-30": ["AA", "EE"], "2024-05-31": ["CC"]}
+
+
+def make_store(checkpoint_every=2):
+    store = CompositionStore(checkpoint_every)
+    for date, members in SNAPSHOTS.items():
+        store.add_snapshot(date, members)
+    return store
+
+
+def test_members_are_rebuilt_from_checkpoints_and_deltas():
+    store = make_store()
+
+    assert store.tickers == ["AA", "BB", "CC", "DD", "EE"]
+    assert sorted(store.checkpoints) == [0, 2, 4]
+    # An unchanged snapshot is stored as empty deltas
+    assert len(store.added[2]) == len(store.removed[2]) == 0
+    for date, members in SNAPSHOTS.items():
+        assert sorted(store.members_at(date)) == sorted(members)
+
+
+def test_snapshots_must_come_in_date_order():
+    store = make_store()
+    with pytest.raises(ValueError):
+        store.add_snapshot("2024-05-31", ["AA"])
+
+
+def test_to_frame_round_trip():
+    store = make_store()
+    df = store.to_frame()
+
+    assert df.columns.tolist() == list(pd.DatetimeIndex(list(SNAPSHOTS)))
+    # Members are listed in the order they entered the store
+    assert df[pd.Timestamp("2024-03-29")].dropna().tolist() == ["BB", "CC", "DD"]
+    assert [df[date].dropna().tolist() for date in df] == [store.members_at(date) for date in store.dates]
+    assert [df[date].dropna().tolist() for date in df] == [store.to_frame(categorical=True)[date].dropna().tolist() for date in df]
+
+    restored = CompositionStore.from_frame(df)
+    np.testing.assert_array_equal(restored.membership(), store.membership())
+
+
+def test_membership_matrix():
+    store = make_store()
+    expected = [[ticker in members for ticker in store.tickers] for members in SNAPSHOTS.values()]
+    np.testing.assert_array_equal(store.membership(), expected)
+
+
+def test_positions_nearest_and_asof():
+    store = CompositionStore()
+    store.add_snapshot("2024-01-01", ["AA"])
+    store.add_snapshot("2024-01-11", ["BB"])
+    dates = ["2023-12-01", "2024-01-01", "2024-01-05", "2024-01-06", "2024-01-07", "2024-01-11", "2024-06-01"]
+
+    # Ties go to the earlier snapshot
+    assert store.positions(dates, 'nearest').tolist() == [0, 0, 0, 0, 1, 1, 1]
+    assert store.positions(dates, 'asof').tolist() == [-1, 0, 0, 0, 0, 1, 1]
+    assert store.members_at("2023-12-01", 'nearest') == ["AA"]
+    assert store.members_at("2023-12-01", 'asof') == []
+    with pytest.raises(ValueError):
+        store.positions(dates, 'next')
+
+
+def test_positions_without_snapshots():
+    store = CompositionStore()
+    assert store.positions(["2024-01-01"], 'nearest').tolist() == [-1]
+    assert store.positions(["2024-01-01"], 'asof').tolist() == [-1]
+    assert store.members_at("2024-01-01") == []
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compo import CompositionStore
+from data import Data, WEIGHTED_RETURNS, to_typed_parquet, read_typed_parquet
+
+
+def test_typed_parquet_round_trip(tmp_path):
+    df = pd.DataFrame({"AA UN": [1.0, np.nan, 3.0], "BB UN": ["2.5", None, 4], "NAME": ["Apple", None, "Apple"]},
+                      index=pd.DatetimeIndex(["2024-01-31", "2024-02-29", "2024-03-29"]))
+    typed = to_typed_parquet(df, str(tmp_path / "cache" / "typed.parquet"))
+    read = read_typed_parquet(str(tmp_path / "cache" / "typed.parquet"))
+
+    pd.testing.assert_frame_equal(read, typed)
+    assert read.dtypes.astype(str).tolist() == ["float64", "float64", "category"]
+    assert isinstance(read.index, pd.DatetimeIndex)
+    np.testing.assert_array_equal(read["BB UN"], [2.5, np.nan, 4.0])
+    assert read["NAME"].tolist()[::2] == ["Apple", "Apple"] and pd.isna(read["NAME"].iloc[1])
+
+
+def test_get_data_resolves_compositions_nearest_or_asof(data):
+    nearest = data.get_data(K=1)
+    asof = data.get_data(K=1, method='asof')
+
+    # 2024-01-31 is closer to the snapshot of 2024-02-15 than to the one of 2024-01-01
+    assert nearest.dates.tolist() == [pd.Timestamp("2024-02-15")]
+    assert nearest.rows.tolist() == [pd.Timestamp("2024-02-29")]
+    assert asof.dates.tolist() == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-15")]
+    assert asof.rows.tolist() == [pd.Timestamp("2024-01-31"), pd.Timestamp("2024-02-29")]
+    assert asof.members("2024-01-01").index.tolist() == ["AA", "BB", "CC"]
+
+
+def test_membership_mask_before_the_first_snapshot(data):
+    positions, mask, sizes = data.membership_mask(pd.DatetimeIndex(["2023-12-29", "2024-01-31", "2024-02-15"]), 'asof')
+
+    assert positions.tolist() == [-1, 0, 1]
+    np.testing.assert_array_equal(mask, [[False] * 4, [True, True, True, False], [False, True, True, True]])
+    # EE is counted as a member although it has no data
+    assert sizes.tolist() == [0, 3, 4]
+
+
+def test_benchmark_is_the_mean_return_of_the_members(data):
+    bench = data.get_benchmark()[WEIGHTED_RETURNS]
+    returns = data.df_returns
+
+    # Before the snapshot of 2024-02-15 : AA, BB and CC ; after : BB, CC, DD and EE, without data, counting as 0
+    assert bench.index[0] == pd.Timestamp("2024-01-01") and bench.index[-1] == pd.Timestamp("2024-02-15")
+    day = returns.index[1]
+    assert bench.iloc[1] == pytest.approx(returns.loc[day, ["AA", "BB", "CC"]].mean())
+    day = returns.index[-1]
+    assert bench.iloc[-1] == pytest.approx(returns.loc[day, ["BB", "CC", "DD"]].sum() / 4)
+
+
+def test_benchmark_asof_skips_dates_before_the_first_snapshot(data):
+    data.compo = CompositionStore()
+    data.compo.add_snapshot("2024-01-10", ["AA", "BB"])
+    bench = data.get_benchmark(method='asof')[WEIGHTED_RETURNS]
+
+    assert len(bench) == (data.df_returns.index >= pd.Timestamp("2024-01-10")).sum()
+    assert bench.iloc[0] == pytest.approx(data.df_returns.loc["2024-01-10", ["AA", "BB"]].mean())
+
+
+def test_benchmark_weighted_by_the_previous_volume(data):
+    bench = data.get_benchmark(weighting='volume')[WEIGHTED_RETURNS]
+    day, previous = data.df_returns.index[-1], data.df_returns.index[-2]
+    weights = data.df_px_volume.loc[previous, ["BB", "CC", "DD"]]
+
+    assert bench.iloc[-1] == pytest.approx((data.df_returns.loc[day, ["BB", "CC", "DD"]] * weights).sum() / weights.sum())
+    with pytest.raises(ValueError):
+        data.get_benchmark(weighting='cap')
+
+
+def test_returns_and_volatility_are_computed_once(data):
+    expected = data.df_px_last.ffill().pct_change(fill_method=None).iloc[1:]
+    pd.testing.assert_frame_equal(data.df_returns, expected)
+    assert data.df_returns is data.df_returns
+
+    volatility = data.df_volatility
+    assert volatility is data.volatility(3)
+    pd.testing.assert_frame_equal(data.volatility(5), expected.rolling(window=5).std().ffill().bfill())
+    view = data.with_params(J=5)
+    assert view.df_returns is data.df_returns and view.df_volatility is data.volatility(5)
+
+
+def test_slices_are_computed_without_the_full_panels(data):
+    end, tickers = data.df_px_last.index[30], ["DD", "AA"]
+    returns = data.returns(end=end, tickers=tickers)
+    volatility = data.volatility(start=data.df_px_last.index[10], end=end, tickers=tickers)
+
+    pd.testing.assert_frame_equal(returns, data.df_returns.loc[:end, tickers])
+    pd.testing.assert_frame_equal(volatility, data.df_volatility.loc[data.df_px_last.index[10]:end, tickers])
+
+
+@pytest.mark.parametrize("split", [4, 40])
+def test_append_matches_a_full_recomputation(data, split):
+    prices, volumes = data.df_px_last, data.df_px_volume
+    history = Data.from_frames(prices.iloc[:split], volumes.iloc[:split], data.compo, J=3)
+    history.df_volatility, history.volatility(5)
+    history.append(prices.iloc[split:], volumes.iloc[split:])
+
+    pd.testing.assert_frame_equal(history.df_px_last, prices, check_freq=False)
+    pd.testing.assert_frame_equal(history.df_returns, data.df_returns, check_freq=False)
+    pd.testing.assert_frame_equal(history.df_volatility, data.df_volatility, check_freq=False)
+    pd.testing.assert_frame_equal(history.volatility(5), data.volatility(5), check_freq=False)
+
+
+def test_append_rejects_dates_already_held(data):
+    with pytest.raises(ValueError):
+        data.append(data.df_px_last.iloc[-2:], data.df_px_volume.iloc[-2:])
+
+
+def test_appended_snapshots_leave_views_unchanged(data):
+    view = data.with_params(J=5)
+    new_dates = pd.bdate_range(data.df_px_last.index[-1] + pd.offsets.BDay(), periods=2)
+    new = pd.DataFrame(100.0, index=new_dates, columns=data.df_px_last.columns)
+    data.append(new, new, snapshots={new_dates[0]: ["AA", "DD"]})
+
+    assert data.compo.members_at(new_dates[0]) == ["AA", "DD"] and len(data.compo) == 3
+    assert len(view.compo) == 2 and len(view.df_px_last) == 70
+
+
+def test_save_append_load_round_trip(data, tmp_path):
+    prices, volumes = data.df_px_last, data.df_px_volume
+    history = Data.from_frames(prices.iloc[:40], volumes.iloc[:40], data.compo, J=3)
+    history.save(str(tmp_path))
+    history.append(prices.iloc[40:], volumes.iloc[40:], snapshots={prices.index[50]: ["AA"]}, directory=str(tmp_path))
+    loaded = Data.load(str(tmp_path))
+
+    pd.testing.assert_frame_equal(loaded.df_px_last, prices, check_freq=False)
+    assert loaded.compo.dates == history.compo.dates
+    assert [loaded.compo.members_at(date) for date in loaded.compo.dates] == [["AA", "BB", "CC"], ["BB", "CC", "DD", "EE"], ["AA"]]
+
+
+def test_compact_mode_stores_float32(data):
+    compact = Data.from_frames(data.df_px_last, data.df_px_volume, data.compo, J=3, compact=True)
+
+    for df in [compact.df_px_last, compact.df_px_volume, compact.df_returns, compact.df_volatility, compact.df_dollar_volume]:
+        assert set(df.dtypes) == {np.dtype('float32')}
+    assert all(isinstance(dtype, pd.CategoricalDtype) for dtype in compact.df_compo.dtypes)
+    np.testing.assert_allclose(compact.df_returns, data.df_returns, atol=1e-6)
+    assert compact.get_data(K=1).values.dtype == np.float32
+
+
+def test_memory_report_lists_every_panel_held(data):
+    report = data.memory_report()
+    assert report.index.tolist() == ["PX_LAST", "PX_VOLUME", "COMPO", "TOTAL"]
+
+    data.df_volatility
+    report = data.memory_report()
+    assert report.index.tolist() == ["PX_LAST", "PX_VOLUME", "RETURNS", "VOLATILITY_3", "COMPO", "TOTAL"]
+    assert report.loc["TOTAL", "bytes"] == report['bytes'].iloc[:-1].sum()
+    assert report.loc["RETURNS", "bytes"] >= data.df_returns.to_numpy().nbytes
+
+    compact = Data.from_frames(data.df_px_last, data.df_px_volume, data.compo, J=3, compact=True)
+    compact.df_volatility
+    assert compact.memory_report().loc["TOTAL", "bytes"] < report.loc["TOTAL", "bytes"]
+
+
+def test_get_data_reads_each_snapshot_at_its_rebalancing_date(data):
+    panel = data.get_data(K=1, method='asof')
+    df = panel["2024-01-01"]
+
+    assert df.columns.tolist() == ["PX_LAST", "PX_VOLUME", "RETURNS", "VOLATILITY"]
+    assert df.index.tolist() == ["AA", "BB", "CC", "DD", "EE"]
+    members = ["AA", "BB", "CC"]
+    np.testing.assert_array_equal(df.loc[members, "PX_LAST"], data.df_px_last.loc["2024-01-31", members])
+    np.testing.assert_array_equal(df.loc[members, "RETURNS"], data.df_returns.loc["2024-01-31", members])
+    np.testing.assert_array_equal(df.loc[members, "VOLATILITY"], data.df_volatility.loc["2024-01-31", members])
+    assert df.loc[["DD", "EE"]].isna().all().all()
+    assert panel.members("2024-02-15").index.tolist() == ["BB", "CC", "DD", "EE"]
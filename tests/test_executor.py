@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compo import CompositionStore
+from data import Data
+from executor import Executor, SERIAL, THREAD, PROCESS
+from optimisation import Optimisation
+from panel import Panel
+from signals import Signal
+
+DATES = pd.date_range("2024-01-31", periods=7, freq="ME")
+
+
+def scaled_total(df:pd.DataFrame, scale:float) -> float:
+    return scale * np.nansum(df.to_numpy())
+
+
+def make_panel():
+    rng = np.random.default_rng(1)
+    frames = {"PX_LAST": pd.DataFrame(rng.normal(size=(len(DATES), 3)), index=DATES, columns=["AA", "BB", "CC"]),
+              "PX_VOLUME": pd.DataFrame(rng.normal(size=(len(DATES), 3)), index=DATES, columns=["AA", "BB", "CC"])}
+    return Panel.from_frames(frames, DATES, ["AA", "BB", "CC"], rng.random((len(DATES), 3)) > 0.3)
+
+
+@pytest.mark.parametrize("backend", [THREAD, PROCESS])
+def test_backends_return_the_serial_results_in_order(backend):
+    panel = make_panel()
+    scales = list(range(1, len(DATES) + 1))
+    serial = Executor(SERIAL)
+    with Executor(backend, 3) as executor:
+        assert executor.map(pow, range(10), [2] * 10) == serial.map(pow, range(10), [2] * 10) == [k ** 2 for k in range(10)]
+        assert executor.map_panel(scaled_total, panel, scales) == serial.map_panel(scaled_total, panel, scales)
+    assert serial.map_panel(scaled_total, panel, scales) == [scale * np.nansum(panel[date].to_numpy())
+                                                             for date, scale in zip(panel, scales)]
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError):
+        Executor("cluster")
+
+
+def test_pipeline_on_threads_matches_the_serial_run():
+    dates = pd.bdate_range("2024-01-01", periods=160)
+    rng = np.random.default_rng(2)
+    tickers = ["AA", "BB", "CC", "DD", "EE", "FF"]
+    prices = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.02, (len(dates), 6)), axis=0), index=dates, columns=tickers)
+    volumes = pd.DataFrame(rng.integers(1, 100, (len(dates), 6)).astype(float), index=dates, columns=tickers)
+    compo = CompositionStore()
+    for k, date in enumerate(pd.date_range("2024-01-01", periods=7, freq="MS")):
+        compo.add_snapshot(date, tickers[k % 2:])
+    data = Data.from_frames(prices, volumes, compo, J=3)
+
+    results = []
+    for executor in (Executor(SERIAL), Executor(THREAD, 2)):
+        with executor:
+            signal = Signal(data, K=1, n_returns=2, m_volume=2, executor=executor)
+            returns_ptf, volume_ptf = signal.create_simple_portfolios()
+            returns_ptf = Optimisation.get_equal_weight(returns_ptf, executor)
+            volume_ptf = Optimisation.get_equal_weight(volume_ptf, executor)
+            results.append(signal.create_intersected_portfolios(returns_ptf, volume_ptf))
+
+    serial, threaded = results
+    assert len(serial) > 1 and list(serial) == list(threaded)
+    for date, ptf in serial.items():
+        assert list(ptf) == list(threaded[date])
+        for name, df in ptf.items():
+            pd.testing.assert_frame_equal(df, threaded[date][name])
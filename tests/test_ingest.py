@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+import ingest
+
+
+def write_extract(path, tickers, values):
+    dates = pd.date_range("2024-01-01", periods=len(values), freq='D')
+    pd.DataFrame(values, index=dates.strftime('%Y%m%d'), columns=tickers).to_csv(path)
+
+
+def test_extracts_of_one_field_are_combined(tmp_path):
+    write_extract(tmp_path / "a.csv", ["A UN"], [[1.0], [2.0], [3.0]])
+    write_extract(tmp_path / "b.csv", ["B UN"], [[10.0], [20.0]])
+    for name in ("a.csv", "b.csv"):
+        ingest.ingest_csv(str(tmp_path / name), "PX_LAST", str(tmp_path / "dataset"))
+
+    df = ingest.read_field(str(tmp_path / "dataset"), "PX_LAST")
+    assert df.index.tolist() == list(pd.date_range("2024-01-01", periods=3, freq='D'))
+    assert df["A UN"].tolist() == [1.0, 2.0, 3.0]
+    np.testing.assert_array_equal(df["B UN"], [10.0, 20.0, np.nan])
+
+    df = ingest.read_field(str(tmp_path / "dataset"), "PX_LAST", start_date="2024-01-02", tickers=["B UN", "C UN"])
+    assert df.columns.tolist() == ["B UN"]
+    np.testing.assert_array_equal(df["B UN"], [20.0, np.nan])
+
+
+def test_same_extract_ingested_twice_is_read_once(tmp_path):
+    write_extract(tmp_path / "a.csv", ["A UN", "B UN"], [[1.0, 2.0], [3.0, 4.0]])
+    for _ in range(2):
+        ingest.ingest_csv(str(tmp_path / "a.csv"), "PX_LAST", str(tmp_path / "dataset"), chunk_size=1)
+
+    df = ingest.read_field(str(tmp_path / "dataset"), "PX_LAST")
+    assert df.values.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_compositions_ingested_twice_list_each_member_once(tmp_path):
+    pd.DataFrame({20240101: ["A UN", "B UN"], 20240201: ["A UN", "C UN"]}).to_excel(tmp_path / "compo.xlsx", sheet_name="Compo", index=False)
+    for _ in range(2):
+        ingest.ingest_compo_excel(str(tmp_path / "compo.xlsx"), directory=str(tmp_path / "dataset"))
+
+    df = ingest.read_compo(str(tmp_path / "dataset"))
+    assert df.groupby(ingest.DATE)[ingest.MEMBER].apply(sorted).tolist() == [["A UN", "B UN"], ["A UN", "C UN"]]
+
+
+def test_excel_sheet_ingested_in_chunks_reads_back_whole(tmp_path):
+    dates = pd.date_range("2023-12-28", periods=7, freq='D')
+    sheet = pd.DataFrame(np.arange(21, dtype=float).reshape(7, 3), index=dates, columns=["A UN", "B UN", "C UN"])
+    sheet.iloc[2, 1] = np.nan
+    sheet.to_excel(tmp_path / "px.xlsx", sheet_name="PX LAST")
+    ingest.ingest_excel(str(tmp_path / "px.xlsx"), "PX LAST", "PX_LAST", str(tmp_path / "dataset"), chunk_size=2)
+
+    excel = pd.read_excel(tmp_path / "px.xlsx", "PX LAST", index_col=0)
+    df = ingest.read_field(str(tmp_path / "dataset"), "PX_LAST")
+    assert df.index.tolist() == excel.index.tolist() and df.columns.tolist() == excel.columns.tolist()
+    np.testing.assert_array_equal(df.to_numpy(), excel.to_numpy(dtype=float))
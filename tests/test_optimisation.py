@@ -0,0 +1,103 @@
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+
+from optimisation import Optimisation, segmented_weights, WEIGHTING_SCORES
+from performance import Performance
+from signals import RETURNS, VOLUME, PX_LAST, VOLATILITY, POSITION, LONG, SHORT, WEIGHT, WEIGHTED_RETURNS, DATES
+
+SCORES = {"equal": lambda ptf: pd.Series(1.0, index=ptf.index),
+          "volume": lambda ptf: ptf[VOLUME],
+          "inverse_volatility": lambda ptf: 1 / ptf[VOLATILITY],
+          "dollar_volume": lambda ptf: ptf[PX_LAST] * ptf[VOLUME]}
+METHODS = {"equal": Optimisation.get_equal_weight, "volume": Optimisation.get_volume_weight,
+           "inverse_volatility": Optimisation.get_inverse_volatility_weight, "dollar_volume": Optimisation.get_dollar_volume_weight}
+
+
+def make_portfolios():
+    longshort = pd.DataFrame({PX_LAST: [10.0, 20.0, 30.0, 40.0, 50.0], VOLUME: [1.0, 2.0, 3.0, 4.0, 5.0],
+                              RETURNS: [0.01, -0.02, 0.03, 0.04, -0.05], VOLATILITY: [0.1, 0.2, 0.4, 0.5, 0.8],
+                              POSITION: [LONG, SHORT, LONG, SHORT, LONG]}, index=["AA", "BB", "CC", "DD", "EE"])
+    return {pd.Timestamp("2024-01-31"): {"R1": longshort.iloc[:3].assign(**{POSITION: LONG}), "LS": longshort},
+            pd.Timestamp("2024-02-29"): {"R1": longshort.iloc[2:].assign(**{POSITION: LONG}), "LS": longshort.iloc[::-1].copy()}}
+
+
+def test_segmented_weights_match_a_normalisation_per_group():
+    rng = np.random.default_rng(0)
+    segments = rng.integers(0, 6, 40)
+    sides = np.where(segments % 2, -1.0, 1.0)
+    scores = rng.random(40)
+    scores[segments == 3] = 0.0
+    weights = segmented_weights(segments, sides, scores)
+
+    frame = pd.DataFrame({"segment": segments, "side": sides, "score": scores})
+    expected = frame["side"] * frame["score"] / frame.groupby("segment")["score"].transform("sum")
+    # A segment whose scores sum to 0 gets no weight instead of NaN
+    np.testing.assert_allclose(weights, expected.fillna(0.0).to_numpy())
+    assert (weights[segments == 3] == 0).all()
+
+
+@pytest.mark.parametrize("scheme", list(WEIGHTING_SCORES))
+def test_each_scheme_normalises_both_sides(scheme):
+    portfolios = make_portfolios()
+    result = METHODS[scheme](portfolios)
+
+    assert result is portfolios
+    for dated_portfolios in portfolios.values():
+        for ptf in dated_portfolios.values():
+            long, short = ptf[POSITION] == LONG, ptf[POSITION] == SHORT
+            scores = SCORES[scheme](ptf)
+            expected = np.where(long, scores / scores[long].sum(), -scores / scores[short].sum())
+            np.testing.assert_allclose(ptf[WEIGHT].to_numpy(), expected)
+            np.testing.assert_allclose(ptf[WEIGHTED_RETURNS].to_numpy(), ptf[RETURNS].to_numpy() * expected)
+            assert ptf.loc[long, WEIGHT].sum() == pytest.approx(1)
+            if short.any():
+                assert ptf.loc[short, WEIGHT].sum() == pytest.approx(-1)
+
+
+def test_full_results_sum_the_weighted_returns_of_each_date():
+    portfolios = Optimisation.get_equal_weight(make_portfolios())
+    results = Optimisation({}, {}).get_full_results(portfolios)
+
+    assert list(results) == ["R1", "LS"]
+    for name, df in results.items():
+        assert df.index.tolist() == list(portfolios) and df.index.name == DATES
+        np.testing.assert_allclose(df[RETURNS].to_numpy(), [portfolios[date][name][WEIGHTED_RETURNS].sum() for date in portfolios])
+
+
+def random_portfolios(nb_dates:int=8):
+    rng = np.random.default_rng(3)
+    tickers = ["AA", "BB", "CC", "DD", "EE", "FF"]
+    portfolios = {}
+    for date in pd.date_range("2024-01-31", periods=nb_dates, freq="ME"):
+        frame = pd.DataFrame({PX_LAST: rng.uniform(10, 100, 6), VOLUME: rng.uniform(1, 100, 6), RETURNS: rng.normal(0, 0.05, 6),
+                              VOLATILITY: rng.uniform(0.1, 0.5, 6), POSITION: [LONG, LONG, LONG, SHORT, SHORT, SHORT]}, index=tickers)
+        portfolios[date] = {"R1": frame.iloc[:3].copy(), "LS": frame}
+    return portfolios
+
+
+def test_best_weighting_method_returns_weighted_copies_of_the_best_scheme():
+    portfolios = random_portfolios()
+    original = copy.deepcopy(portfolios)
+    optim = Optimisation({}, {})
+    best = optim.get_best_weighting_method(portfolios)
+
+    # The portfolios given are left unchanged
+    for date, dated_portfolios in original.items():
+        for name, ptf in dated_portfolios.items():
+            pd.testing.assert_frame_equal(portfolios[date][name], ptf)
+            assert best[date][name] is not portfolios[date][name]
+
+    sharpe_ratios, matches = {}, []
+    for scheme, method in METHODS.items():
+        weighted = method(copy.deepcopy(original))
+        sharpe_ratios[scheme] = max(Performance(portfolios=optim.get_full_results(weighted), bench=None).sharpe_ratio().values())
+        if all(np.allclose(best[date][name][WEIGHT], weighted[date][name][WEIGHT]) for date in weighted for name in weighted[date]):
+            matches.append((scheme, weighted))
+    assert len(matches) == 1
+    scheme, weighted = matches[0]
+    assert sharpe_ratios[scheme] == max(sharpe_ratios.values())
+    for date, dated_portfolios in weighted.items():
+        for name, ptf in dated_portfolios.items():
+            pd.testing.assert_frame_equal(best[date][name], ptf, rtol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from panel import Panel
+
+DATES = pd.DatetimeIndex(["2024-01-31", "2024-02-29"])
+
+
+def make_panel():
+    frames = {"PX_LAST": pd.DataFrame([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]], index=DATES, columns=["AA", "BB", "CC"]),
+              "PX_VOLUME": pd.DataFrame([[10.0, 20.0, 30.0], [40.0, 50.0, 60.0]], index=DATES, columns=["AA", "BB", "CC"])}
+    mask = np.array([[True, True, False], [False, True, True]])
+    return Panel.from_frames(frames, DATES, ["AA", "BB", "CC"], mask)
+
+
+def test_getitem_is_a_view_with_non_members_missing():
+    panel = make_panel()
+    df = panel["2024-01-31"]
+
+    assert df.index.tolist() == ["AA", "BB", "CC"] and df.columns.tolist() == ["PX_LAST", "PX_VOLUME"]
+    assert df.loc["AA"].tolist() == [1.0, 10.0] and df.loc["CC"].isna().all()
+    assert np.shares_memory(df.to_numpy(), panel.values)
+
+
+def test_panel_behaves_as_a_dict_of_dates():
+    panel = make_panel()
+
+    assert len(panel) == 2 and list(panel) == list(DATES)
+    assert [panel[date].dropna().index.tolist() for date in panel] == [["AA", "BB"], ["BB", "CC"]]
+    assert panel.nbytes() == 2 * 3 * 2 * 8 + 2 * 3
+
+
+def test_members_and_field():
+    panel = make_panel()
+
+    pd.testing.assert_frame_equal(panel.members(DATES[1]), pd.DataFrame({"PX_LAST": [5.0, 6.0], "PX_VOLUME": [50.0, 60.0]},
+                                                                           index=["BB", "CC"]))
+    field = panel.field("PX_VOLUME")
+    assert field.loc[DATES[0]].tolist()[:2] == [10.0, 20.0] and np.isnan(field.loc[DATES[0], "CC"])
+    assert np.shares_memory(field.to_numpy(), panel.values)
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import signals
+from optimisation import Optimisation
+from signals import Signal, rank_buckets, register_signal, SIGNALS, MOMENTUM, RETURNS, VOLUME, POSITION, LONG, SHORT, WEIGHT, WEIGHTED_RETURNS
+
+
+def test_rank_buckets_keeps_ties_in_ticker_order():
+    values = np.array([3.0, 1.0, 3.0, 2.0, 0.0, 1.0])
+    valid = np.array([True, True, True, True, False, True])
+    order, counts, labels = rank_buckets(values, 2, valid)
+
+    assert counts == 5
+    assert order[:5].tolist() == [1, 5, 3, 0, 2]
+    # Buckets hold the sorted positions [0, 2) and [2, 5)
+    assert labels.tolist() == [2, 1, 2, 2, 0, 1]
+
+
+def test_rank_buckets_with_one_number_of_buckets_per_row():
+    values = np.array([[4.0, 3.0, 2.0, 1.0], [1.0, np.nan, 2.0, 3.0]])
+    valid = ~np.isnan(values)
+    _, counts, labels = rank_buckets(values, np.array([4, 2])[:, None], valid)
+
+    assert counts.tolist() == [4, 3]
+    assert labels.tolist() == [[4, 3, 2, 1], [1, 0, 2, 2]]
+
+
+def test_simple_portfolios_follow_the_bucket_labels(data):
+    signal = Signal(data, K=1, n_returns=2, m_volume=2)
+    returns_ptf, volume_ptf = signal.create_simple_portfolios()
+    returns_labels, volume_labels = signal.create_bucket_labels()
+
+    for date in signal.data:
+        members = signal.data.members(date).dropna()
+        for ptf, labels, column, prefix in [(returns_ptf, returns_labels, RETURNS, 'R'), (volume_ptf, volume_labels, VOLUME, 'V')]:
+            ranked = members.sort_values(column, kind='stable').index
+            bounds = [0, len(ranked) // 2, len(ranked)]
+            for i in range(2):
+                assert ptf[date][f'{prefix}{i+1}'].index.tolist() == ranked[bounds[i]:bounds[i + 1]].tolist()
+                assert (labels.loc[date, ptf[date][f'{prefix}{i+1}'].index] == i + 1).all()
+            longshort = ptf[date][f'{prefix}2-{prefix}1']
+            assert longshort[POSITION].tolist() == [LONG] * (len(ranked) - bounds[1]) + [SHORT] * bounds[1]
+        assert set(returns_labels.columns[returns_labels.loc[date] == 0]) == set(signal.data.tickers) - set(members.index)
+
+
+def test_live_portfolios_leave_out_missing_values():
+    snapshot = pd.DataFrame({RETURNS: [0.02, -0.01, 0.02, np.nan, 0.0], VOLUME: [5.0, 1.0, 3.0, 2.0, 4.0]},
+                            index=["AA", "BB", "CC", "DD", "EE"])
+    returns_ptf, volume_ptf = Signal.create_dated_portfolios(snapshot, 2, 2)
+
+    # Tied returns keep the order of the tickers
+    assert [returns_ptf[name].index.tolist() for name in ["R1", "R2"]] == [["BB", "EE"], ["AA", "CC"]]
+    assert [volume_ptf[name].index.tolist() for name in ["V1", "V2"]] == [["BB", "CC"], ["EE", "AA"]]
+    assert returns_ptf["R2-R1"].index.tolist() == ["AA", "CC", "BB", "EE"]
+
+
+def weighted(tickers, weights):
+    return pd.DataFrame({RETURNS: [0.01 * (k + 1) for k in range(len(tickers))], POSITION: LONG, WEIGHT: weights,
+                         WEIGHTED_RETURNS: [0.01 * (k + 1) * w for k, w in enumerate(weights)]}, index=tickers)
+
+
+def test_dated_intersections_match_tickers_and_sum_weights():
+    returns_ptf = {"R1": weighted(["AA", "BB"], [0.5, 0.5]), "R2": weighted(["DD", "CC"], [0.25, 0.75])}
+    volume_ptf = {"V1": weighted(["CC", "BB", "DD"], [0.2, 0.3, 0.5]), "V2": weighted(["EE"], [1.0])}
+    intersections = Signal.create_dated_intersections(returns_ptf, volume_ptf)
+
+    assert list(intersections) == ["R1_V1", "R1_V2", "R2_V1", "R2_V2"]
+    assert intersections["R1_V1"].index.tolist() == ["BB"]
+    assert intersections["R1_V1"][WEIGHT].tolist() == [0.8]
+    assert intersections["R1_V1"][WEIGHTED_RETURNS].tolist() == pytest.approx([0.02 * 0.5 + 0.02 * 0.3])
+    # Rows keep the order of the returns portfolio, and its columns
+    assert intersections["R2_V1"].index.tolist() == ["DD", "CC"]
+    assert intersections["R2_V1"][WEIGHT].tolist() == [0.75, 0.95]
+    assert intersections["R2_V1"][RETURNS].tolist() == [0.01, 0.02]
+    assert intersections["R1_V2"].empty and intersections["R2_V2"].columns.tolist() == returns_ptf["R2"].columns.tolist()
+
+
+def test_intersections_require_weights():
+    with pytest.raises(ValueError):
+        Signal.create_dated_intersections({"R1": weighted(["AA"], [1.0]).drop(columns=WEIGHT)}, {"V1": weighted(["AA"], [1.0])})
+
+
+def test_intersected_portfolios_of_every_date(data):
+    signal = Signal(data, K=1, n_returns=2, m_volume=2)
+    returns_ptf, volume_ptf = signal.create_simple_portfolios()
+    returns_ptf, volume_ptf = Optimisation.get_equal_weight(returns_ptf), Optimisation.get_equal_weight(volume_ptf)
+    intersections = signal.create_intersected_portfolios(returns_ptf, volume_ptf)
+
+    assert list(intersections) == list(signal.data)
+    for date in signal.data:
+        for name, df in intersections[date].items():
+            R_i, V_j = name.split("_")
+            assert df.index.tolist() == [ticker for ticker in returns_ptf[date][R_i].index if ticker in volume_ptf[date][V_j].index]
+
+
+def test_registered_signal_is_aligned_to_the_panel(data, monkeypatch):
+    monkeypatch.setattr(signals, "SIGNALS", dict(SIGNALS))
+    register_signal("NEG_VOLUME")(lambda market_data: -market_data.df_px_volume)
+    signal = Signal(data, K=1)
+    values = signal.signal_values("NEG_VOLUME")
+
+    assert "NEG_VOLUME" in signals.SIGNALS and "NEG_VOLUME" not in SIGNALS
+    row = -data.df_px_volume.loc[signal.data.rows[0]]
+    assert values.loc["2024-02-15", ["BB", "CC", "DD"]].tolist() == row[["BB", "CC", "DD"]].tolist()
+    # AA left the index and EE has no data
+    assert values.loc["2024-02-15", ["AA", "EE"]].isna().all()
+
+    labels = signal.rank_signals({"NEG_VOLUME": 3})["NEG_VOLUME"].loc["2024-02-15"]
+    ranks = row[["BB", "CC", "DD"]].sort_values(kind="stable").index
+    assert labels[list(ranks)].tolist() == [1, 2, 3]
+    assert labels[["AA", "EE"]].tolist() == [0, 0]
+
+
+def test_bucket_returns_are_the_mean_returns_of_each_intersection(data):
+    signal = Signal(data, K=1)
+    table = signal.bucket_returns(MOMENTUM, VOLUME, 2, 2)
+
+    row = signal.data.rows[0]
+    members = ["BB", "CC", "DD"]
+    momentum = data.df_px_last.loc[row, members] / data.df_px_last.shift(data.J).loc[row, members] - 1
+    volume = data.df_px_volume.loc[row, members]
+    # 3 ranked tickers in 2 buckets : the first holds the lowest value, the second the other two
+    first = pd.Series([1, 2, 2], index=momentum.sort_values(kind="stable").index)
+    second = pd.Series([1, 2, 2], index=volume.sort_values(kind="stable").index)
+    returns = data.df_returns.loc[row, members]
+
+    assert table.columns.tolist() == ["MOMENTUM1_PX_VOLUME1", "MOMENTUM1_PX_VOLUME2", "MOMENTUM2_PX_VOLUME1", "MOMENTUM2_PX_VOLUME2"]
+    for i in (1, 2):
+        for j in (1, 2):
+            tickers = [ticker for ticker in members if first[ticker] == i and second[ticker] == j]
+            expected = returns[tickers].mean() if tickers else np.nan
+            np.testing.assert_allclose(table.loc["2024-02-15", f"MOMENTUM{i}_PX_VOLUME{j}"], expected)
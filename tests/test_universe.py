@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from blp_session import FakeSession
+from compo import CompositionStore
+from data import Data, WEIGHTED_RETURNS
+from universe import Universe
+
+MEMBERS = {"RIY Index": ["AA UN", "BB UN"], "SPX Index": ["BB UN", "CC UN"]}
+
+
+def responder(request):
+    values = request.toPy()
+    if 'overrides' in values:
+        return [{"securityData": [{"security": index, "fieldData": {"INDX_MWEIGHT_HIST": [{"Index Member": member} for member in MEMBERS[index]]}}
+                                  for index in values['securities']]}]
+    dates = pd.bdate_range(values['startDate'], values['endDate']).date
+    return [{"securityData": {"security": security, "fieldData": [{"date": d, "PX_LAST": 100.0 + i, "PX_VOLUME": 10.0}
+                                                                   for i, d in enumerate(dates)]}}
+            for security in values['securities']]
+
+
+def test_views_share_the_prices_of_the_universe(data):
+    other = CompositionStore()
+    other.add_snapshot("2024-01-01", ["DD", "AA"])
+    prices = pd.concat([data.df_px_last, data.df_px_last[["AA"]]], axis=1)
+    volumes = pd.concat([data.df_px_volume, data.df_px_volume[["AA"]]], axis=1)
+    universe = Universe.from_frames(prices, volumes, {"RIY Index": data.compo, "SPX Index": other})
+
+    assert universe.data.df_px_last.columns.tolist() == ["AA", "BB", "CC", "DD"]
+    assert list(universe) == universe.indices == ["RIY Index", "SPX Index"]
+    riy, spx = universe["RIY Index"], universe["SPX Index"]
+    assert riy is universe.view("RIY Index") and spx.compo is other
+    assert riy.df_returns is spx.df_returns
+
+    expected = Data.from_frames(data.df_px_last, data.df_px_volume, other).get_benchmark()
+    pd.testing.assert_frame_equal(spx.get_benchmark(), expected)
+    report = universe.memory_report()
+    assert report.index.tolist()[-3:] == ["COMPO RIY Index", "COMPO SPX Index", "TOTAL"]
+
+
+def test_from_bloomberg_fetches_the_union_of_the_members_once():
+    session = FakeSession(responder)
+    universe = Universe.from_bloomberg(["RIY Index", "SPX Index", "RIY Index"], datetime(2024, 1, 1), datetime(2024, 3, 1),
+                                       use_cache=False, session=session)
+
+    history = [request.toPy() for request in session.requests if 'overrides' not in request.toPy()]
+    assert len(history) == 1 and history[0]['securities'] == ["AA UN Equity", "BB UN Equity", "CC UN Equity"]
+    assert universe.indices == ["RIY Index", "SPX Index"]
+    assert universe["SPX Index"].compo.members_at(datetime(2024, 2, 1)) == ["BB UN", "CC UN"]
+    assert universe.data.df_px_last.columns.tolist() == ["AA UN", "BB UN", "CC UN"]
+    assert not np.isnan(universe["RIY Index"].get_benchmark()[WEIGHTED_RETURNS]).any()
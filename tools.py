@@ -3,6 +3,7 @@ from signals import Signal
 from optimisation import Optimisation, WEIGHT
 from performance import Performance
 from charts import Charts
+from executor import Executor
 
 from itertools import product
 from datetime import datetime
@@ -36,7 +37,8 @@ def export_to_excel(intersected_portfolios:dict, start_date:str, end_date:str, f
     combined_data.to_csv(filename + ".csv", index=False)
 
 
-def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_method:str, filename:str=None, outputs:bool=True) :
+def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_method:str, filename:str=None, outputs:bool=True,
+              executor:Executor=None) :
     """
     Executes the full analysis pipeline for optimizing and evaluating investment portfolios based on specified weighting methods. 
     This function incorporates steps from data fetching and signal processing to portfolio optimization, intersection, and comprehensive visualization of results.
@@ -49,6 +51,7 @@ def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_meth
     :param ponderation_method: String specifying the weighting method to be applied to the portfolios. 
     :param filename: Optional string. If provided, specifies the filename where the Excel output of intersected portfolios will be saved. If None, no file is saved.
     :param outputs: Optional bool. If provided, portfolio performances are not displayed.
+    :param executor: Optional Executor running the rebalancing dates in parallel (see executor.py), serial if None.
 
     :return: None. Directly prints and displays portfolio performance results and visualizations.
     """
@@ -57,12 +60,13 @@ def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_meth
     bench = data.get_benchmark()
     rfr = risk_free_rate
     
-    signal = Signal(data=data, K=K, n_returns=n, m_volume=m)
+    signal = Signal(data=data, K=K, n_returns=n, m_volume=m, executor=executor)
     simple_returns, simple_volume = signal.create_simple_portfolios()
     
     optim = Optimisation(returns_portfolios=simple_returns, 
                          volume_portfolios=simple_volume,
-                         risk_free_rate=rfr)
+                         risk_free_rate=rfr,
+                         executor=executor)
     ponderation_methods = {"equi": optim.get_equal_weight,
                            "vol": optim.get_inverse_volatility_weight,
                            "volume": optim.get_volume_weight,
@@ -71,8 +75,8 @@ def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_meth
 
     if ponderation_method in ponderation_methods:
         weight_function = ponderation_methods[ponderation_method]
-        weighted_returns = weight_function(simple_returns.copy())
-        weighted_volume = weight_function(simple_volume.copy())
+        weighted_returns = weight_function(simple_returns.copy(), executor=executor)
+        weighted_volume = weight_function(simple_volume.copy(), executor=executor)
     else:
         raise ValueError(f"Invalid ponderation method: {ponderation_method}")
     
@@ -93,7 +97,7 @@ def run_excel(J:int, K:int, n:int, m:int, risk_free_rate:float, ponderation_meth
     return full_results
 
 
-def run_app(data:Data, K:int, n:int, m:int, ponderation_method:str, viewer:str, method:str=None) :
+def run_app(data:Data, K:int, n:int, m:int, ponderation_method:str, viewer:str, method:str=None, executor:Executor=None) :
     """
     Executes the main application workflow for financial portfolio analysis, 
         which includes generating simple portfolios, applying selected weighting methods, intersecting portfolios, and producing visualizations of the results.
@@ -105,16 +109,17 @@ def run_app(data:Data, K:int, n:int, m:int, ponderation_method:str, viewer:str,
     :param ponderation_method: String specifying the method to be used for weighting the portfolios. Supported methods are 'equi' for equal weighting, 'vol' for inverse volatility weighting, 'volume' for volume weighting, 'volumexprice' for dollar volume weighting, and 'best' for a presumably optimal but unspecified method.
     :param viewer: String specifying the type of visualization to be generated. Supported values are 'perf' for performance viewer, 'hist' for historical viewer, and 'cumulative_v' for cumulative viewer.
     :param method: Optional string specifying additional parameters or methods used specifically in the 'hist' viewer for historical data visualization.
+    :param executor: Optional Executor running the rebalancing dates in parallel (see executor.py), serial if None.
 
     :return: matplotlib.figure.Figure object containing the generated plot, based on the specified viewer type.
 
     :raises ValueError: If an invalid ponderation method is specified, it throws a ValueError with an explanatory message.
     """
     bench = data.get_benchmark()
-    signal = Signal(data=data, K=K, n_returns=n, m_volume=m)
+    signal = Signal(data=data, K=K, n_returns=n, m_volume=m, executor=executor)
     simple_returns, simple_volume = signal.create_simple_portfolios()
     
-    optim = Optimisation(returns_portfolios=simple_returns, volume_portfolios=simple_volume)
+    optim = Optimisation(returns_portfolios=simple_returns, volume_portfolios=simple_volume, executor=executor)
     ponderation_methods = {"equi": optim.get_equal_weight,
                            "vol": optim.get_inverse_volatility_weight,
                            "volume": optim.get_volume_weight,
@@ -123,8 +128,8 @@ def run_app(data:Data, K:int, n:int, m:int, ponderation_method:str, viewer:str,
 
     if ponderation_method in ponderation_methods:
         weight_function = ponderation_methods[ponderation_method]
-        weighted_returns = weight_function(simple_returns.copy())
-        weighted_volume = weight_function(simple_volume.copy())
+        weighted_returns = weight_function(simple_returns.copy(), executor=executor)
+        weighted_volume = weight_function(simple_volume.copy(), executor=executor)
     else:
         raise ValueError(f"Invalid ponderation method: {ponderation_method}")
     intersection = signal.create_intersected_portfolios(returns_ptf=weighted_returns, volume_ptf=weighted_volume)
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+import pandas as pd
+
+from data import Data, PX_LAST, VOLUME
+from compo import CompositionStore
+
+
+class Universe:
+    """
+    Several indices backtested on one deduplicated store of prices and volumes. The compositions of each index
+    are kept in their own CompositionStore, the history of every ticker that has been in any of them is fetched
+    once, and each index gets a Data view sharing the prices, volumes and derived panels (returns, volatility).
+    """
+
+    def __init__(self, data:Data, compos:dict):
+        """
+        :param data: Data holding the prices and volumes of every ticker of the universe.
+        :param compos: Dictionary {index ticker: CompositionStore}.
+        """
+        self.data = data
+        self.compos = dict(compos)
+        self.__views = {}
+
+    @classmethod
+    def from_bloomberg(cls, index_tickers:list, start_date=datetime(2024, 1, 28), end_date=datetime.now(), J:int=3,
+                       risk_free_rate:float=0.02, use_cache:bool=True, session=None, max_in_flight:int=8,
+                       chunk_size:int=200, compact:bool=False) -> "Universe":
+        """
+        Fetches the compositions of each index, then the history of the union of their members in one pass.
+
+        :param index_tickers: List of Bloomberg index tickers, e.g. ['RIY Index', 'SPX Index', 'RAY Index'].
+        :param start_date: The beginning of the date range.
+        :param end_date: The end of the date range.
+        :param J: Number of periods used for calculating rolling statistics.
+        :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param use_cache: If True, Bloomberg responses are cached under Data/cache/ and only missing history is requested.
+        :param session: Optional started session to use instead of the shared one (e.g. a FakeSession).
+        :param max_in_flight: Maximum number of composition snapshot requests outstanding at once.
+        :param chunk_size: Number of securities per historical data request.
+        :param compact: If True, prices, volumes and derived panels are stored as float32.
+        """
+        from bloomberg import BLP, fetch_compositions
+        from cache import BloombergCache
+
+        cache = BloombergCache() if use_cache else None
+        blp = BLP(session=session)
+        dates_list = [start_date + i * timedelta(days=30) for i in range((end_date - start_date).days // 30 + 1)]
+        compos = {index_ticker: fetch_compositions(blp, index_ticker, dates_list, max_in_flight=max_in_flight, cache=cache)
+                  for index_ticker in dict.fromkeys(index_tickers)}
+
+        tickers = list(dict.fromkeys(ticker for compo in compos.values() for ticker in compo.tickers))
+        dict_data = blp.bdh(strSecurity=[str(ticker) + " Equity" for ticker in tickers], strFields=[PX_LAST, VOLUME],
+                            startdate=start_date, enddate=end_date, per='MONTHLY', curr="USD", chunk_size=chunk_size, cache=cache)
+        blp.closeSession()
+
+        frames = {}
+        for field in [PX_LAST, VOLUME]:
+            df = dict_data[field].sort_index()
+            df.columns = df.columns.str.replace(" Equity", "")
+            df.index = pd.to_datetime(df.index)
+            frames[field] = df
+        return cls.from_frames(frames[PX_LAST], frames[VOLUME], compos, J, risk_free_rate, compact)
+
+    @classmethod
+    def from_frames(cls, df_px_last:pd.DataFrame, df_px_volume:pd.DataFrame, compos:dict, J:int=3,
+                    risk_free_rate:float=0.02, compact:bool=False) -> "Universe":
+        """
+        Builds a universe on prices and volumes already loaded.
+
+        :param df_px_last: Prices with dates in index and tickers in columns ; duplicated tickers are kept once.
+        :param df_px_volume: Volumes, same layout.
+        :param compos: Dictionary {index ticker: CompositionStore}.
+        :param J: Number of periods used for calculating rolling statistics.
+        :param risk_free_rate: The risk-free rate used in financial calculations.
+        :param compact: If True, prices, volumes and derived panels are stored as float32.
+        """
+        if df_px_last.columns.has_duplicates:
+            df_px_last = df_px_last.loc[:, ~df_px_last.columns.duplicated()]
+        if df_px_volume.columns.has_duplicates:
+            df_px_volume = df_px_volume.loc[:, ~df_px_volume.columns.duplicated()]
+        return cls(Data.from_frames(df_px_last, df_px_volume, CompositionStore(), J, risk_free_rate, compact), compos)
+
+    @property
+    def indices(self) -> list:
+        """
+        List of the index tickers of the universe.
+        """
+        return list(self.compos)
+
+    def view(self, index_ticker:str) -> Data:
+        """
+        :param index_ticker: One of the indices of the universe.
+        :return: Data of the index, sharing the prices, volumes and derived panels of the universe.
+        """
+        if index_ticker not in self.__views:
+            self.__views[index_ticker] = self.data.with_params(compo=self.compos[index_ticker])
+        return self.__views[index_ticker]
+
+    def __getitem__(self, index_ticker:str) -> Data:
+        return self.view(index_ticker)
+
+    def __iter__(self):
+        return iter(self.compos)
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        :return: Memory report of the shared panels (see Data.memory_report), plus one row per composition store.
+        """
+        report = self.data.memory_report().drop(index=["COMPO", "TOTAL"])
+        for index_ticker, compo in self.compos.items():
+            report.loc[f"COMPO {index_ticker}"] = [len(compo.dates), len(compo.tickers), "int32 codes", compo.nbytes()]
+        report.loc["TOTAL"] = [None, None, None, report['bytes'].sum()]
+        return report